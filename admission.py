@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import deque
+
+from flask import g, jsonify, request
+
+import metrics
+from logging_setup import session_id_var
+
+# Turns processed at once (per process; each gunicorn worker has its own limit)
+MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "8"))
+# Turns allowed to wait for a slot; anything beyond is rejected straight away
+MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "16"))
+# Seconds a queued turn waits before giving up
+QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10"))
+# Turns in flight per chat session (a double-clicked Send waits for the first)
+SESSION_LIMIT = int(os.environ.get("ADMISSION_SESSION_LIMIT", "1"))
+# Skip TTS for turns admitted while at least this many others are queued
+SKIP_AUDIO_QUEUE_DEPTH = int(os.environ.get("ADMISSION_SKIP_AUDIO_QUEUE_DEPTH", "4"))
+
+BUSY_MESSAGE = ("I'm helping a lot of people at the moment - please try again in a few seconds, "
+                "or call Lee on 01442 876131.")
+
+
+class Rejected(Exception):
+    """Raised when a turn is shed instead of admitted; reason is a short metric label."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """Global concurrency limit with a bounded FIFO wait queue and per-session limits."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue=MAX_QUEUE, session_limit=SESSION_LIMIT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.session_limit = session_limit
+        self._cond = threading.Condition()
+        self._active = 0
+        self._sessions = {}
+        self._waiting = deque()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def _can_run(self, waiter):
+        if self._active >= self.max_concurrent or self._sessions.get(waiter[0], 0) >= self.session_limit:
+            return False
+        # FIFO: don't overtake an earlier waiter that could run now
+        for earlier in self._waiting:
+            if earlier is waiter:
+                return True
+            if self._sessions.get(earlier[0], 0) < self.session_limit:
+                return False
+        return True
+
+    def acquire(self, session_id, timeout=QUEUE_TIMEOUT):
+        """Block until the turn may run; returns the queue depth seen on admission."""
+        waiter = (session_id, object())
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._waiting and self._active < self.max_concurrent \
+                    and self._sessions.get(session_id, 0) < self.session_limit:
+                return self._admit(session_id)
+            if len(self._waiting) >= self.max_queue:
+                raise Rejected("queue_full")
+            # One queued turn per session at most; a client hammering Send gets turned away
+            if any(w[0] == session_id for w in self._waiting):
+                raise Rejected("session_busy")
+            self._waiting.append(waiter)
+            self._publish()
+            try:
+                while not self._can_run(waiter):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected("session_busy" if self._sessions.get(session_id, 0) else "timeout")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(waiter)
+                # Someone behind us may be able to go now
+                self._cond.notify_all()
+            return self._admit(session_id)
+
+    def _admit(self, session_id):
+        self._active += 1
+        self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+        self._publish()
+        return len(self._waiting)
+
+    def release(self, session_id):
+        with self._cond:
+            self._active -= 1
+            count = self._sessions.get(session_id, 0) - 1
+            if count > 0:
+                self._sessions[session_id] = count
+            else:
+                self._sessions.pop(session_id, None)
+            self._publish()
+            self._cond.notify_all()
+
+    def _publish(self):
+        metrics.set_gauge("monty_admission_in_flight", self._active)
+        metrics.set_gauge("monty_admission_queue_depth", len(self._waiting))
+
+
+def session_key() -> str:
+    """The chat session of the current request.
+
+    Clients that don't send a session_id are told apart by the caller's address.
+    """
+    session_id = session_id_var.get()
+    if session_id:
+        return session_id
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    return "ip:" + (forwarded.split(",")[0].strip() or request.remote_addr or "unknown")
+
+
+def audio_skipped() -> bool:
+    """True when this request was admitted under load and should answer without audio."""
+    return getattr(g, "skip_audio", False)
+
+
+def init_app(app, paths=("/ask",)):
+    """Put admission control in front of the given routes."""
+    controller = AdmissionController()
+
+    @app.before_request
+    def _admit():
+        if request.path not in paths:
+            return None
+        session_id = session_key()
+        start = time.perf_counter()
+        try:
+            depth = controller.acquire(session_id)
+        except Rejected as e:
+            metrics.inc("monty_admission_shed_total", reason=e.reason)
+            response = jsonify({"response": BUSY_MESSAGE, "agent": "Monty Agent", "audio": None})
+            response.status_code = 429
+            response.headers["Retry-After"] = "2"
+            return response
+        waited = time.perf_counter() - start
+        metrics.observe("monty_stage_duration_seconds", waited, stage="admission_wait", status="ok")
+        g.admission_session = session_id
+        if depth >= SKIP_AUDIO_QUEUE_DEPTH:
+            g.skip_audio = True
+            metrics.inc("monty_admission_audio_skipped_total")
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        session_id = g.pop("admission_session", None)
+        if session_id is not None:
+            controller.release(session_id)
+
+    return controller
+
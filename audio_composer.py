@@ -0,0 +1,247 @@
+"""Speak availability replies from pre-rendered clips instead of a TTS call.
+
+check_piano_tuning_availability_direct always answers in the same template ("Thank you for
+your patience! I found 8 suitable tuning slots: 1. Tuesday, April 15 at 10:00 am ..."), and
+those are the longest texts we send to TTS. Each piece of the template - the fixed phrases,
+counts, list numbers, weekdays, months, day ordinals and times - is rendered once in Monty's
+voice and kept on disk. A reply is then spoken by joining the clips' MP3 frames, with no
+provider call. Anything that doesn't fit the template (or needs a clip we don't have) goes
+to TTS as before.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+AUDIO_SEGMENTS_DIR = os.environ.get("AUDIO_SEGMENTS_DIR", "audio_segments")
+COMPOSED_AUDIO_ENABLED = os.environ.get("COMPOSED_AUDIO", "1").lower() not in ("0", "false", "no")
+# Highest slot count we keep a clip for; bigger totals fall back to TTS
+MAX_COUNT = 60
+RENDER_WORKERS = 4
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+                "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+                "eighteen", "nineteen"]
+TENS_WORDS = {20: "twenty", 30: "thirty", 40: "forty", 50: "fifty", 60: "sixty"}
+ORDINAL_WORDS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+                 "nine": "ninth", "twelve": "twelfth", "twenty": "twentieth", "thirty": "thirtieth"}
+
+FIXED_PHRASES = {
+    "intro": "Thank you for your patience! I found",
+    "slots": "suitable tuning slots:",
+    "showing": "Showing 5 of",
+    "available": "available slots.",
+    "outro": "Would any of these times work for you? If not, I can suggest more options.",
+}
+
+REPLY_RE = re.compile(
+    r"Thank you for your patience! I found (\d+) suitable tuning slots:\n\n(.+?)"
+    r"(?:\n\n\(Showing 5 of (\d+) available slots\))?"
+    r"\n\nWould any of these times work for you\? If not, I can suggest more options\.",
+    re.DOTALL)
+SLOT_RE = re.compile(
+    r"(\d)\. (" + "|".join(WEEKDAYS) + r"), (" + "|".join(MONTHS) + r") (\d{1,2}) at (\d{1,2}):(\d{2}) (am|pm)")
+
+logger = logging.getLogger(__name__)
+
+
+def number_words(n: int) -> str:
+    if n < 20:
+        return NUMBER_WORDS[n]
+    tens, units = divmod(n, 10)
+    return TENS_WORDS[tens * 10] + (f"-{NUMBER_WORDS[units]}" if units else "")
+
+
+def ordinal_words(n: int) -> str:
+    words = number_words(n)
+    head, _, last = words.rpartition("-")
+    last = ORDINAL_WORDS.get(last, last + "th")
+    return f"{head}-{last}" if head else last
+
+
+def segment_texts():
+    """Every clip the composer can use, as {key: text to speak}."""
+    texts = dict(FIXED_PHRASES)
+    for n in range(1, MAX_COUNT + 1):
+        texts[f"count-{n}"] = str(n)
+    for n in range(1, 6):
+        texts[f"item-{n}"] = number_words(n).capitalize() + "."
+    for day in WEEKDAYS:
+        texts[f"weekday-{day.lower()}"] = day + ","
+    for month in MONTHS:
+        texts[f"month-{month.lower()}"] = month
+    for n in range(1, 32):
+        texts[f"day-{n}"] = ordinal_words(n)
+    # Appointments start on the quarter hour between 7am and 7:45pm
+    for hour in range(7, 20):
+        for minute in (0, 15, 30, 45):
+            display = f"{(hour - 1) % 12 + 1}:{minute:02d} {'am' if hour < 12 else 'pm'}"
+            texts[time_key(display)] = f"at {display}"
+    return texts
+
+
+def time_key(display: str) -> str:
+    return "time-" + display.replace(":", "").replace(" ", "")
+
+
+def plan_segments(text: str):
+    """Clip keys that speak an availability reply, or None if the text isn't one."""
+    match = REPLY_RE.fullmatch(text.strip())
+    if not match:
+        return None
+    found, slot_lines, total = match.groups()
+    keys = ["intro", f"count-{int(found)}", "slots"]
+    for line in slot_lines.split("\n"):
+        slot = SLOT_RE.fullmatch(line.strip())
+        if not slot:
+            return None
+        item, weekday, month, day, hour, minute, meridiem = slot.groups()
+        keys += [f"item-{item}", f"weekday-{weekday.lower()}", f"month-{month.lower()}", f"day-{int(day)}",
+                 time_key(f"{int(hour)}:{minute} {meridiem}")]
+    if total:
+        keys += ["showing", f"count-{int(total)}", "available"]
+    keys.append("outro")
+    return keys
+
+
+# MPEG audio header tables: bitrates (kbps) by [version is MPEG-1][layer], sample rates by version
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _frame_header(data: bytes, pos: int):
+    """(frame length, stream format) for the MPEG frame starting at pos, or None."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 3
+    layer = 4 - ((data[pos + 1] >> 1) & 3)
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 1
+    channel_mode = data[pos + 3] >> 6
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        length = (144 if mpeg1 or layer == 2 else 72) * bitrate // sample_rate + padding
+    return length, (version, layer, sample_rate, channel_mode)
+
+
+def mp3_frames(data: bytes):
+    """Strip tags and the Xing/Info header from an MP3, returning (stream format, audio frames).
+
+    Raises ValueError if there are no MPEG audio frames in it.
+    """
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+    stream_format = None
+    start = end = None
+    while True:
+        header = _frame_header(data, pos)
+        if header is None or (stream_format is not None and header[1] != stream_format):
+            break
+        length, stream_format = header
+        if pos + length > len(data):
+            break
+        # The Xing/Info frame holds the clip's frame count; a joined stream must not carry it
+        if start is None and (b"Xing" in data[pos + 4:pos + 40] or b"Info" in data[pos + 4:pos + 40]):
+            pos += length
+            continue
+        if start is None:
+            start = pos
+        pos = end = pos + length
+    if start is None:
+        raise ValueError("no MPEG audio frames found")
+    return stream_format, data[start:end]
+
+
+def voice_fingerprint(*parts) -> str:
+    """Short hash of the voice settings; changing the voice renders a fresh set of clips."""
+    return hashlib.sha256("\n".join(str(p) for p in parts).encode()).hexdigest()[:12]
+
+
+class AudioComposer:
+    """Pre-rendered clips for one voice, loaded into memory, joined frame by frame."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.texts = segment_texts()
+        self.format = None
+        self._clips = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".mp3")
+
+    def _load(self):
+        for key in self.texts:
+            try:
+                with open(self._path(key), "rb") as f:
+                    self._add(key, f.read())
+            except (OSError, ValueError):
+                continue
+
+    def _add(self, key, audio: bytes):
+        stream_format, frames = mp3_frames(audio)
+        with self._lock:
+            if self.format is None:
+                self.format = stream_format
+            elif stream_format != self.format:
+                raise ValueError(f"clip {key} is {stream_format}, expected {self.format}")
+            self._clips[key] = frames
+
+    def missing(self):
+        return [key for key in self.texts if key not in self._clips]
+
+    def render(self, synthesize, workers: int = RENDER_WORKERS):
+        """Synthesize and save every missing clip; returns how many were rendered."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        def render_one(key):
+            try:
+                audio = synthesize(self.texts[key])
+                self._add(key, audio)
+            except Exception as e:
+                logger.warning("Could not render audio clip %s: %s", key, e)
+                return 0
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(self._clips[key])
+            os.replace(tmp, self._path(key))
+            return 1
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-audio") as pool:
+            return sum(pool.map(render_one, self.missing()))
+
+    def compose(self, text: str):
+        """MP3 audio for an availability reply, or None if it can't be built from clips."""
+        keys = plan_segments(text)
+        if keys is None:
+            return None
+        clips = [self._clips.get(key) for key in keys]
+        if any(clip is None for clip in clips):
+            metrics.inc("monty_composed_audio_total", outcome="missing_clip")
+            return None
+        metrics.inc("monty_composed_audio_total", outcome="composed")
+        return b"".join(clips)
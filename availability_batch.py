@@ -0,0 +1,121 @@
+"""Availability for many postcodes at once, as structured slot data.
+
+Each postcode goes through the same steps as a chat lookup - the service-area filter, then
+the local replica, then the booking backend - but the backend calls run concurrently on a
+bounded pool, and postcodes already being fetched (by this batch or another) share the one
+call in flight. Results come back in completion order, so a caller can stream them.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import geo_index
+import metrics
+from availability_replica import postcode_key
+
+# Backend calls in flight at once, across all batches
+MAX_PARALLEL = int(os.environ.get("AVAILABILITY_BATCH_PARALLEL", "16"))
+MAX_POSTCODES = int(os.environ.get("AVAILABILITY_BATCH_MAX_POSTCODES", "200"))
+
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(ValueError):
+    """The batch request itself is unusable (not a per-postcode failure)."""
+
+
+def check_window(start, end):
+    """Validate an optional YYYY-MM-DD date window."""
+    for value in (start, end):
+        if value is not None and not (isinstance(value, str) and DATE_RE.fullmatch(value)):
+            raise BatchError("start and end must be dates like 2025-04-15")
+    if start and end and start > end:
+        raise BatchError("start is after end")
+
+
+def in_window(slots, start=None, end=None):
+    return [s for s in slots if (start is None or s.get("date", "") >= start)
+            and (end is None or s.get("date", "") <= end)]
+
+
+class SlotLookup:
+    """Structured availability lookups with shared, coalesced backend calls."""
+
+    def __init__(self, fetch, replica=None, max_parallel=MAX_PARALLEL):
+        self.fetch = fetch
+        self.replica = replica
+        self._pool = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="availability")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _fetch_shared(self, key):
+        """Fetch a postcode, or join the fetch already running for it. Returns (slots, coalesced)."""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result(), True
+        try:
+            slots = self.fetch(key)
+            if self.replica is not None:
+                self.replica.store(key, slots)
+            future.set_result(slots)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return slots, False
+
+    def lookup(self, postcode: str, start=None, end=None):
+        """One postcode's slots as a dict: postcode, area, source, slots (or error)."""
+        if geo_index.outward_code(postcode) is None:
+            metrics.inc("monty_availability_batch_lookups_total", source="error")
+            return {"postcode": postcode, "error": "not a UK postcode"}
+        area = geo_index.classify_postcode(postcode)
+        result = {"postcode": postcode, "area": area}
+        if area == geo_index.OUT_OF_AREA:
+            result.update(source="geo", slots=[])
+        else:
+            slots = self.replica.lookup(postcode) if self.replica is not None else None
+            if slots is not None:
+                result["source"] = "replica"
+            else:
+                try:
+                    slots, coalesced = self._fetch_shared(postcode_key(postcode))
+                except Exception as e:
+                    logger.warning("Batch availability lookup failed for %s: %s", postcode, e)
+                    result.update(source="upstream", error=str(e) or type(e).__name__)
+                    metrics.inc("monty_availability_batch_lookups_total", source="error")
+                    return result
+                result["source"] = "coalesced" if coalesced else "upstream"
+            result["slots"] = in_window(slots, start, end)
+        metrics.inc("monty_availability_batch_lookups_total", source=result["source"])
+        return result
+
+    def lookup_many(self, postcodes, start=None, end=None):
+        """Start looking up every distinct postcode; returns an iterator of results as they complete.
+
+        Raises BatchError straight away if the request is unusable.
+        """
+        check_window(start, end)
+        distinct = list(dict.fromkeys(" ".join(str(p).split()).upper() for p in postcodes if str(p).strip()))
+        if len(distinct) > MAX_POSTCODES:
+            raise BatchError(f"at most {MAX_POSTCODES} postcodes per batch")
+        begin = time.perf_counter()
+        futures = [self._pool.submit(self.lookup, postcode, start, end) for postcode in distinct]
+        return self._completed(futures, begin)
+
+    def _completed(self, futures, begin):
+        for future in as_completed(futures):
+            yield future.result()
+        metrics.observe("monty_stage_duration_seconds", time.perf_counter() - begin,
+                        stage="availability_batch", status="ok")
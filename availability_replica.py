@@ -0,0 +1,159 @@
+"""A local copy of the booking backend's availability, so lookups don't wait on it.
+
+The backend works out which slots suit a postcode (the tuner's calendar plus its distance
+rules) and only exposes the answer per postcode. The replica keeps those answers for the
+postcodes customers have asked about, sorted by date, and a background thread re-fetches
+them one at a time as they age, replacing only the ones that changed. Bookings we make
+remove the slot everywhere straight away. The backend still has the final say: booking
+re-checks the slot live before creating it.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+import metrics
+
+REPLICA_ENABLED = os.environ.get("AVAILABILITY_REPLICA", "1").lower() not in ("0", "false", "no")
+# Seconds between background refreshes of a postcode
+SYNC_INTERVAL = float(os.environ.get("AVAILABILITY_SYNC_INTERVAL", "120"))
+# Older than this (e.g. the backend has been unreachable) and lookups go live again
+MAX_AGE = float(os.environ.get("AVAILABILITY_MAX_AGE", "600"))
+# Postcodes nobody has asked about for this long stop being synced
+IDLE_TTL = float(os.environ.get("AVAILABILITY_IDLE_TTL", "3600"))
+MAX_POSTCODES = int(os.environ.get("AVAILABILITY_MAX_POSTCODES", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+def postcode_key(postcode: str) -> str:
+    return "".join(postcode.split()).upper()
+
+
+def _slot_key(slot):
+    return (slot.get("date", ""), slot.get("time", ""))
+
+
+class Entry:
+    """One postcode's slots, sorted by (date, time)."""
+
+    __slots__ = ("slots", "keys", "synced_at", "used_at")
+
+    def __init__(self, slots, now):
+        self.slots = sorted(slots, key=_slot_key)
+        self.keys = [_slot_key(s) for s in self.slots]
+        self.synced_at = now
+        self.used_at = now
+
+    def upcoming(self, today: str):
+        """Slots from today on (the list is sorted, so past days are skipped with one bisect)."""
+        return self.slots[bisect.bisect_left(self.keys, (today,)):]
+
+
+class AvailabilityReplica:
+    """Per-postcode slot lists from the backend, kept fresh by a background sync."""
+
+    def __init__(self, fetch, sync_interval=SYNC_INTERVAL, max_age=MAX_AGE, idle_ttl=IDLE_TTL,
+                 max_postcodes=MAX_POSTCODES):
+        self.fetch = fetch
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self.idle_ttl = idle_ttl
+        self.max_postcodes = max_postcodes
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def lookup(self, postcode: str):
+        """Upcoming slots for the postcode, or None if the replica can't answer (ask live)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(postcode_key(postcode))
+            if entry is None:
+                outcome = "miss"
+            elif now - entry.synced_at > self.max_age:
+                outcome = "stale"
+            else:
+                entry.used_at = now
+                outcome = "hit"
+                slots = entry.upcoming(date.today().isoformat())
+        metrics.inc("monty_availability_replica_total", outcome=outcome)
+        return slots if outcome == "hit" else None
+
+    def store(self, postcode: str, slots):
+        """Keep a live answer; the postcode is synced from now on."""
+        now = time.monotonic()
+        key = postcode_key(postcode)
+        with self._lock:
+            previous = self._entries.get(key)
+            entry = self._entries[key] = Entry(slots, now)
+            if previous is not None:
+                entry.used_at = previous.used_at
+            if len(self._entries) > self.max_postcodes:
+                oldest = min(self._entries, key=lambda k: self._entries[k].used_at)
+                del self._entries[oldest]
+            self._publish()
+        self.start()
+
+    def remove_slot(self, slot_date: str, slot_time: str):
+        """Drop a slot we just booked from every postcode, ahead of the next sync."""
+        target = (slot_date, slot_time)
+        with self._lock:
+            for entry in self._entries.values():
+                i = bisect.bisect_left(entry.keys, target)
+                if i < len(entry.keys) and entry.keys[i] == target:
+                    del entry.slots[i], entry.keys[i]
+
+    def _due(self, now):
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if now - e.used_at > self.idle_ttl]:
+                del self._entries[key]
+            due = [(e.synced_at, k) for k, e in self._entries.items() if now - e.synced_at >= self.sync_interval]
+            self._publish()
+        return [k for _, k in sorted(due)]
+
+    def sync(self):
+        """Re-fetch every postcode due a refresh; returns (refreshed, changed)."""
+        refreshed = changed = 0
+        for key in self._due(time.monotonic()):
+            try:
+                slots = self.fetch(key)
+            except Exception as e:
+                logger.warning("Availability sync failed for %s: %s", key, e)
+                metrics.inc("monty_availability_sync_total", outcome="error")
+                continue
+            fresh = Entry(slots, time.monotonic())
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                refreshed += 1
+                if fresh.keys != entry.keys:
+                    entry.slots, entry.keys = fresh.slots, fresh.keys
+                    changed += 1
+                entry.synced_at = fresh.synced_at
+        metrics.inc("monty_availability_sync_total", refreshed - changed, outcome="unchanged")
+        metrics.inc("monty_availability_sync_total", changed, outcome="changed")
+        return refreshed, changed
+
+    def _run(self):
+        while True:
+            time.sleep(min(self.sync_interval, 30))
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning("Availability sync error: %s", e)
+
+    def start(self):
+        """Start the background sync thread (once)."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="availability-sync", daemon=True)
+                self._thread.start()
+
+    def _publish(self):
+        metrics.set_gauge("monty_availability_replica_postcodes", len(self._entries))
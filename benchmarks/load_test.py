@@ -0,0 +1,192 @@
+"""Offline load test for /ask, with every upstream replaced by a local stub.
+
+Starts the stubs from benchmarks/stubs.py and the app itself (python main.py)
+pointed at them. Then it plays scripted conversations at the chosen concurrency and
+reports latency percentiles and requests/sec per scenario.
+
+    python benchmarks/load_test.py --concurrency 8 --conversations 40
+    python benchmarks/load_test.py --scenario booking --model-latency 1.5 --json
+    python benchmarks/load_test.py --url http://127.0.0.1:5001   # drive an already running app
+
+With --url the app must already be configured to talk to the stubs (see stubs.py).
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import Stubs, add_stub_arguments, config_from_args, make_slots  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _first_slot_text():
+    slot = make_slots(1)[0]
+    day = datetime.strptime(slot["date"], "%Y-%m-%d").strftime("%A, %B %d")
+    return f"{day} at 10:00 am"
+
+
+def build_scenarios():
+    """Scripted multi-turn conversations, one list of user messages each."""
+    return {
+        "faq": [
+            "What are your opening hours?",
+            "Where can I park when I visit?",
+            "Do you sell Kawai digital pianos?",
+        ],
+        "postcode": [
+            "Can I book a piano tuning?",
+            "HP4 3QH",
+        ],
+        "booking": [
+            "HP4 3QH",
+            _first_slot_text(),
+            "Jane Example",
+            "1 High Street, Berkhamsted HP4 3QH",
+            "07123 456789",
+        ],
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(stub_env, timeout=60):
+    port = free_port()
+    env = dict(os.environ)
+    env.update(stub_env)
+    env.update({"PORT": str(port), "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"), "AGENT_TRACE_FILE": ""})
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url + "/", timeout=1)
+            return proc, url
+        except requests.RequestException:
+            if proc.poll() is not None:
+                raise RuntimeError("The app exited during startup")
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError("The app did not start in time")
+
+
+def run_conversation(base_url, turns, timeout):
+    """Play one conversation in order; returns (latency, ok) per turn."""
+    session_id = f"bench-{uuid.uuid4().hex[:12]}"
+    results = []
+    with requests.Session() as http:
+        for message in turns:
+            start = time.perf_counter()
+            try:
+                response = http.post(f"{base_url}/ask", json={"message": message, "session_id": session_id},
+                                     timeout=timeout)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            results.append((time.perf_counter() - start, ok))
+    return results
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def run_scenario(base_url, name, turns, conversations, concurrency, timeout):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        for latency, ok in run_conversation(base_url, turns, timeout):
+            with lock:
+                latencies.append(latency)
+                errors += 0 if ok else 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(conversations)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "conversations": conversations,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def print_report(results, stub_calls):
+    print(f"{'scenario':<10} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['requests']:>6} {r['errors']:>6} {r['rps']:>8.2f} "
+              f"{r['p50_ms']:>7.0f}ms {r['p95_ms']:>6.0f}ms {r['p99_ms']:>6.0f}ms {r['max_ms']:>6.0f}ms")
+    if stub_calls:
+        print("\nUpstream calls: " + ", ".join(f"{k}={v}" for k, v in sorted(stub_calls.items())))
+
+
+def main():
+    scenarios = build_scenarios()
+    parser = argparse.ArgumentParser(description="Offline /ask load test against local upstream stubs.")
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--conversations", type=int, default=20, help="Conversations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations in flight at once")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--url", help="Drive an already running app instead of starting one")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = Stubs(config_from_args(args))
+    proc = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            proc, base_url = start_app(stubs.env())
+
+        results = []
+        for name in args.scenario or sorted(scenarios):
+            results.append(run_scenario(base_url, name, scenarios[name], args.conversations,
+                                        args.concurrency, args.timeout))
+
+        if args.json:
+            print(json.dumps({"date": date.today().isoformat(), "results": results,
+                              "upstream_calls": stubs.config.calls}, indent=2))
+        else:
+            print_report(results, stubs.config.calls)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        stubs.shutdown()
+
+
+if __name__ == "__main__":
+    main()
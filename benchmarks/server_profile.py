@@ -0,0 +1,145 @@
+"""Per-worker memory and throughput of the gunicorn profile, for each worker model.
+
+Starts the upstream stubs, then for each worker model (thread, gevent) with and without
+preloading: starts `gunicorn` with gunicorn.conf.py, plays the FAQ and postcode load-test
+scenarios against it and reads each worker's memory from /proc:
+
+- rss: resident memory, counting pages shared with the master and other workers in full
+- pss: proportional share - shared pages split between the processes sharing them
+- shared: resident pages the worker shares with others (what copy-on-write saves)
+
+    python benchmarks/server_profile.py --workers 2 --conversations 40 --concurrency 16
+    python benchmarks/server_profile.py --model thread --no-compare-preload
+
+Linux only (reads /proc/<pid>/smaps_rollup). gevent mode needs `pip install gevent`.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_test import ROOT, build_scenarios, free_port, run_scenario  # noqa: E402
+from stubs import Stubs, add_stub_arguments, config_from_args  # noqa: E402
+
+MODELS = ("thread", "gevent")
+
+
+def memory_kb(pid):
+    """(rss, pss, shared) in kB for one process."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(":")] = int(parts[1])
+    shared = values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0)
+    return values.get("Rss", 0), values.get("Pss", 0), shared
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def start_server(stub_env, model, workers, preload, timeout=90):
+    port = free_port()
+    env = dict(os.environ)
+    env.update(stub_env)
+    env.update({
+        "PORT": str(port), "LOG_LEVEL": "WARNING", "AGENT_TRACE_FILE": "", "WARMUP": "0",
+        "SERVER_WORKER_MODEL": model, "SERVER_WORKERS": str(workers),
+        "SERVER_PRELOAD": "1" if preload else "0",
+    })
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url + "/", timeout=1)
+            if len(worker_pids(proc.pid)) >= workers:
+                return proc, url
+        except (requests.RequestException, OSError):
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn ({model}) exited during startup")
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn ({model}) did not start in time")
+
+
+def profile(stubs, model, workers, preload, conversations, concurrency, timeout):
+    proc, url = start_server(stubs.env(), model, workers, preload)
+    try:
+        scenarios = build_scenarios()
+        runs = [run_scenario(url, name, scenarios[name], conversations, concurrency, timeout)
+                for name in ("faq", "postcode")]
+        # After load, so each worker has touched what it needs
+        memory = [memory_kb(pid) for pid in worker_pids(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    requests_total = sum(r["requests"] for r in runs)
+    elapsed = sum(r["elapsed_s"] for r in runs)
+    count = max(1, len(memory))
+    return {
+        "model": model,
+        "preload": preload,
+        "workers": len(memory),
+        "rss_mb": round(sum(m[0] for m in memory) / count / 1024, 1),
+        "pss_mb": round(sum(m[1] for m in memory) / count / 1024, 1),
+        "shared_mb": round(sum(m[2] for m in memory) / count / 1024, 1),
+        "requests": requests_total,
+        "errors": sum(r["errors"] for r in runs),
+        "rps": round(requests_total / elapsed, 2) if elapsed else 0.0,
+        "p95_ms": max(r["p95_ms"] for r in runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker RSS and throughput for each gunicorn worker model.")
+    parser.add_argument("--model", action="append", choices=MODELS, help="Worker model (repeatable, default: all)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--conversations", type=int, default=40, help="Conversations per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--no-compare-preload", dest="compare_preload", action="store_false",
+                        help="Only run with preloading on")
+    parser.add_argument("--json", action="store_true")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    models = args.model or list(MODELS)
+    if "gevent" in models and importlib.util.find_spec("gevent") is None:
+        print("gevent is not installed; skipping the gevent worker model", file=sys.stderr)
+        models.remove("gevent")
+
+    stubs = Stubs(config_from_args(args))
+    results = []
+    try:
+        for model in models:
+            for preload in ((True, False) if args.compare_preload else (True,)):
+                results.append(profile(stubs, model, args.workers, preload, args.conversations,
+                                       args.concurrency, args.timeout))
+    finally:
+        stubs.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'model':<8} {'preload':<8} {'workers':>7} {'rss/wkr':>9} {'pss/wkr':>9} {'shared':>9} "
+          f"{'reqs':>6} {'errors':>6} {'req/s':>8} {'p95':>8}")
+    for r in results:
+        print(f"{r['model']:<8} {'yes' if r['preload'] else 'no':<8} {r['workers']:>7} {r['rss_mb']:>7.1f}MB "
+              f"{r['pss_mb']:>7.1f}MB {r['shared_mb']:>7.1f}MB {r['requests']:>6} {r['errors']:>6} "
+              f"{r['rps']:>8.2f} {r['p95_ms']:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
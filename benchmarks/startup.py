@@ -0,0 +1,109 @@
+"""Cold start benchmark: how long from process launch until the app serves its first byte.
+
+Each run starts `python main.py` in a fresh process and measures:
+  - import: time to import main (reported by a separate `python -c "import main"` child)
+  - first_byte: process launch -> first byte of GET /
+  - static: process launch -> first byte of GET /static/css/style.css (requested right after /)
+
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --runs 5 --max-first-byte-ms 1500   # exit 1 on regression
+
+Warm-up is switched off (WARMUP=0) so no network calls are made.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def child_env(port=None):
+    env = dict(os.environ)
+    env.update({"WARMUP": "0", "LOG_LEVEL": "WARNING", "AGENT_TRACE_FILE": ""})
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    if port is not None:
+        env["PORT"] = str(port)
+    return env
+
+
+def measure_import():
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def first_byte(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                response.read(1)
+                return time.perf_counter()
+        except OSError:
+            time.sleep(0.005)
+    raise TimeoutError(f"No response from {url}")
+
+
+def measure_server(timeout):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=child_env(port),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        index_at = first_byte(f"http://127.0.0.1:{port}/", deadline)
+        static_at = first_byte(f"http://127.0.0.1:{port}/static/css/style.css", deadline)
+        return index_at - start, static_at - start
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def summarize(label, values):
+    ms = [v * 1000 for v in values]
+    print(f"{label:<12} median={statistics.median(ms):8.1f}ms  min={min(ms):8.1f}ms  max={max(ms):8.1f}ms")
+    return statistics.median(ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first byte.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the server")
+    parser.add_argument("--max-first-byte-ms", type=float, help="Fail if median time to first byte exceeds this")
+    args = parser.parse_args()
+
+    imports, index_times, static_times = [], [], []
+    for _ in range(args.runs):
+        imports.append(measure_import())
+        index_time, static_time = measure_server(args.timeout)
+        index_times.append(index_time)
+        static_times.append(static_time)
+
+    print(f"Startup benchmark ({args.runs} runs, python {sys.version.split()[0]})")
+    summarize("import", imports)
+    first_byte_ms = summarize("first_byte", index_times)
+    summarize("static", static_times)
+
+    if args.max_first_byte_ms is not None and first_byte_ms > args.max_first_byte_ms:
+        print(f"FAIL: median first byte {first_byte_ms:.1f}ms > {args.max_first_byte_ms:.1f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
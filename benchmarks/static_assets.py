@@ -0,0 +1,112 @@
+"""Bytes over the wire for the chat page and /ask replies, with and without compression.
+
+First visit: the page and every /static URL it references. Repeat visit: what a browser
+still has to fetch when its cache holds the previous visit (hashed assets are immutable,
+so only the page is revalidated). /ask: scripted conversations, reply sizes as sent.
+Run with Accept-Encoding "identity" for the uncompressed baseline.
+
+    python benchmarks/static_assets.py --conversations 5
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import uuid
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_test import build_scenarios, start_app  # noqa: E402
+from stubs import Stubs, add_stub_arguments, config_from_args  # noqa: E402
+
+ENCODINGS = ("identity", "gzip", "gzip, br")
+
+
+def fetch(http, url, encoding, etag=None):
+    """(status, body bytes as sent, headers)."""
+    headers = {"Accept-Encoding": encoding}
+    if etag:
+        headers["If-None-Match"] = etag
+    response = http.get(url, headers=headers, stream=True, timeout=30)
+    body = response.raw.read(decode_content=False)
+    return response.status_code, body, response.headers
+
+
+def page_visits(base_url, encoding):
+    with requests.Session() as http:
+        status, body, headers = fetch(http, base_url + "/", encoding)
+        html = requests.get(base_url + "/").text
+        assets = re.findall(r'(?:href|src)="(/static/[^"]+)"', html)
+        first = [(base_url + "/", len(body), headers.get("ETag"), headers.get("Cache-Control"))]
+        for path in assets:
+            status, body, headers = fetch(http, base_url + path, encoding)
+            if status == 200:
+                first.append((base_url + path, len(body), headers.get("ETag"), headers.get("Cache-Control")))
+        # Repeat visit: anything not marked immutable is revalidated with its ETag
+        repeat_requests, repeat_bytes = 0, 0
+        for url, _, etag, cache_control in first:
+            if cache_control and "immutable" in cache_control:
+                continue
+            status, body, _ = fetch(http, url, encoding, etag)
+            repeat_requests += 1
+            repeat_bytes += len(body)
+    return {
+        "first_requests": len(first),
+        "first_kb": round(sum(size for _, size, _, _ in first) / 1024, 1),
+        "repeat_requests": repeat_requests,
+        "repeat_kb": round(repeat_bytes / 1024, 1),
+    }
+
+
+def ask_replies(base_url, encoding, conversations):
+    sizes, elapsed = [], []
+    scenarios = build_scenarios()
+    with requests.Session() as http:
+        for _ in range(conversations):
+            for name in ("faq", "postcode"):
+                session_id = f"bench-{uuid.uuid4().hex[:12]}"
+                for message in scenarios[name]:
+                    start = time.perf_counter()
+                    response = http.post(f"{base_url}/ask", json={"message": message, "session_id": session_id},
+                                         headers={"Accept-Encoding": encoding}, stream=True, timeout=60)
+                    sizes.append(len(response.raw.read(decode_content=False)))
+                    elapsed.append(time.perf_counter() - start)
+    return {"ask_kb_per_reply": round(sum(sizes) / len(sizes) / 1024, 1),
+            "ask_mean_ms": round(sum(elapsed) / len(elapsed) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Page and /ask bytes with and without compression.")
+    parser.add_argument("--conversations", type=int, default=5, help="FAQ + postcode conversations per encoding")
+    parser.add_argument("--json", action="store_true")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = Stubs(config_from_args(args))
+    proc, url = start_app(stubs.env())
+    results = []
+    try:
+        for encoding in ENCODINGS:
+            result = {"accept_encoding": encoding}
+            result.update(page_visits(url, encoding))
+            result.update(ask_replies(url, encoding, args.conversations))
+            results.append(result)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        stubs.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'accept-encoding':<16} {'first visit':>16} {'repeat visit':>16} {'/ask reply':>11} {'/ask mean':>10}")
+    for r in results:
+        print(f"{r['accept_encoding']:<16} {r['first_requests']:>3} req {r['first_kb']:>6.1f}KB "
+              f"{r['repeat_requests']:>3} req {r['repeat_kb']:>6.1f}KB {r['ask_kb_per_reply']:>9.1f}KB "
+              f"{r['ask_mean_ms']:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Local stand-ins for every upstream the app talks to, for offline benchmarking.
+
+- Booking backend: POST /check-availability, POST /create-booking
+- OpenAI: POST /v1/responses (agents SDK), /v1/chat/completions, /v1/audio/speech, GET /v1/models/<id>
+- ElevenLabs: POST /v1/text-to-speech/<voice_id>
+
+Every stub sleeps for a configurable latency before answering, so the app sees
+realistic upstream timings without spending credit. Run standalone with
+
+    python benchmarks/stubs.py --booking-latency 0.8 --model-latency 1.2
+
+and point the app at them with the printed environment variables.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POSTCODE_RE = re.compile(r"[A-Z]{1,2}[0-9][A-Z0-9]? ?[0-9][A-Z]{2}", re.IGNORECASE)
+TUNING_RE = re.compile(r"\b(tuning|tune|tuner|appointment|slot|book)\b", re.IGNORECASE)
+
+
+class StubConfig:
+    """Latency and payload knobs shared by the stub handlers (seconds / counts / bytes)."""
+
+    def __init__(self, booking_latency=0.5, booking_jitter=0.0, slot_count=8,
+                 model_latency=0.8, model_jitter=0.0, tts_latency=0.6, tts_bytes=24000):
+        self.booking_latency = booking_latency
+        self.booking_jitter = booking_jitter
+        self.slot_count = slot_count
+        self.model_latency = model_latency
+        self.model_jitter = model_jitter
+        self.tts_latency = tts_latency
+        self.tts_bytes = tts_bytes
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.prefixes = set()
+
+    def count(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def cached_tokens(self, prefix):
+        """Mimic OpenAI prompt caching: a repeated prefix of 1024+ tokens is cached in 128-token steps."""
+        tokens = len(prefix) // 4
+        with self.lock:
+            seen = prefix in self.prefixes
+            self.prefixes.add(prefix)
+        return (tokens // 128) * 128 if seen and tokens >= 1024 else 0
+
+    def sleep(self, base, jitter):
+        time.sleep(max(0.0, base + random.uniform(-jitter, jitter)))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_audio(self):
+        self.config.sleep(self.config.tts_latency, 0)
+        # An empty ID3 tag then silent MPEG-2 layer III frames (24 kHz mono, 64 kbps), like OpenAI's mp3
+        frame = b"\xff\xf3\x84\xc0" + bytes(188)
+        body = b"ID3\x04\x00\x00\x00\x00\x00\x00" + frame * max(1, self.config.tts_bytes // len(frame))
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class BookingStubHandler(StubHandler):
+    def do_GET(self):
+        self.send_json({"status": "ok"})
+
+    def do_POST(self):
+        data = self.read_json()
+        self.config.sleep(self.config.booking_latency, self.config.booking_jitter)
+        if self.path.startswith("/check-availability"):
+            self.config.count("check-availability")
+            self.send_json({"available_slots": make_slots(self.config.slot_count)})
+        elif self.path.startswith("/create-booking"):
+            self.config.count("create-booking")
+            self.send_json({
+                "message": f"Your piano tuning is booked for {data.get('date')} at {data.get('time')}.",
+                "booking_details": data,
+            })
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+
+def make_slots(count):
+    """Tuesday-Thursday slots over the coming weeks, like the real backend returns."""
+    slots = []
+    day = date.today() + timedelta(days=1)
+    while len(slots) < count:
+        if day.weekday() in (1, 2, 3):
+            for hour in ("10:00", "13:00"):
+                if len(slots) < count:
+                    slots.append({"date": day.isoformat(), "time": hour})
+        day += timedelta(days=1)
+    return slots
+
+
+def _usage(request_body, output_text):
+    input_tokens = max(1, len(json.dumps(request_body)) // 4)
+    output_tokens = max(1, len(output_text) // 4)
+    return input_tokens, output_tokens
+
+
+def _last_user_text(items):
+    if isinstance(items, str):
+        return items
+    for item in reversed(items or []):
+        if item.get("role") == "user":
+            content = item.get("content")
+            if isinstance(content, str):
+                return content
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def scripted_reply(items, tool_names):
+    """Decide what the fake model does next: call a tool or answer with text."""
+    if isinstance(items, list) and items and items[-1].get("type") == "function_call_output":
+        return ("text", f"Here's what I found: {str(items[-1].get('output', ''))[:300]}")
+    text = _last_user_text(items)
+    postcode = POSTCODE_RE.search(text)
+    if postcode and "check_piano_tuning_availability" in tool_names:
+        return ("tool", "check_piano_tuning_availability", {"postcode": postcode.group()})
+    if TUNING_RE.search(text):
+        return ("text", "I'd be happy to help with a piano tuning! What's your postcode so I can check available slots?")
+    return ("text", "Montague Pianos is open Tuesday to Saturday, 10am to 4pm. "
+                    "We have two dedicated parking spaces at the rear of the shop.")
+
+
+class OpenAIStubHandler(StubHandler):
+    def do_GET(self):
+        if self.path.startswith("/v1/models"):
+            self.send_json({"id": self.path.rsplit("/", 1)[-1], "object": "model", "owned_by": "stub"})
+        else:
+            self.send_json({"error": {"message": "not found"}}, 404)
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.path.startswith("/v1/audio/speech"):
+            self.config.count("openai-speech")
+            self.send_audio()
+        elif self.path.startswith("/v1/responses"):
+            self.config.count("openai-responses")
+            self.config.sleep(self.config.model_latency, self.config.model_jitter)
+            self.send_json(self.responses_payload(body))
+        elif self.path.startswith("/v1/chat/completions"):
+            self.config.count("openai-chat")
+            self.config.sleep(self.config.model_latency, self.config.model_jitter)
+            self.send_json(self.chat_payload(body))
+        elif self.path.startswith("/v1/traces"):
+            self.send_json({})
+        else:
+            self.send_json({"error": {"message": "not found"}}, 404)
+
+    def responses_payload(self, body):
+        tool_names = {t.get("name") for t in body.get("tools") or [] if isinstance(t, dict)}
+        reply = scripted_reply(body.get("input"), tool_names)
+        if reply[0] == "tool":
+            output = [{
+                "type": "function_call", "id": f"fc_{uuid.uuid4().hex}", "call_id": f"call_{uuid.uuid4().hex}",
+                "name": reply[1], "arguments": json.dumps(reply[2]), "status": "completed",
+            }]
+            text = json.dumps(reply[2])
+        else:
+            text = reply[1]
+            output = [{
+                "type": "message", "id": f"msg_{uuid.uuid4().hex}", "status": "completed", "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }]
+        input_tokens, output_tokens = _usage(body, text)
+        prefix = body.get("model", "") + json.dumps(body.get("tools") or []) + (body.get("instructions") or "")
+        return {
+            "id": f"resp_{uuid.uuid4().hex}", "object": "response", "created_at": int(time.time()),
+            "model": body.get("model", "stub"), "status": "completed", "output": output,
+            "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+            "usage": {
+                "input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_tokens_details": {"cached_tokens": self.config.cached_tokens(prefix)},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }
+
+    def chat_payload(self, body):
+        reply = scripted_reply(body.get("messages"), set())
+        input_tokens, output_tokens = _usage(body, reply[1])
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": reply[1]}}],
+            "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                      "total_tokens": input_tokens + output_tokens},
+        }
+
+
+class ElevenLabsStubHandler(StubHandler):
+    def do_POST(self):
+        self.read_json()
+        if "/text-to-speech/" in self.path:
+            self.config.count("elevenlabs-tts")
+            self.send_audio()
+        else:
+            self.send_json({"detail": "not found"}, 404)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (e.g. the app shutting down) are expected here
+        pass
+
+
+def _serve(handler_class, config, port=0):
+    handler = type(handler_class.__name__, (handler_class,), {"config": config})
+    server = StubServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Stubs:
+    """All three stub servers running in background threads."""
+
+    def __init__(self, config=None, booking_port=0, openai_port=0, elevenlabs_port=0):
+        self.config = config or StubConfig()
+        self.booking = _serve(BookingStubHandler, self.config, booking_port)
+        self.openai = _serve(OpenAIStubHandler, self.config, openai_port)
+        self.elevenlabs = _serve(ElevenLabsStubHandler, self.config, elevenlabs_port)
+
+    def env(self):
+        """Environment variables that point the app at these stubs."""
+        return {
+            "BOOKING_API_URL": f"http://127.0.0.1:{self.booking.server_port}",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{self.openai.server_port}/v1",
+            "OPENAI_API_KEY": "sk-stub",
+            "ELEVENLABS_BASE_URL": f"http://127.0.0.1:{self.elevenlabs.server_port}",
+            "ELEVENLABS_API_KEY": "stub",
+            # The SDK's default trace exporter would otherwise post to api.openai.com
+            "OPENAI_AGENTS_DISABLE_TRACING": "1",
+        }
+
+    def shutdown(self):
+        for server in (self.booking, self.openai, self.elevenlabs):
+            server.shutdown()
+            server.server_close()
+
+
+def add_stub_arguments(parser):
+    parser.add_argument("--booking-latency", type=float, default=0.5, help="Seconds per booking backend call")
+    parser.add_argument("--booking-jitter", type=float, default=0.0)
+    parser.add_argument("--slots", type=int, default=8, help="Slots returned by /check-availability")
+    parser.add_argument("--model-latency", type=float, default=0.8, help="Seconds per model call")
+    parser.add_argument("--model-jitter", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.6, help="Seconds per TTS call")
+    parser.add_argument("--tts-bytes", type=int, default=24000, help="Size of each fake audio clip")
+
+
+def config_from_args(args):
+    return StubConfig(
+        booking_latency=args.booking_latency, booking_jitter=args.booking_jitter, slot_count=args.slots,
+        model_latency=args.model_latency, model_jitter=args.model_jitter,
+        tts_latency=args.tts_latency, tts_bytes=args.tts_bytes,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the upstream stubs until interrupted.")
+    add_stub_arguments(parser)
+    parser.add_argument("--booking-port", type=int, default=8101)
+    parser.add_argument("--openai-port", type=int, default=8102)
+    parser.add_argument("--elevenlabs-port", type=int, default=8103)
+    args = parser.parse_args()
+
+    stubs = Stubs(config_from_args(args), args.booking_port, args.openai_port, args.elevenlabs_port)
+    for key, value in stubs.env().items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stubs.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Memory per chat session: the old list-of-dicts history against transcript.Transcript.
+
+Builds the same synthetic conversations both ways and measures what stays allocated
+with tracemalloc. The old way is what /ask used to do after every agent turn: take the
+SDK's input list (a deep copy of the previous history plus the run's new items, with
+assistant replies as output_text part lists) and rebuild a fresh list of
+{"role", "content"} dicts from it.
+
+    python benchmarks/transcript_memory.py --sessions 2000 --turns 6
+"""
+import argparse
+import copy
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transcript import Transcript  # noqa: E402
+
+QUESTIONS = [
+    "What are your opening hours?",
+    "Do you sell second hand upright pianos?",
+    "How much does a piano tuning cost?",
+    "Can I park near the shop?",
+    "Who is Mindy?",
+    "Do you hire pianos for events?",
+]
+ANSWER = ("Thanks for asking! Montague Pianos is open Tuesday to Saturday, 10am to 4pm, and we're happy "
+          "to arrange an out of hours appointment. There are two parking spaces at the rear of the shop. ")
+
+
+def question(session, turn):
+    # Real messages differ per session; build new strings rather than sharing literals
+    return f"{QUESTIONS[turn % len(QUESTIONS)]} ({session}-{turn})"
+
+
+def answer(session, turn):
+    return f"{ANSWER}(reply {session}-{turn})"
+
+
+def output_item(text):
+    """An assistant message as ResponseOutputMessage.model_dump() returns it."""
+    return {
+        "id": "msg_" + uuid.uuid4().hex,
+        "content": [{"annotations": [], "text": text, "type": "output_text"}],
+        "role": "assistant",
+        "status": "completed",
+        "type": "message",
+    }
+
+
+def build_dicts(sessions, turns):
+    history = {}
+    for s in range(sessions):
+        conversation = []
+        for t in range(turns):
+            run_input = conversation + [{"role": "user", "content": question(s, t)}]
+            input_list = copy.deepcopy(run_input) + [output_item(answer(s, t))]
+            conversation = [{"role": m["role"], "content": m["content"]}
+                            for m in input_list if "role" in m and "content" in m]
+        history[str(s)] = {"conversation": conversation}
+    return history
+
+
+def build_transcripts(sessions, turns):
+    history = {}
+    for s in range(sessions):
+        conversation = Transcript()
+        for t in range(turns):
+            # Built for Runner.run and dropped afterwards
+            conversation.to_input_list()
+            conversation.append("user", question(s, t))
+            conversation.extend_items([output_item(answer(s, t))])
+        history[str(s)] = {"conversation": conversation}
+    return history
+
+
+def measure(builder, sessions, turns):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = builder(sessions, turns)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del history
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bytes per session for the two history formats.")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=6, help="Agent turns per session")
+    args = parser.parse_args()
+
+    print(f"Transcript memory ({args.sessions} sessions x {args.turns} turns, python {sys.version.split()[0]})")
+    results = {}
+    for name, builder in (("dicts", build_dicts), ("transcript", build_transcripts)):
+        results[name] = measure(builder, args.sessions, args.turns) / args.sessions
+        print(f"  {name:<11} {results[name]:>9.0f} bytes/session")
+    print(f"  saving      {1 - results['transcript'] / results['dicts']:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
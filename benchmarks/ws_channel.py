@@ -0,0 +1,115 @@
+"""The same conversations over POST /ask and over the /ws channel, one turn at a time.
+
+Reports, per transport: time until the reply text is on screen, time until the turn is
+complete (text and audio), and bytes received per turn. Over the channel the text is
+pushed before audio is made and audio goes as binary rather than hex.
+
+    python benchmarks/ws_channel.py --conversations 10 --tts-latency 0.8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import requests
+from websockets.sync.client import connect
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_test import build_scenarios, percentile, start_app  # noqa: E402
+from stubs import Stubs, add_stub_arguments, config_from_args  # noqa: E402
+
+SCENARIOS = ("faq", "postcode")
+
+
+def http_turns(base_url, turns):
+    session_id = f"bench-{uuid.uuid4().hex[:12]}"
+    results = []
+    with requests.Session() as http:
+        for message in turns:
+            start = time.perf_counter()
+            response = http.post(f"{base_url}/ask", json={"message": message, "session_id": session_id,
+                                                          "turn_id": uuid.uuid4().hex}, timeout=60)
+            elapsed = time.perf_counter() - start
+            # Text and audio arrive together
+            results.append((elapsed, elapsed, len(response.content), response.status_code == 200))
+    return results
+
+
+def ws_turns(base_url, turns):
+    session_id = f"bench-{uuid.uuid4().hex[:12]}"
+    results = []
+    with connect(base_url.replace("http", "ws", 1) + f"/ws?session_id={session_id}", max_size=None) as ws:
+        ws.recv()
+        for message in turns:
+            turn_id = uuid.uuid4().hex
+            start = time.perf_counter()
+            ws.send(json.dumps({"type": "ask", "message": message, "turn_id": turn_id}))
+            text_at, received = None, 0
+            while True:
+                frame = ws.recv(timeout=60)
+                received += len(frame)
+                if isinstance(frame, bytes):
+                    continue
+                event = json.loads(frame)
+                if event["type"] == "reply" and text_at is None:
+                    text_at = time.perf_counter() - start
+                if event["type"] == "done":
+                    elapsed = time.perf_counter() - start
+                    results.append((text_at or elapsed, elapsed, received, event["status"] == 200))
+                    break
+    return results
+
+
+def summarize(transport, scenario, results):
+    text = [r[0] for r in results]
+    done = [r[1] for r in results]
+    return {
+        "transport": transport,
+        "scenario": scenario,
+        "turns": len(results),
+        "errors": sum(1 for r in results if not r[3]),
+        "text_p50_ms": round(statistics.median(text) * 1000, 1),
+        "done_p50_ms": round(statistics.median(done) * 1000, 1),
+        "done_p95_ms": round(percentile(done, 0.95) * 1000, 1),
+        "kb_per_turn": round(statistics.mean(r[2] for r in results) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare POST /ask with the WebSocket channel.")
+    parser.add_argument("--conversations", type=int, default=10, help="Conversations per scenario and transport")
+    parser.add_argument("--json", action="store_true")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = Stubs(config_from_args(args))
+    proc, url = start_app(stubs.env())
+    results = []
+    try:
+        scenarios = build_scenarios()
+        for name in SCENARIOS:
+            for transport, play in (("http", http_turns), ("ws", ws_turns)):
+                turns = []
+                for _ in range(args.conversations):
+                    turns.extend(play(url, scenarios[name]))
+                results.append(summarize(transport, name, turns))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        stubs.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<10} {'transport':<10} {'turns':>6} {'errors':>6} {'text p50':>9} {'done p50':>9} "
+          f"{'done p95':>9} {'KB/turn':>8}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['transport']:<10} {r['turns']:>6} {r['errors']:>6} {r['text_p50_ms']:>7.0f}ms "
+              f"{r['done_p50_ms']:>7.0f}ms {r['done_p95_ms']:>7.0f}ms {r['kb_per_turn']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import concurrent.futures
+import contextvars
+import os
+import select
+import socket
+import threading
+
+from flask import g, request
+
+import metrics
+from logging_setup import session_id_var
+
+# How often a waiting request checks whether its client is still there
+POLL_INTERVAL = float(os.environ.get("CANCEL_POLL_INTERVAL", "0.25"))
+# How long a cancelled turn waits for a call with side effects (a booking) that is under way
+SETTLE_TIMEOUT = float(os.environ.get("CANCEL_SETTLE_TIMEOUT", "60"))
+
+current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+class TurnCancelled(Exception):
+    """The turn was superseded or its client went away; stop and don't reply."""
+
+    def __init__(self, reason: str, stage: str):
+        super().__init__(f"{reason} during {stage}")
+        self.reason = reason
+        self.stage = stage
+
+
+def _client_socket(environ):
+    return environ.get("gunicorn.socket") or environ.get("werkzeug.socket")
+
+
+def client_disconnected(environ) -> bool:
+    """Peek at the request socket: readable with nothing to read means the client hung up."""
+    # Turns from a WebSocket channel (ws_channel) carry the channel's closed flag instead
+    channel_closed = environ.get("monty.channel_closed")
+    if channel_closed is not None:
+        return channel_closed.is_set()
+    sock = _client_socket(environ)
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+class CancelToken:
+    """Cancellation state for one /ask turn, checked cooperatively at each stage."""
+
+    def __init__(self, environ=None):
+        self.environ = environ or {}
+        self.reason = None
+        self._event = threading.Event()
+        self._recorded = False
+        self._lock = threading.Lock()
+        # Calls with side effects: how many are under way, and the results of those that finished
+        self._in_flight = 0
+        self._effects = threading.Condition()
+        self.side_effects = []
+        # Set once the request is over, and with it any recording of side_effects
+        self.finished = threading.Event()
+
+    def cancel(self, reason: str):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and client_disconnected(self.environ):
+            self.cancel("disconnect")
+        return self._event.is_set()
+
+    def raise_if_cancelled(self, stage: str):
+        if not self.cancelled():
+            return
+        with self._lock:
+            if not self._recorded:
+                self._recorded = True
+                metrics.inc("monty_turns_cancelled_total", reason=self.reason, stage=stage)
+        raise TurnCancelled(self.reason, stage)
+
+    def begin_side_effect(self, stage: str):
+        """Count a call with side effects as under way, or raise if the turn is already cancelled.
+
+        Once begun, the call isn't abandoned: a cancelled turn waits for it to finish (settle).
+        """
+        with self._effects:
+            if not self._event.is_set():
+                self._in_flight += 1
+                return
+        self.raise_if_cancelled(stage)
+
+    def end_side_effect(self, call):
+        """Done callback for a side-effecting call's future; keeps its result in side_effects."""
+        with self._effects:
+            if not call.cancelled() and call.exception() is None:
+                self.side_effects.append(call.result())
+            self._in_flight -= 1
+            self._effects.notify_all()
+
+    def settle(self, timeout: float = SETTLE_TIMEOUT) -> bool:
+        """Wait for side-effecting calls under way to finish; False if they're still going."""
+        with self._effects:
+            return self._effects.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def has_side_effects(self) -> bool:
+        with self._effects:
+            return self._in_flight > 0 or bool(self.side_effects)
+
+
+def check(stage: str):
+    """Raise TurnCancelled if the current turn (if any) has been cancelled."""
+    token = current_turn.get()
+    if token is not None:
+        token.raise_if_cancelled(stage)
+
+
+def wait(future, stage: str):
+    """Wait for a concurrent future, cancelling it if the turn is cancelled meanwhile."""
+    token = current_turn.get()
+    if token is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            if token.cancelled():
+                future.cancel()
+                # A booking already sent upstream still completes; wait for its result
+                token.settle()
+                token.raise_if_cancelled(stage)
+
+
+_turns = {}
+_turns_lock = threading.Lock()
+
+
+def init_app(app, paths=("/ask",)):
+    """Give each turn a cancel token; a new turn from the same session cancels the old one.
+
+    Register after de-duplication (a retry of the same turn must wait, not supersede) and
+    before admission control (so the superseded turn frees its slot for the new one).
+    """
+
+    @app.before_request
+    def _begin_turn():
+        if request.path not in paths:
+            return None
+        token = CancelToken(request.environ)
+        # Reset in teardown: server threads are reused, and the next request mustn't inherit it
+        g.cancel_context = current_turn.set(token)
+        g.cancel_token = token
+        # Only explicit session IDs supersede: address-based keys may be shared by several people
+        key = session_id_var.get()
+        if key:
+            g.cancel_key = key
+            with _turns_lock:
+                previous = _turns.get(key)
+                _turns[key] = token
+            if previous is not None:
+                previous.cancel("superseded")
+                # If the old turn booked something, let it record that in the history first
+                if previous.has_side_effects():
+                    previous.finished.wait(SETTLE_TIMEOUT)
+        # Lets a WebSocket channel start its next turn only once this one can be superseded
+        started = request.environ.get("monty.turn_started")
+        if started is not None:
+            started.set()
+        return None
+
+    @app.teardown_request
+    def _end_turn(exc):
+        context_token = g.pop("cancel_context", None)
+        if context_token is not None:
+            current_turn.reset(context_token)
+        key = g.pop("cancel_key", None)
+        token = g.pop("cancel_token", None)
+        if token is not None:
+            token.finished.set()
+        if key is not None:
+            with _turns_lock:
+                if _turns.get(key) is token:
+                    del _turns[key]
@@ -0,0 +1,31 @@
+import re
+import zlib
+
+import numpy as np
+
+EMBEDDING_DIM = 2048
+
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _bucket(feature: str) -> int:
+    # crc32 rather than hash() so vectors are the same in every process
+    return zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIM
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed bag of words, word pairs and character trigrams, L2-normalised.
+
+    Local and deterministic: no model or network call, so it's cheap enough to run per turn.
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    words = TOKEN_RE.findall(text.lower())
+    for word in words:
+        vector[_bucket("w:" + word)] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector[_bucket("c:" + padded[i:i + 3])] += 0.5
+    for first, second in zip(words, words[1:]):
+        vector[_bucket(f"b:{first} {second}")] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,166 @@
+"""Where a postcode is relative to the shop, from a bundled table of outward-code centroids.
+
+Lookups that end in "no slots within our distance criteria" used to cost a full round trip
+to the booking backend. data/outcodes.csv lists approximate centroids for every UK postcode
+area, plus the outward codes near the shop, each with a spread (how far its addresses reach).
+It is compiled into a sorted table that the app memory-maps; classifying a postcode is one
+binary search and a comparison against the service radius:
+
+- in_area: every address the code covers is inside the radius
+- out_of_area: none of them come within BORDER_FACTOR of the radius, so the backend is skipped
+- borderline: anything in between, or a code we don't know; the backend decides
+
+    python geo_index.py build
+    python geo_index.py check "HP4 3QH"
+"""
+import argparse
+import logging
+import math
+import os
+import re
+import threading
+
+OUTCODES_CSV = os.environ.get("OUTCODES_CSV", os.path.join("data", "outcodes.csv"))
+GEO_INDEX_FILE = os.environ.get("GEO_INDEX_FILE", os.path.join("geo_index", "outcodes.npy"))
+# Montague Pianos, HP4 3QH
+SHOP_LATITUDE = 51.7686
+SHOP_LONGITUDE = -0.5843
+# Should match the booking backend's distance rule; only clear misses are answered locally
+SERVICE_RADIUS_KM = float(os.environ.get("SERVICE_RADIUS_KM", "50"))
+BORDER_FACTOR = float(os.environ.get("GEO_BORDER_FACTOR", "1.2"))
+GEO_FILTER_ENABLED = os.environ.get("GEO_FILTER", "1").lower() not in ("0", "false", "no")
+
+IN_AREA = "in_area"
+BORDERLINE = "borderline"
+OUT_OF_AREA = "out_of_area"
+
+POSTCODE_RE = re.compile(r"([A-Z]{1,2})([0-9][A-Z0-9]?)([0-9][A-Z]{2})?")
+
+# numpy is only imported to build or load the table, so importing this module stays cheap
+ROW_DTYPE = [("code", "S4"), ("min_km", "<f4"), ("max_km", "<f4")]
+
+logger = logging.getLogger(__name__)
+
+
+def outward_code(postcode: str):
+    """"hp4 3qh" -> ("HP", "HP4"); a bare outward code works too. None if it isn't a postcode."""
+    match = POSTCODE_RE.fullmatch("".join(postcode.split()).upper())
+    if not match:
+        return None
+    return match.group(1), match.group(1) + match.group(2)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance (haversine)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def build_table(csv_path: str = OUTCODES_CSV, out_path: str = GEO_INDEX_FILE):
+    """Compile the CSV into rows of (code, nearest km, furthest km) from the shop, sorted by code."""
+    import numpy as np
+
+    rows = []
+    with open(csv_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith("code,"):
+                continue
+            code, lat, lon, spread = (part.strip() for part in line.split(","))
+            centre = distance_km(SHOP_LATITUDE, SHOP_LONGITUDE, float(lat), float(lon))
+            spread = float(spread)
+            rows.append((code.upper().encode(), max(0.0, centre - spread), centre + spread))
+    table = np.array(sorted(rows), dtype=ROW_DTYPE)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp = out_path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp, out_path)
+    return len(table)
+
+
+class GeoIndex:
+    """The compiled table, memory-mapped read-only."""
+
+    def __init__(self, path: str = GEO_INDEX_FILE):
+        import numpy as np
+
+        self.table = np.load(path, mmap_mode="r")
+        self.codes = self.table["code"]
+
+    def _row(self, code: str):
+        key = code.encode()
+        i = int(self.codes.searchsorted(key))
+        if i < len(self.codes) and self.codes[i] == key:
+            return self.table[i]
+        return None
+
+    def classify(self, postcode: str, radius_km: float = SERVICE_RADIUS_KM):
+        """IN_AREA, BORDERLINE or OUT_OF_AREA for a postcode (or a bare outward code)."""
+        codes = outward_code(postcode)
+        if codes is None:
+            return BORDERLINE
+        area, outward = codes
+        # The district if we have it, otherwise the whole postcode area
+        row = self._row(outward)
+        if row is None:
+            row = self._row(area)
+        if row is None:
+            return BORDERLINE
+        if row["max_km"] <= radius_km:
+            return IN_AREA
+        if row["min_km"] > radius_km * BORDER_FACTOR:
+            return OUT_OF_AREA
+        return BORDERLINE
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_geo_index():
+    """Load the table on first use, (re)building it when the CSV is newer."""
+    global _index
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _index is None:
+            if not os.path.exists(GEO_INDEX_FILE) or (
+                    os.path.exists(OUTCODES_CSV) and os.path.getmtime(OUTCODES_CSV) > os.path.getmtime(GEO_INDEX_FILE)):
+                rows = build_table()
+                logger.info("Built outward-code table: %d codes", rows)
+            _index = GeoIndex()
+    return _index
+
+
+def classify_postcode(postcode: str):
+    """Service-area class of a postcode; BORDERLINE when the filter is off or the table is unusable."""
+    if not GEO_FILTER_ENABLED:
+        return BORDERLINE
+    try:
+        return get_geo_index().classify(postcode)
+    except Exception as e:
+        logger.warning("Outward-code lookup failed: %s", e)
+        return BORDERLINE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the outward-code table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Compile data/outcodes.csv")
+    check = sub.add_parser("check", help="Classify postcodes against the service radius")
+    check.add_argument("postcodes", nargs="+")
+    check.add_argument("--radius", type=float, default=SERVICE_RADIUS_KM)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(f"Compiled {build_table()} outward codes into {GEO_INDEX_FILE}")
+    else:
+        index = get_geo_index()
+        for postcode in args.postcodes:
+            print(f"{postcode}: {index.classify(postcode, args.radius)}")
+
+
+if __name__ == "__main__":
+    main()
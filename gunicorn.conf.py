@@ -0,0 +1,129 @@
+"""Production server profile: `gunicorn` (this file is picked up from the working directory).
+
+The app, agents, indexes and pre-rendered audio are loaded once in the master before it
+forks, so workers share those pages copy-on-write instead of each building its own copy.
+Threads don't survive a fork, so each worker restarts its log writer, trace exporter and
+agent loop, and opens its own connections during warm-up.
+
+SERVER_WORKER_MODEL  "thread" (gthread, default) or "gevent"
+SERVER_WORKERS       worker processes (default 1, see below)
+SERVER_MAX_WORKERS   cap on the derived worker count (default 1)
+SERVER_THREADS       threads per gthread worker (default: enough for admission control's
+                     running + queued turns)
+SERVER_PRELOAD       0 to import the app in each worker instead (slower boot, more memory)
+
+Worker sizing from CPUs and memory (derived_workers) is inactive by default: conversation
+history, booking flows and turn de-duplication live in worker memory, so SERVER_MAX_WORKERS
+is 1. Raise it only behind sticky routing (or once sessions are stored out of process); the
+derived count then applies up to that cap.
+
+Graceful reload: `kill -HUP <master>` re-reads this file and replaces workers once their
+in-flight turns finish. With preload, new code needs a new master: `kill -USR2 <master>`,
+then `kill -QUIT <old master>` once the new one is serving.
+"""
+import gc
+import os
+
+WORKER_MODEL = os.environ.get("SERVER_WORKER_MODEL", "thread").lower()
+if WORKER_MODEL == "gevent":
+    # Patch before anything else is imported (the app included), or it keeps blocking sockets
+    from gevent import monkey
+
+    try:
+        # httpcore imports trio when it's installed, and trio needs select.epoll, which
+        # patching removes; importing it first is harmless since nothing here runs trio
+        import trio  # noqa: F401
+    except ImportError:
+        pass
+    monkey.patch_all()
+
+import admission  # noqa: E402
+
+# Rough private memory per worker once shared pages are accounted for, and the master's own
+WORKER_MEMORY_MB = int(os.environ.get("SERVER_WORKER_MEMORY_MB", "150"))
+MASTER_MEMORY_MB = int(os.environ.get("SERVER_MASTER_MEMORY_MB", "200"))
+# Sessions are per process, so this stays 1 (and derived_workers has no effect) unless
+# requests are routed stickily
+MAX_WORKERS = int(os.environ.get("SERVER_MAX_WORKERS", "1"))
+
+
+def cpu_limit() -> float:
+    """CPUs this process may use: the cgroup quota if there is one, else the affinity mask."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        return float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return float(os.cpu_count() or 1)
+
+
+def memory_limit_mb() -> int:
+    """Memory available to the container (cgroup v2, then v1), else physical memory."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+
+
+def derived_workers() -> int:
+    # I/O-bound threads: two workers per CPU; gevent: one per CPU. Never more than memory allows.
+    by_cpu = max(1, round(cpu_limit() * (1 if WORKER_MODEL == "gevent" else 2)))
+    by_memory = max(1, (memory_limit_mb() - MASTER_MEMORY_MB) // WORKER_MEMORY_MB)
+    return min(by_cpu, by_memory, MAX_WORKERS)
+
+
+if WORKER_MODEL == "gevent":
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("SERVER_WORKER_CONNECTIONS", "256"))
+elif WORKER_MODEL == "thread":
+    worker_class = "gthread"
+    threads = int(os.environ.get("SERVER_THREADS", admission.MAX_CONCURRENT + admission.MAX_QUEUE))
+else:
+    raise ValueError(f"SERVER_WORKER_MODEL must be 'thread' or 'gevent', not {WORKER_MODEL!r}")
+
+wsgi_app = "main:app"
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get("SERVER_WORKERS") or os.environ.get("WEB_CONCURRENCY") or derived_workers())
+preload_app = os.environ.get("SERVER_PRELOAD", "1").lower() not in ("0", "false", "no")
+# Agent turns with tool calls and TTS can take a while; let them finish on reload
+timeout = 120
+graceful_timeout = 60
+keepalive = 5
+accesslog = None
+
+# Warm-up opens connections, which must not be shared across a fork; workers run it instead
+# (remembered in the environment, since a HUP reload runs this file again)
+_warm_up = os.environ.setdefault("SERVER_WARMUP", os.environ.get("WARMUP", "1"))
+if preload_app:
+    os.environ["WARMUP"] = "0"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import main
+
+    main.preload(render_audio=_warm_up.lower() not in ("0", "false", "no"))
+    # Keep the garbage collector from touching (and so copying) everything loaded so far
+    gc.freeze()
+    server.log.info("Preloaded app state; %d %s worker(s)", workers, worker_class)
+
+
+def post_fork(server, worker):
+    os.environ["WARMUP"] = _warm_up
+    if not preload_app:
+        return
+    import main
+
+    main.after_fork()
+    main.start_warm_up()
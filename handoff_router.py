@@ -0,0 +1,128 @@
+import os
+import re
+
+import numpy as np
+
+from embeddings import embed
+
+# Set ROUTER=0 to leave every specialist choice to the model's own handoffs
+ROUTER_ENABLED = os.environ.get("ROUTER", "1").lower() not in ("0", "false", "no")
+# The classifier only routes when the best centroid is this similar...
+ROUTER_MIN_SCORE = float(os.environ.get("ROUTER_MIN_SCORE", "0.2"))
+# ...and beats the runner-up by at least this much
+ROUTER_MIN_MARGIN = float(os.environ.get("ROUTER_MIN_MARGIN", "0.1"))
+# Moving the user away from a specialist other than Monty takes a much clearer lead: a question
+# to Mindy that mentions Monty is still a question for Mindy
+ROUTER_SWITCH_MARGIN = float(os.environ.get("ROUTER_SWITCH_MARGIN", "0.35"))
+# Where the classifier may move the user from at the normal margin (None: triage)
+HOME_LABELS = (None, "monty")
+
+# Labelled example questions, keyed by the MontyAgents attribute of the specialist.
+# Questions *about* Mindy stay with Monty (his instructions cover them); only wanting
+# to talk to her goes to Mindy.
+ROUTE_EXAMPLES = {
+    "monty": [
+        "What are your opening hours?",
+        "Where can I park when I visit?",
+        "Do you sell Kawai digital pianos?",
+        "Can I book a piano tuning?",
+        "How much does a tuning cost?",
+        "Do you have any second hand uprights for sale?",
+        "Where is the shop?",
+        "Can you deliver a piano to Tring?",
+        "Do you buy old pianos?",
+        "What grand pianos do you have in stock?",
+        "Do you do piano removals?",
+        "Can I rent a piano?",
+        "How often should my piano be tuned?",
+        "What's the difference between a digital and an acoustic piano?",
+        "Is Mindy your girlfriend?",
+        "Who is Mindy?",
+        "Tell me about Mindy",
+        "What is Mindy like?",
+        "Are you and Mindy dating?",
+        "What do you think of Mindy?",
+        "Take me back to Monty",
+        "Can I speak to Monty again?",
+        "I want to talk about pianos",
+    ],
+    "mindy": [
+        "Can I talk to Mindy?",
+        "Put Mindy on",
+        "Let me speak to Mindy please",
+        "I want to chat with Mindy",
+        "Get Mindy",
+        "Hand me over to Mindy",
+        "Mindy are you there?",
+        "Hi Mindy!",
+        "Can I speak to your girlfriend?",
+        "Let me talk to your girlfriend",
+    ],
+}
+
+# Cheap rules checked before the classifier: (pattern, target)
+KEYWORD_RULES = [
+    (re.compile(r"\b(talk|speak|chat)\w*\s+(to|with)\s+(mindy|your girlfriend)\b", re.IGNORECASE), "mindy"),
+    (re.compile(r"\b(put|get|bring|pass|hand)\b.*\b(mindy|your girlfriend)\b", re.IGNORECASE), "mindy"),
+    (re.compile(r"\b(talk|speak|chat)\w*\s+(to|with)\s+monty\b", re.IGNORECASE), "monty"),
+    (re.compile(r"\bback to monty\b", re.IGNORECASE), "monty"),
+]
+
+# "I don't want to talk to Mindy", "please don't put Mindy on": nothing is routed, the agent decides
+NEGATION_RE = re.compile(
+    r"\b(don[\u2019']?t|do not|doesn[\u2019']?t|won[\u2019']?t|not|never|no|rather not|stop)\b"
+    r"[^.!?,;]*\b(mindy|monty|girlfriend)\b",
+    re.IGNORECASE,
+)
+
+# A "yes" to the previous reply's offer to pass the user on: (offer pattern, target)
+OFFER_RULES = [
+    (re.compile(r"\b(talk|speak|chat)\w*\s+(to|with)\s+(her|mindy)\b", re.IGNORECASE), "mindy"),
+    (re.compile(r"\bpass you back to monty\b", re.IGNORECASE), "monty"),
+]
+AFFIRMATIVE_RE = re.compile(
+    r"^\s*(yes|yeah|yep|yup|sure|ok(ay)?|go on|go ahead|please( do)?|why not|of course)\b[\s!.,]*(please)?[\s!.]*$",
+    re.IGNORECASE,
+)
+
+
+class HandoffRouter:
+    """Picks the specialist agent for a turn locally, so the run can start there directly."""
+
+    def __init__(self, examples=ROUTE_EXAMPLES):
+        self.labels = list(examples)
+        centroids = np.stack([np.mean([embed(q) for q in examples[label]], axis=0) for label in self.labels])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def classify(self, text: str):
+        """Return (label, score, margin) for the closest centroid."""
+        scores = self.centroids @ embed(text)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        return self.labels[order[0]], best, best - runner_up
+
+    def route(self, message: str, last_reply: str = None, current: str = None):
+        """Return (target, method, score); target is None when the model should decide.
+
+        current is the label of the agent that has the conversation (None for triage).
+        Rules come first: a "yes" to an offer to pass the user on, then explicit requests,
+        unless the message says it doesn't want someone. The centroid classifier only answers
+        when it is confident, and only moves the user off Mindy when it is very confident.
+        """
+        if not ROUTER_ENABLED:
+            return None, "disabled", 0.0
+        if last_reply and AFFIRMATIVE_RE.match(message):
+            for pattern, target in OFFER_RULES:
+                if pattern.search(last_reply):
+                    return target, "offer", 1.0
+        if NEGATION_RE.search(message):
+            return None, "negated", 0.0
+        for pattern, target in KEYWORD_RULES:
+            if pattern.search(message):
+                return target, "keyword", 1.0
+        label, score, margin = self.classify(message)
+        min_margin = ROUTER_MIN_MARGIN if label == current or current in HOME_LABELS else ROUTER_SWITCH_MARGIN
+        if score >= ROUTER_MIN_SCORE and margin >= min_margin:
+            return label, "classifier", score
+        return None, "low_confidence", score
@@ -0,0 +1,247 @@
+"""Local search over the shop's documents, replacing the hosted vector store round trip.
+
+Documents (.md / .txt) live in knowledge/. They are split into short chunks, embedded
+once with embeddings.embed and stored as a float32 matrix that the app memory-maps,
+so a search is one matrix-vector product.
+
+    python knowledge_index.py build              # (re)index changed documents only
+    python knowledge_index.py build --full       # re-embed everything
+    python knowledge_index.py query "Do you hire pianos?"
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from embeddings import EMBEDDING_DIM, embed
+
+KNOWLEDGE_DIR = os.environ.get("KNOWLEDGE_DIR", "knowledge")
+KNOWLEDGE_INDEX_DIR = os.environ.get("KNOWLEDGE_INDEX_DIR", "knowledge_index")
+# Results handed to the model per search, and the most characters kept from each
+KNOWLEDGE_TOP_K = int(os.environ.get("KNOWLEDGE_TOP_K", "3"))
+SNIPPET_CHARS = int(os.environ.get("KNOWLEDGE_SNIPPET_CHARS", "400"))
+CHUNK_CHARS = 300
+DOC_EXTENSIONS = (".md", ".txt")
+
+VECTORS_FILE = "vectors.npy"
+IDF_FILE = "idf.npy"
+CHUNKS_FILE = "chunks.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+logger = logging.getLogger(__name__)
+
+
+def split_chunks(text: str, max_chars: int = CHUNK_CHARS):
+    """Split on blank lines, packing paragraphs into chunks of up to max_chars."""
+    chunks = []
+    current = ""
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _list_documents(docs_dir):
+    paths = []
+    for root, _, files in os.walk(docs_dir):
+        for name in sorted(files):
+            if name.endswith(DOC_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def _load_existing(index_dir):
+    """Previous manifest, chunks and vectors (or empties when there is no index yet)."""
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(os.path.join(index_dir, CHUNKS_FILE), encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f if line.strip()]
+        vectors = np.load(os.path.join(index_dir, VECTORS_FILE))
+    except (OSError, ValueError):
+        return {"documents": {}}, [], np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    return manifest, chunks, vectors
+
+
+def build_index(docs_dir: str = KNOWLEDGE_DIR, index_dir: str = KNOWLEDGE_INDEX_DIR, full: bool = False):
+    """Embed new or changed documents, reuse vectors for unchanged ones, drop deleted ones.
+
+    Files are written to temporary names and swapped in, so a running app never
+    reads a half-written index. Returns (documents, chunks, re-embedded chunks).
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    old_manifest, old_chunks, old_vectors = ({"documents": {}}, [], None) if full else _load_existing(index_dir)
+    old_docs = old_manifest.get("documents", {})
+
+    documents = {}
+    chunks = []
+    rows = []
+    embedded = 0
+    for path in _list_documents(docs_dir):
+        source = os.path.relpath(path, docs_dir)
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        previous = old_docs.get(source)
+        start = len(chunks)
+        if previous and previous["sha256"] == digest and old_vectors is not None:
+            first, last = previous["rows"]
+            chunks.extend(old_chunks[first:last])
+            rows.append(old_vectors[first:last])
+        else:
+            pieces = split_chunks(text)
+            chunks.extend({"source": source, "text": piece} for piece in pieces)
+            rows.append(np.stack([embed(piece) for piece in pieces]) if pieces
+                        else np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+            embedded += len(pieces)
+        documents[source] = {"sha256": digest, "rows": [start, len(chunks)]}
+
+    vectors = np.concatenate(rows).astype(np.float32) if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    # Down-weight features found in most chunks ("piano", "the") when scoring queries
+    document_frequency = np.count_nonzero(vectors, axis=0)
+    idf = (np.log((len(vectors) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+
+    def write(name, writer):
+        tmp = os.path.join(index_dir, name + ".tmp")
+        writer(tmp)
+        os.replace(tmp, os.path.join(index_dir, name))
+
+    def write_chunks(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk) + "\n")
+
+    def write_vectors(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, vectors)
+
+    def write_idf(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, idf)
+
+    def write_manifest(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"built_at": time.time(), "dim": EMBEDDING_DIM, "documents": documents}, f, indent=2)
+
+    # Manifest last: it is what the app watches for a new index
+    write(CHUNKS_FILE, write_chunks)
+    write(VECTORS_FILE, write_vectors)
+    write(IDF_FILE, write_idf)
+    write(MANIFEST_FILE, write_manifest)
+    return len(documents), len(chunks), embedded
+
+
+class KnowledgeIndex:
+    """A built index, with the vectors memory-mapped read-only."""
+
+    def __init__(self, index_dir: str = KNOWLEDGE_INDEX_DIR):
+        self.index_dir = index_dir
+        self.manifest_mtime = os.path.getmtime(os.path.join(index_dir, MANIFEST_FILE))
+        self.vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode="r")
+        self.idf = np.load(os.path.join(index_dir, IDF_FILE))
+        with open(os.path.join(index_dir, CHUNKS_FILE), encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f if line.strip()]
+
+    def search(self, query: str, k: int = KNOWLEDGE_TOP_K):
+        """Return up to k (score, chunk) pairs, best first."""
+        if not len(self.chunks):
+            return []
+        scores = self.vectors @ (embed(query) * self.idf)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.chunks[i]) for i in top if scores[i] > 0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(index_dir: str = KNOWLEDGE_INDEX_DIR):
+    """Load the index on first use and reload it after a rebuild; never builds it (see ensure_index)."""
+    global _index
+    try:
+        mtime = os.path.getmtime(os.path.join(index_dir, MANIFEST_FILE))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No knowledge index in {index_dir}/: run `python knowledge_index.py build`") from None
+    index = _index
+    if index is not None and index.manifest_mtime == mtime:
+        return index
+    with _index_lock:
+        if _index is None or _index.manifest_mtime != mtime:
+            _index = KnowledgeIndex(index_dir)
+        return _index
+
+
+def ensure_index(index_dir: str = KNOWLEDGE_INDEX_DIR):
+    """Build the index if it's missing, then load it. For startup (preload, warm-up), not for searches."""
+    if not os.path.exists(os.path.join(index_dir, MANIFEST_FILE)):
+        documents, chunks, _ = build_index(index_dir=index_dir)
+        logger.info("Built knowledge index: %d documents, %d chunks", documents, chunks)
+    return get_index(index_dir)
+
+
+def trim_snippet(text: str, max_chars: int = SNIPPET_CHARS) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def search_shop_knowledge(query: str) -> str:
+    """Search Montague Pianos' own documents (services, prices, visiting, policies) for the query.
+
+    Args:
+        query: What the customer wants to know, e.g. "piano hire" or "parking".
+    """
+    try:
+        results = get_index().search(query)
+    except Exception as e:
+        logger.warning("Knowledge search failed: %s", e)
+        return "The shop documents can't be searched right now."
+    if not results:
+        return "Nothing in the shop documents matches that."
+    return "\n\n".join(f"[{chunk['source']}] {trim_snippet(chunk['text'])}" for _, chunk in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local knowledge index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Index new and changed documents")
+    build.add_argument("--docs", default=KNOWLEDGE_DIR)
+    build.add_argument("--index", default=KNOWLEDGE_INDEX_DIR)
+    build.add_argument("--full", action="store_true", help="Re-embed every document")
+    query = sub.add_parser("query", help="Run a search against the built index")
+    query.add_argument("text")
+    query.add_argument("--index", default=KNOWLEDGE_INDEX_DIR)
+    query.add_argument("-k", type=int, default=KNOWLEDGE_TOP_K)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        documents, chunks, embedded = build_index(args.docs, args.index, full=args.full)
+        print(f"Indexed {documents} documents, {chunks} chunks ({embedded} re-embedded) "
+              f"in {time.perf_counter() - start:.2f}s")
+    else:
+        index = get_index(args.index)
+        start = time.perf_counter()
+        results = index.search(args.text, args.k)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        for score, chunk in results:
+            print(f"{score:.3f}  [{chunk['source']}] {trim_snippet(chunk['text'], 160)}")
+        print(f"({elapsed_us:.0f}us)")
+
+
+if __name__ == "__main__":
+    main()
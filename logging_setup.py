@@ -0,0 +1,173 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Only ever switch this on when debugging locally (read again by configure_logging)
+LOG_PII = os.environ.get("LOG_PII", "").lower() in ("1", "true", "yes")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+session_id_var = contextvars.ContextVar("session_id", default=None)
+
+_listener = None
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_RE = re.compile(r"(?<!\d)(?:\+44\s?|0)\d(?:[\s-]?\d){8,9}(?!\d)")
+POSTCODE_RE = re.compile(r"\b([A-Z]{1,2}[0-9][A-Z0-9]?) ?[0-9][A-Z]{2}\b", re.IGNORECASE)
+
+
+class pii:
+    """Wrap a customer value (name, address, phone) so it only reaches the logs when LOG_PII is set."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return str(self.value) if LOG_PII else "[redacted]"
+
+    __repr__ = __str__
+
+
+def redact(text: str) -> str:
+    """Mask emails, phone numbers and the inward half of postcodes."""
+    if LOG_PII or not text:
+        return text
+    text = EMAIL_RE.sub("[email]", text)
+    text = PHONE_RE.sub("[phone]", text)
+    return POSTCODE_RE.sub(lambda m: m.group(1).upper() + " ***", text)
+
+
+class ContextFilter(logging.Filter):
+    """Stamp each record with the current request and session IDs."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+
+class RedactingQueueHandler(QueueHandler):
+    """Format on the calling thread, redact, and hand the record to the listener thread."""
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.msg = redact(record.msg)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "session_id", None):
+            entry["session_id"] = record.session_id
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not getattr(record, "request_id", None):
+            record.request_id = "-"
+        return super().format(record)
+
+
+def _parse_levels(spec: str) -> dict:
+    levels = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        name, level = part.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Route all logging through a queue so request threads never block on stdout.
+
+    Settings come from the environment, so call this after load_dotenv():
+    LOG_LEVEL (root level), LOG_LEVELS ("main=DEBUG,agents=WARNING"),
+    LOG_FORMAT ("json" or "text") and LOG_PII.
+    """
+    global _listener, LOG_PII
+    if _listener is not None:
+        return
+
+    LOG_PII = os.environ.get("LOG_PII", "").lower() in ("1", "true", "yes")
+    log_format = os.environ.get("LOG_FORMAT", "json").lower()
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = RedactingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def restart_after_fork():
+    """In a forked child the listener thread is gone; start a fresh queue and listener."""
+    global _listener
+    _listener = None
+    configure_logging()
+
+
+def bind_request(session_id=None, request_id=None):
+    """Set the correlation IDs attached to every log line for the current request."""
+    request_id_var.set(request_id or uuid.uuid4().hex[:12])
+    session_id_var.set(session_id)
+    return request_id_var.get()
+
+
+def init_app(app):
+    """Bind request/session IDs around each Flask request and echo X-Request-ID."""
+    from flask import request
+
+    @app.before_request
+    def _bind_ids():
+        data = request.get_json(silent=True) if request.is_json else None
+        session_id = data.get("session_id") if isinstance(data, dict) else None
+        bind_request(session_id, (request.headers.get("X-Request-ID") or "")[:64] or None)
+
+    @app.after_request
+    def _echo_request_id(response):
+        request_id = request_id_var.get()
+        if request_id:
+            response.headers["X-Request-ID"] = request_id
+        return response
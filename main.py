@@ -1,13 +1,8 @@
 from dotenv import load_dotenv
 import os
-from flask import Flask, request, Response, render_template, jsonify
-from openai import OpenAI
+from flask import Flask, request, Response, render_template, jsonify, g
 import asyncio
-import numpy as np
-from agents import Agent, Runner, function_tool, ModelSettings
-from agents.tool import WebSearchTool, FileSearchTool, FunctionTool, ComputerTool
-from agents.extensions.handoff_prompt import prompt_with_handoff_instructions
-from elevenlabs import ElevenLabs
+import functools
 import json
 import io
 import requests
@@ -15,111 +10,247 @@ from datetime import datetime, timedelta
 import re
 import uuid
 import pprint
+import logging
+import threading
+import time
+import contextvars
 from flask_cors import CORS
+from logging_setup import configure_logging, pii
+import logging_setup
+from tool_memo import RunMemo, memoize_tools, no_memo
+import model_tiers
+import metrics
+import traffic_recorder
+import admission
+import turn_dedup
+import cancellation
+import audio_composer
+import availability_replica
+import geo_index
+import availability_batch
+import static_assets
+import turn_events
+import ws_channel
+from transcript import Transcript
+from metrics import timed
 
 # Load environment variables
 load_dotenv()
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-# Initialize ElevenLabs client with error handling
-try:
-    elevenlabs_api_key = os.environ.get("ELEVENLABS_API_KEY")
-    if not elevenlabs_api_key:
-        print("Warning: ELEVENLABS_API_KEY not found in environment variables")
-    elevenlabs_client = ElevenLabs(api_key=elevenlabs_api_key)
-    print("ElevenLabs client initialized successfully")
-except Exception as e:
-    print(f"Error initializing ElevenLabs client: {str(e)}")
-    elevenlabs_client = None
+# First, so its reply compression runs after every other hook
+static_assets.init_app(app)
+logging_setup.init_app(app)
+metrics.init_app(app)
+traffic_recorder.init_app(app)
+turn_dedup.init_app(app)
+cancellation.init_app(app)
+admission.init_app(app)
+
+# The OpenAI/ElevenLabs SDKs and the agents are heavy to import and build, so they are
+# created on first use. That keeps cold starts fast for '/' and static files.
+_client = None
+_elevenlabs_client = None
+_elevenlabs_loaded = False
+_lazy_lock = threading.Lock()
+
+# The MCP booking server. Point this at a local stub for benchmarks.
+BOOKING_API_URL = os.environ.get('BOOKING_API_URL', 'https://monty-mcp.onrender.com').rstrip('/')
+
+def new_booking_session():
+    """One keep-alive session for every call to the booking backend, with room for a full batch lookup."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=availability_batch.MAX_PARALLEL)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+booking_session = new_booking_session()
+
+def get_openai_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lazy_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _client
+
+def get_elevenlabs_client():
+    """Return the ElevenLabs client, or None if it could not be initialized."""
+    global _elevenlabs_client, _elevenlabs_loaded
+    if not _elevenlabs_loaded:
+        with _lazy_lock:
+            if not _elevenlabs_loaded:
+                # Initialize ElevenLabs client with error handling
+                try:
+                    from elevenlabs import ElevenLabs
+                    elevenlabs_api_key = os.environ.get("ELEVENLABS_API_KEY")
+                    if not elevenlabs_api_key:
+                        logger.warning("ELEVENLABS_API_KEY not found in environment variables")
+                    _elevenlabs_client = ElevenLabs(api_key=elevenlabs_api_key, base_url=os.environ.get('ELEVENLABS_BASE_URL'))
+                    logger.info("ElevenLabs client initialized")
+                except Exception as e:
+                    logger.error("Error initializing ElevenLabs client: %s", e)
+                    _elevenlabs_client = None
+                _elevenlabs_loaded = True
+    return _elevenlabs_client
 
 # Store conversation history
 conversation_history = {}
 
+_availability_replica = None
+
+def fetch_available_slots(postcode: str):
+    """The booking backend's slots for a postcode (used by the replica's background sync)."""
+    with timed('availability_request', source='sync'):
+        response = booking_session.post(
+            f'{BOOKING_API_URL}/check-availability',
+            json={'postcode': postcode},
+            headers={'Content-Type': 'application/json'},
+            timeout=30
+        )
+    if response.status_code == 400:
+        return []
+    response.raise_for_status()
+    return response.json().get('available_slots', [])
+
+def get_availability_replica():
+    """The local availability replica, or None when AVAILABILITY_REPLICA=0."""
+    global _availability_replica
+    if not availability_replica.REPLICA_ENABLED:
+        return None
+    if _availability_replica is None:
+        with _lazy_lock:
+            if _availability_replica is None:
+                _availability_replica = availability_replica.AvailabilityReplica(fetch_available_slots)
+    return _availability_replica
+
+_slot_lookup = None
+
+def get_slot_lookup():
+    """Structured, concurrent availability lookups for many postcodes (see availability_batch)."""
+    global _slot_lookup
+    if _slot_lookup is None:
+        replica = get_availability_replica()
+        with _lazy_lock:
+            if _slot_lookup is None:
+                _slot_lookup = availability_batch.SlotLookup(fetch_available_slots, replica)
+    return _slot_lookup
+
+def forget_booked_slot(slot_date: str, slot_time: str):
+    """A slot we just booked is gone for everyone; don't offer it from the replica."""
+    replica = get_availability_replica()
+    if replica is not None:
+        replica.remove_slot(slot_date, slot_time)
+
+def format_availability_reply(slots) -> str:
+    """Turn the booking backend's slot list into Monty's availability reply."""
+    total_slots = len(slots)
+    
+    if not slots:
+        return "I couldn't find any available slots that meet our distance criteria. Please call Lee on 01442 876131 to discuss your booking."
+    
+    # Format the slots into a readable message
+    slot_list = []
+    for i, slot in enumerate(slots[:5], 1):
+        try:
+            # Convert date format to readable format
+            date_obj = datetime.strptime(slot['date'], '%Y-%m-%d')
+            formatted_date = date_obj.strftime('%A, %B %d')
+            
+            # Format time
+            time_str = slot['time']
+            try:
+                time_obj = datetime.strptime(time_str, '%H:%M')
+                display_time = time_obj.strftime('%-I:%M %p').lower()
+                if display_time.startswith('0'):
+                    display_time = display_time[1:]
+            except:
+                display_time = time_str
+            
+            slot_list.append(f"{i}. {formatted_date} at {display_time}")
+        except Exception as slot_err:
+            logger.warning("Error formatting slot %d: %s", i, slot_err)
+            continue
+    
+    if not slot_list:
+        return "I found some available slots but had trouble formatting them. Please call Lee on 01442 876131 to check availability."
+    
+    # Add a note if we're only showing a subset of slots
+    additional_info = ""
+    if total_slots > 5:
+        additional_info = f"\n\n(Showing 5 of {total_slots} available slots)"
+    
+    message = (
+        f"Thank you for your patience! I found {total_slots} suitable tuning slots:\n\n" +
+        "\n".join(slot_list) +
+        additional_info +
+        "\n\nWould any of these times work for you? If not, I can suggest more options."
+    )
+    return message
+
 # This is the normal function without the decorator, for direct calling
 def check_piano_tuning_availability_direct(postcode: str) -> str:
     """Check available piano tuning slots. Direct callable version without the function_tool decorator."""
     try:
-        print(f"\n==================================================")
-        print(f"Checking availability for postcode: {postcode}")
+        logger.debug("Checking availability for postcode: %s", postcode)
+        turn_events.status('checking_availability')
         
         # Clean up the postcode - remove any special characters that might cause issues
         postcode = re.sub(r'[^A-Za-z0-9\s]', '', postcode).strip()
-        print(f"Cleaned postcode: {postcode}")
+        logger.debug("Cleaned postcode: %s", postcode)
+        
+        # Clearly too far from the shop: the backend would find nothing, so don't ask it
+        area = geo_index.classify_postcode(postcode)
+        metrics.inc('monty_geo_area_total', area=area)
+        if area == geo_index.OUT_OF_AREA:
+            logger.info("Postcode is outside the service area; skipping the booking backend")
+            return "I couldn't find any available slots that meet our distance criteria. Please call Lee on 01442 876131 to discuss your booking."
+        
+        # Answer from the local replica when it has a fresh copy for this postcode
+        replica = get_availability_replica()
+        slots = replica.lookup(postcode) if replica is not None else None
+        if slots is not None:
+            logger.debug("Answered availability from the local replica")
+            return format_availability_reply(slots)
         
-        # First try to get real data from the MCP server
+        # Otherwise get real data from the MCP server
         try:
             # Make request to the MCP server
-            print(f"Making request to MCP server: https://monty-mcp.onrender.com/check-availability")
-            print(f"Request payload: {{'postcode': '{postcode}'}}")
+            logger.debug("Making request to MCP server: %s/check-availability", BOOKING_API_URL)
             
-            response = requests.post(
-                'https://monty-mcp.onrender.com/check-availability',
-                json={'postcode': postcode},
-                headers={'Content-Type': 'application/json'},
-                timeout=30  # 30 second timeout
-            )
+            with timed('availability_request'):
+                response = booking_session.post(
+                    f'{BOOKING_API_URL}/check-availability',
+                    json={'postcode': postcode},
+                    headers={'Content-Type': 'application/json'},
+                    timeout=30  # 30 second timeout
+                )
             
-            print(f"Response status code: {response.status_code}")
+            logger.debug("Availability response status code: %s", response.status_code)
             
             if response.status_code == 200:
                 try:
                     # Parse the response
                     data = response.json()
                     slots = data.get('available_slots', [])
-                    total_slots = len(slots)
-                    
-                    print(f"Got {total_slots} total slots from MCP server")
-                    
-                    if not slots:
-                        return "I couldn't find any available slots that meet our distance criteria. Please call Lee on 01442 876131 to discuss your booking."
-                    
-                    # Format the slots into a readable message
-                    slot_list = []
-                    for i, slot in enumerate(slots[:5], 1):
-                        try:
-                            # Convert date format to readable format
-                            date_obj = datetime.strptime(slot['date'], '%Y-%m-%d')
-                            formatted_date = date_obj.strftime('%A, %B %d')
-                            
-                            # Format time
-                            time_str = slot['time']
-                            try:
-                                time_obj = datetime.strptime(time_str, '%H:%M')
-                                display_time = time_obj.strftime('%-I:%M %p').lower()
-                                if display_time.startswith('0'):
-                                    display_time = display_time[1:]
-                            except:
-                                display_time = time_str
-                            
-                            slot_list.append(f"{i}. {formatted_date} at {display_time}")
-                        except Exception as slot_err:
-                            print(f"Error formatting slot {i}: {slot_err}")
-                            continue
-                    
-                    if not slot_list:
-                        return "I found some available slots but had trouble formatting them. Please call Lee on 01442 876131 to check availability."
-                    
-                    # Add a note if we're only showing a subset of slots
-                    additional_info = ""
-                    if total_slots > 5:
-                        additional_info = f"\n\n(Showing 5 of {total_slots} available slots)"
-                    
-                    message = (
-                        f"Thank you for your patience! I found {total_slots} suitable tuning slots:\n\n" +
-                        "\n".join(slot_list) +
-                        additional_info +
-                        "\n\nWould any of these times work for you? If not, I can suggest more options."
-                    )
+                    logger.info("Got %d total slots from MCP server", len(slots))
+                    replica = get_availability_replica()
+                    if replica is not None:
+                        replica.store(postcode, slots)
                     
-                    print("Successfully retrieved and processed slots from MCP server")
-                    print("==================================================\n")
+                    message = format_availability_reply(slots)
+                    logger.debug("Successfully retrieved and processed slots from MCP server")
                     return message
                     
                 except Exception as parse_err:
-                    print(f"Error parsing response: {parse_err}")
+                    logger.error("Error parsing availability response: %s", parse_err)
                     return "I found some available slots but had trouble processing them. Please call Lee on 01442 876131 to check availability."
             
             elif response.status_code == 400:
@@ -129,25 +260,21 @@ def check_piano_tuning_availability_direct(postcode: str) -> str:
                 return f"The booking system returned an unexpected status code: {response.status_code}. Please call Lee on 01442 876131 to check availability."
             
         except requests.exceptions.ReadTimeout:
-            print("Request to MCP server timed out")
+            logger.warning("Request to MCP server timed out")
             return "I'm having trouble connecting to our booking system at the moment. This might be due to network issues. Please call Lee directly on 01442 876131 to check availability."
             
         except requests.exceptions.ConnectionError:
-            print("Connection error when connecting to MCP server")
+            logger.warning("Connection error when connecting to MCP server")
             return "I'm having trouble connecting to our booking system. Please call Lee directly on 01442 876131 to check availability."
             
         except Exception as e:
-            print(f"Error connecting to MCP server: {e}")
-            print(f"Error type: {type(e).__name__}")
+            logger.error("Error connecting to MCP server: %s (%s)", e, type(e).__name__)
             return f"I'm experiencing a technical issue connecting to our booking system. Please call Lee on 01442 876131 to check availability."
             
     except Exception as e:
-        print(f"Error in check_piano_tuning_availability: {e}")
-        print(f"Error type: {type(e).__name__}")
-        print("==================================================\n")
+        logger.error("Error in check_piano_tuning_availability: %s (%s)", e, type(e).__name__)
         return "I apologize, but I'm experiencing technical difficulties with our booking system. Please call Lee on 01442 876131 to discuss availability for piano tuning."
 
-@function_tool
 def check_piano_tuning_availability(postcode: str) -> str:
     """Check available piano tuning slots."""
     return check_piano_tuning_availability_direct(postcode)
@@ -218,41 +345,41 @@ def process_message(message: str, context: dict = None) -> str:
                 # Format the date and time for booking
                 formatted_date = format_date_for_booking(original_date)
                 formatted_time = format_time_for_booking(original_time)
+                # The slot as the backend (and the replica) lists it, before the adjustment below
+                slot_time = formatted_time
                 
                 # Only adjust time if it was originally in 12-hour format (contains am/pm)
                 if 'am' in original_time.lower() or 'pm' in original_time.lower():
                     hour, minute = map(int, formatted_time.split(':'))
                     adjusted_hour = (hour - 1) % 24
                     formatted_time = f"{adjusted_hour:02d}:{minute:02d}"
-                    print(f"Adjusted time from 12-hour format: {formatted_time}")
+                    logger.debug("Adjusted time from 12-hour format: %s", formatted_time)
                 else:
-                    print(f"Using original 24-hour format: {formatted_time}")
+                    logger.debug("Using original 24-hour format: %s", formatted_time)
                 
-                print(f"Attempting to book appointment:")
-                print(f"Original time: {original_time}")
-                print(f"Formatted time: {formatted_time}")
-                print(f"Date: {formatted_date}")
-                print(f"Customer: {customer_name}")
-                print(f"Address: {customer_address}")
-                print(f"Phone: {message}")
+                logger.info("Attempting to book appointment on %s at %s", formatted_date, formatted_time)
+                logger.debug("Original time: %s, customer: %s, address: %s, phone: %s",
+                             original_time, pii(customer_name), pii(customer_address), pii(message))
                 
                 # Make the booking request
-                response = requests.post(
-                    'https://monty-mcp.onrender.com/create-booking',
-                    json={
-                        'date': formatted_date,
-                        'time': formatted_time,
-                        'customer_name': customer_name,
-                        'address': customer_address,
-                        'phone': message
-                    },
-                    headers={'Content-Type': 'application/json'},
-                    timeout=30
-                )
+                turn_events.status('booking')
+                with timed('booking_request'):
+                    response = booking_session.post(
+                        f'{BOOKING_API_URL}/create-booking',
+                        json={
+                            'date': formatted_date,
+                            'time': formatted_time,
+                            'customer_name': customer_name,
+                            'address': customer_address,
+                            'phone': message
+                        },
+                        headers={'Content-Type': 'application/json'},
+                        timeout=30
+                    )
                 
-                print(f"Booking response status: {response.status_code}")
+                logger.info("Booking response status: %s", response.status_code)
                 if response.status_code != 200:
-                    print(f"Booking error response: {response.text}")
+                    logger.warning("Booking error response: %s", response.text)
                 
                 # Clear the booking context
                 context.pop('booking_stage', None)
@@ -263,6 +390,8 @@ def process_message(message: str, context: dict = None) -> str:
                 
                 if response.status_code == 200:
                     data = response.json()
+                    forget_booked_slot(formatted_date, slot_time)
+                    turn_events.status('booking_submitted')
                     # Format the date to be more readable
                     date_obj = datetime.strptime(formatted_date, '%Y-%m-%d')
                     formatted_date_display = date_obj.strftime('%A, %B %d')
@@ -273,10 +402,7 @@ def process_message(message: str, context: dict = None) -> str:
                     return f"I encountered an error while trying to book your appointment: {error_message}. Please call Lee on 01442 876131 for assistance."
                     
             except Exception as e:
-                print(f"Error in booking process: {e}")
-                print(f"Error type: {type(e).__name__}")
-                import traceback
-                print(f"Traceback: {traceback.format_exc()}")
+                logger.exception("Error in booking process: %s", e)
                 return f"I encountered an error while trying to book your appointment: {str(e)}. Please call Lee on 01442 876131 for assistance."
     
     # Check for time slot selection
@@ -300,17 +426,11 @@ def process_message(message: str, context: dict = None) -> str:
     # Default response
     return "I'm here to help with piano tuning appointments. Could you please provide your postcode so I can check available slots?"
 
-@function_tool
+@no_memo
 def book_piano_tuning(date: str, time: str, customer_name: str, address: str, phone: str) -> str:
     """Book a piano tuning appointment. Returns a confirmation or error message."""
-    print(f"\n==================================================")
-    print(f"book_piano_tuning tool called with real server")
-    print(f"Date: {date}")
-    print(f"Time: {time}")
-    print(f"Original Time Input: {time}")
-    print(f"Customer: {customer_name}")
-    print(f"Address: {address}")
-    print(f"Phone: {phone}")
+    logger.info("book_piano_tuning tool called for %s at %s", date, time)
+    logger.debug("Customer: %s, address: %s, phone: %s", pii(customer_name), pii(address), pii(phone))
     
     try:
         # Extract postcode from address for validation
@@ -319,42 +439,43 @@ def book_piano_tuning(date: str, time: str, customer_name: str, address: str, ph
             return "I need a valid UK postcode in your address to book the appointment. Please provide your complete address including postcode."
         
         extracted_postcode = postcode_match.group().strip()
-        print(f"Extracted postcode: {extracted_postcode}")
+        logger.debug("Extracted postcode: %s", extracted_postcode)
         
         # First, check if this time slot is actually available for this postcode
         # This prevents booking already-booked slots
         try:
-            print("Validating slot availability before booking...")
+            logger.debug("Validating slot availability before booking")
             
             # Clean up the postcode
             cleaned_postcode = re.sub(r'[^A-Za-z0-9\s]', '', extracted_postcode).strip()
             
             # Check availability
-            avail_response = requests.post(
-                'https://monty-mcp.onrender.com/check-availability',
-                json={'postcode': cleaned_postcode},
-                headers={'Content-Type': 'application/json'},
-                timeout=30  # Increase timeout to 30 seconds to avoid timeouts
-            )
+            with timed('availability_request'):
+                avail_response = booking_session.post(
+                    f'{BOOKING_API_URL}/check-availability',
+                    json={'postcode': cleaned_postcode},
+                    headers={'Content-Type': 'application/json'},
+                    timeout=30  # Increase timeout to 30 seconds to avoid timeouts
+                )
             
-            print(f"Availability check response status: {avail_response.status_code}")
+            logger.debug("Availability check response status: %s", avail_response.status_code)
             
             # Process the formatted time to check against available slots
             # Normalize the time for comparison
             booking_time = None
             try:
                 booking_time = format_time_for_booking(time)
-                print(f"Normalized time for availability check: {booking_time}")
+                logger.debug("Normalized time for availability check: %s", booking_time)
             except:
-                print("Could not normalize time for availability check")
+                logger.debug("Could not normalize time for availability check")
             
             # Process the formatted date for comparison
             formatted_date = None
             try:
                 formatted_date = format_date_for_booking(date)
-                print(f"Normalized date for availability check: {formatted_date}")
+                logger.debug("Normalized date for availability check: %s", formatted_date)
             except:
-                print("Could not normalize date for availability check")
+                logger.debug("Could not normalize date for availability check")
             
             # If we got a successful response, verify the slot is available
             if avail_response.status_code == 200 and booking_time and formatted_date:
@@ -367,27 +488,27 @@ def book_piano_tuning(date: str, time: str, customer_name: str, address: str, ph
                     if (slot.get('date') == formatted_date and 
                         slot.get('time') == booking_time):
                         slot_is_available = True
-                        print(f"Found matching slot: date={slot['date']}, time={slot['time']}")
+                        logger.debug("Found matching slot: date=%s, time=%s", slot['date'], slot['time'])
                         break
                 
                 if not slot_is_available:
-                    print(f"Requested slot {formatted_date} at {booking_time} is not available")
+                    logger.info("Requested slot %s at %s is not available", formatted_date, booking_time)
                     return f"I'm sorry, but the slot on {date} at {time} is not available. Please select a different time from the available options."
                 
-                print(f"Slot validated as available: {formatted_date} at {booking_time}")
+                logger.debug("Slot validated as available: %s at %s", formatted_date, booking_time)
             else:
                 # If we couldn't verify, continue with the booking anyway
-                print("Could not verify slot availability, proceeding with booking attempt")
+                logger.info("Could not verify slot availability, proceeding with booking attempt")
         
         except Exception as verify_err:
-            print(f"Error validating slot availability: {verify_err}")
+            logger.warning("Error validating slot availability: %s", verify_err)
             # Continue with booking even if verification fails
         
         # Format the date properly if needed
         try:
             formatted_date = format_date_for_booking(date)
         except Exception as date_err:
-            print(f"Error formatting date: {date_err}")
+            logger.warning("Error formatting date: %s", date_err)
             return "I couldn't understand the date format. Please provide it as shown in the available slots."
         
         # Format the time properly
@@ -395,61 +516,61 @@ def book_piano_tuning(date: str, time: str, customer_name: str, address: str, ph
             # Save the original time for display
             original_time = time
             booking_time = format_time_for_booking(time)
-            print(f"Final booking time: {booking_time}")
+            logger.debug("Final booking time: %s", booking_time)
         except Exception as time_err:
-            print(f"Error formatting time: {time_err}")
+            logger.warning("Error formatting time: %s", time_err)
             # Use the original time as fallback
             booking_time = time
-            print(f"Using original time as fallback: {booking_time}")
+            logger.debug("Using original time as fallback: %s", booking_time)
         
         # Try to book with the real MCP server
         try:
-            print(f"Making booking request to MCP server: https://monty-mcp.onrender.com/create-booking")
-            print(f"Request payload: date={formatted_date}, time={booking_time}, customer={customer_name}")
+            logger.debug("Making booking request to MCP server: %s/create-booking", BOOKING_API_URL)
+            logger.debug("Request payload: date=%s, time=%s, customer=%s", formatted_date, booking_time, pii(customer_name))
             
-            response = requests.post(
-                'https://monty-mcp.onrender.com/create-booking',
-                json={
-                    'date': formatted_date,
-                    'time': booking_time,
-                    'customer_name': customer_name,
-                    'address': address,
-                    'phone': phone
-                },
-                headers={'Content-Type': 'application/json'},
-                timeout=30  # Increase timeout to 30 seconds to avoid timeouts
-            )
+            turn_events.status('booking')
+            with timed('booking_request'):
+                response = booking_session.post(
+                    f'{BOOKING_API_URL}/create-booking',
+                    json={
+                        'date': formatted_date,
+                        'time': booking_time,
+                        'customer_name': customer_name,
+                        'address': address,
+                        'phone': phone
+                    },
+                    headers={'Content-Type': 'application/json'},
+                    timeout=30  # Increase timeout to 30 seconds to avoid timeouts
+                )
             
-            print(f"Response status code: {response.status_code}")
+            logger.info("Booking response status code: %s", response.status_code)
             
             if response.status_code == 200:
                 # Parse the response
                 data = response.json()
+                forget_booked_slot(formatted_date, booking_time)
+                turn_events.status('booking_submitted')
                 message = data.get('message', f"Your piano tuning appointment is all set for {date} at {original_time}.")
-                print("Successfully booked with MCP server")
-                print("==================================================\n")
+                logger.info("Successfully booked with MCP server")
                 return message
             else:
                 # Handle error response
                 try:
                     data = response.json()
                     error_message = data.get('error', f"Booking failed with status {response.status_code}. Please call Lee on 01442 876131.")
-                    print(f"Booking error: {error_message}")
-                    print("==================================================\n")
+                    logger.warning("Booking error: %s", error_message)
                     return error_message
                 except:
-                    print(f"Error parsing booking response")
-                    print("==================================================\n")
+                    logger.warning("Error parsing booking response")
                     return f"Booking failed with status {response.status_code}. Please call Lee on 01442 876131."
                 
         except Exception as req_err:
-            print(f"Error connecting to MCP server for booking: {req_err}")
+            logger.error("Error connecting to MCP server for booking: %s", req_err)
             # Fall back to a generic message
             return f"Due to a technical issue, I couldn't confirm your booking with our system. Please call Lee on 01442 876131 to confirm your appointment for {date} at {original_time}."
             
     except Exception as e:
-        print(f"Error in book_piano_tuning: {e}")
-        print("==================================================\n")
+        logger.exception("Error in book_piano_tuning: %s", e)
         # Ultimate fallback
         return "I apologize, but I encountered an error while trying to book your appointment. Please call Lee directly on 01442 876131 to book your piano tuning."
 
@@ -502,7 +623,7 @@ def format_date_for_booking(date: str) -> str:
 
 def format_time_for_booking(time: str) -> str:
     """Format a time string into HH:MM format for booking."""
-    print(f"\nFormatting time for booking: {time}")
+    logger.debug("Formatting time for booking: %s", time)
     
     # Remove any extraneous spaces or characters
     time = time.strip().lower()
@@ -515,7 +636,7 @@ def format_time_for_booking(time: str) -> str:
         match = re.match(r'^(\d{1,2}):(\d{2})$', time)
         hour = int(match.group(1))
         minute = int(match.group(2))
-        print(f"24-hour format detected: {hour:02d}:{minute:02d}")
+        logger.debug("24-hour format detected: %02d:%02d", hour, minute)
         return f"{hour:02d}:{minute:02d}"
     
     # Format: 12-hour time with am/pm (9:30am, 9:30 am, 9:30pm, 9:30 pm)
@@ -530,7 +651,7 @@ def format_time_for_booking(time: str) -> str:
         elif ampm == 'am' and hour == 12:
             hour = 0
         
-        print(f"12-hour format with am/pm detected: {hour:02d}:{minute:02d}")
+        logger.debug("12-hour format with am/pm detected: %02d:%02d", hour, minute)
         return f"{hour:02d}:{minute:02d}"
     
     # Format: Hour only with am/pm (9am, 9pm)
@@ -544,13 +665,13 @@ def format_time_for_booking(time: str) -> str:
         elif ampm == 'am' and hour == 12:
             hour = 0
         
-        print(f"Hour only with am/pm detected: {hour:02d}:00")
+        logger.debug("Hour only with am/pm detected: %02d:00", hour)
         return f"{hour:02d}:00"
     
     # Format: Hour only (9, 13)
     elif re.match(r'^(\d{1,2})$', time):
         hour = int(time)
-        print(f"Hour only detected: {hour:02d}:00")
+        logger.debug("Hour only detected: %02d:00", hour)
         return f"{hour:02d}:00"
     
     # Format: o'clock variants
@@ -563,27 +684,27 @@ def format_time_for_booking(time: str) -> str:
                 hour += 12
             elif "am" in time and hour == 12:
                 hour = 0
-            print(f"O'clock format detected: {hour:02d}:00")
+            logger.debug("O'clock format detected: %02d:00", hour)
             return f"{hour:02d}:00"
         
     # Natural language time
     elif any(word in time for word in ["morning", "afternoon", "evening"]):
         if "morning" in time:
             if "early" in time:
-                print("Early morning detected: 09:00")
+                logger.debug("Early morning detected: 09:00")
                 return "09:00"
             else:
-                print("Morning detected: 10:00")
+                logger.debug("Morning detected: 10:00")
                 return "10:00"
         elif "afternoon" in time:
             if "early" in time:
-                print("Early afternoon detected: 13:00")
+                logger.debug("Early afternoon detected: 13:00")
                 return "13:00"
             else:
-                print("Afternoon detected: 14:00")
+                logger.debug("Afternoon detected: 14:00")
                 return "14:00"
         elif "evening" in time:
-            print("Evening detected: 17:00")
+            logger.debug("Evening detected: 17:00")
             return "17:00"
     
     # If all else fails, try a more general regex to extract hours and minutes
@@ -599,10 +720,10 @@ def format_time_for_booking(time: str) -> str:
             elif ampm == 'am' and hour == 12:
                 hour = 0
             
-            print(f"General format detected: {hour:02d}:{minute:02d}")
+            logger.debug("General format detected: %02d:%02d", hour, minute)
             return f"{hour:02d}:{minute:02d}"
     
-    print(f"Could not format time: {time}")
+    logger.debug("Could not format time: %s", time)
     raise ValueError("Could not format time for booking")
 
 class VoiceSettings:
@@ -644,6 +765,69 @@ AGENT_VOICE_SETTINGS = {
     "Triage Agent": MONTY_VOICE_SETTINGS,
 }
 
+def openai_speech(text: str, voice_settings: VoiceSettings) -> bytes:
+    """Synthesize speech with OpenAI TTS and return the raw audio bytes."""
+    cancellation.check('tts')
+    chunks = []
+    with timed('tts', provider='openai'):
+        # Streamed so a cancelled turn can hang up mid-download instead of waiting for the whole clip
+        with get_openai_client().audio.speech.with_streaming_response.create(
+            model=voice_settings.model,
+            voice=voice_settings.voice,
+            input=text,
+            instructions=voice_settings.instructions
+        ) as speech_response:
+            for chunk in speech_response.iter_bytes(16384):
+                cancellation.check('tts')
+                chunks.append(chunk)
+    return b''.join(chunks)
+
+_audio_composer = None
+
+def get_audio_composer():
+    """Pre-rendered clips in Monty's voice for availability replies (None when switched off)."""
+    global _audio_composer
+    if not audio_composer.COMPOSED_AUDIO_ENABLED or MONTY_VOICE_SETTINGS.provider != "openai":
+        return None
+    if _audio_composer is None:
+        with _lazy_lock:
+            if _audio_composer is None:
+                fingerprint = audio_composer.voice_fingerprint(
+                    MONTY_VOICE_SETTINGS.model, MONTY_VOICE_SETTINGS.voice, MONTY_VOICE_SETTINGS.instructions)
+                _audio_composer = audio_composer.AudioComposer(
+                    os.path.join(audio_composer.AUDIO_SEGMENTS_DIR, fingerprint))
+    return _audio_composer
+
+def composed_speech(text: str, voice_settings: VoiceSettings):
+    """Audio for a templated reply joined from pre-rendered clips, or None if it needs TTS."""
+    if voice_settings is not MONTY_VOICE_SETTINGS:
+        return None
+    composer = get_audio_composer()
+    if composer is None:
+        return None
+    with timed('tts', provider='composed'):
+        return composer.compose(text)
+
+def speech_hex(text: str, voice_settings: VoiceSettings):
+    """TTS audio as hex for a JSON reply, or None if it fails or the turn was admitted under load."""
+    # Composed audio costs nothing, so it goes out even under load
+    composed = composed_speech(text, voice_settings)
+    if composed is not None:
+        return composed.hex()
+    if admission.audio_skipped():
+        logger.debug("Skipping audio: admitted while the queue was deep")
+        return None
+    try:
+        turn_events.status('generating_audio')
+        audio_bytes = openai_speech(text, voice_settings)
+        logger.debug("Successfully generated audio: %d bytes", len(audio_bytes))
+        return audio_bytes.hex()
+    except cancellation.TurnCancelled:
+        raise
+    except Exception as audio_err:
+        logger.error("Error generating audio: %s", audio_err)
+        return None
+
 # Monty's instructions
 MONTY_INSTRUCTIONS = """    - You are the customer services representative for a piano shop called Montague Pianos.
     - You are called Monty and you are The Helper Robot.
@@ -804,63 +988,219 @@ If the user asks about the Montague Pianos shop, services, pricing, booking, or
 Then hand over to `agent_monty`
 """
 
-# TOOLS
+def normalize_postcode_args(args: dict) -> dict:
+    """Treat "HP4 3QH" and "hp43qh" as the same availability lookup."""
+    if isinstance(args.get('postcode'), str):
+        args['postcode'] = args['postcode'].replace(' ', '')
+    return args
 
-web_search_tool = WebSearchTool(
-    user_location=None,  # You could dynamically set this based on the city if desired
-    search_context_size="medium"
-)
+# Tool arguments that need extra normalization before memoizing
+TOOL_MEMO_NORMALIZERS = {
+    'check_piano_tuning_availability': normalize_postcode_args,
+}
 
-file_search_tool = FileSearchTool(
-    max_num_results=50,
-    vector_store_ids=["vs_67d41bb39fe481919fa52375ee097820"],
-    include_search_results=True
-)
+def run_in_thread(func, side_effects=False):
+    """Turn a blocking tool function into an async one so it doesn't stall the shared agent loop.
 
-# AGENTS
-triage_agent = Agent(
-    name="Triage Agent",
-    instructions=prompt_with_handoff_instructions(
-        "You are a routing agent responsible for directing questions to the appropriate specialist agent. "
-        "Your ONLY role is to delegate questions to the correct specialist agent - DO NOT attempt to answer questions yourself. "
-        "For each question, you MUST delegate to one of these specialist agents:\n"
-        "1. Monty Agent: For any questions about Montague Pianos, piano sales, services, or general inquiries\n"
-        "2. Mindy Agent: For any questions about Mindy and Monty's relationship\n\n"
-        "Important rules:\n"
-        "- ALWAYS delegate to a specialist agent - never try to answer questions yourself\n"
-        "- If a question could fit multiple categories, choose the most specific specialist\n"
-        "- If unsure, delegate to the Monty Agent for general inquiries\n"
-        "- For follow-up questions, maintain the same specialist agent unless the topic clearly changes\n"
-        "- When receiving a handoff from a specialist agent, immediately delegate to the appropriate specialist\n"
-        "- Never acknowledge handoffs with generic responses - always delegate to the appropriate specialist"
-    ),
-    model="gpt-4o",
-    tools=[check_piano_tuning_availability]  # Use the decorated function directly
-)
+    With side_effects (a booking), a call that has started always runs to the end: cancelling the
+    turn waits for it, and its result is kept on the cancel token for the session's history.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = cancellation.current_turn.get()
+        if not side_effects or token is None:
+            # Don't start upstream calls for a turn that has already been cancelled
+            cancellation.check('tool')
+            return await asyncio.to_thread(func, *args, **kwargs)
+        token.begin_side_effect('tool')
+        call = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        call.add_done_callback(token.end_side_effect)
+        return await asyncio.shield(call)
+    return wrapper
 
-agent_monty = Agent(
-    name="Monty Agent",
-    handoff_description="Primary customer service representative for Montague Pianos",
-    instructions=prompt_with_handoff_instructions(MONTY_INSTRUCTIONS),
-    model="gpt-4o",
-    tools=[check_piano_tuning_availability, book_piano_tuning]  # Add the booking tool
-)
+class MontyAgents:
+    """The agents and tools, built together on first use."""
+    def __init__(self, triage, monty, mindy, web_search_tool, file_search_tool, model_provider):
+        self.triage = triage
+        self.monty = monty
+        self.mindy = mindy
+        self.web_search_tool = web_search_tool
+        self.file_search_tool = file_search_tool
+        self.model_provider = model_provider
 
-agent_mindy = Agent(
-    name="Mindy Agent",
-    handoff_description="Monty's Girlfriend",
-    instructions=prompt_with_handoff_instructions(MINDY_INSTRUCTIONS),
-    model="gpt-4o"
-)
+_agents = None
+
+def get_agents() -> MontyAgents:
+    """Import the agents SDK and build the agents the first time they are needed."""
+    global _agents
+    if _agents is None:
+        with _lazy_lock:
+            if _agents is None:
+                _agents = _build_agents()
+    return _agents
+
+def _build_agents() -> MontyAgents:
+    from agents import Agent, function_tool
+    from agents.tool import WebSearchTool, FileSearchTool
+    from knowledge_index import search_shop_knowledge
+    from prompt_cache import CacheReportingProvider, log_prefixes, static_instructions
+    from run_tracing import init_tracing
+
+    init_tracing()
+
+    # TOOLS (hosted, not currently attached to an agent; search_shop_knowledge is the local replacement)
+    web_search_tool = WebSearchTool(
+        user_location=None,  # You could dynamically set this based on the city if desired
+        search_context_size="medium"
+    )
+
+    file_search_tool = FileSearchTool(
+        max_num_results=50,
+        vector_store_ids=["vs_67d41bb39fe481919fa52375ee097820"],
+        include_search_results=True
+    )
+
+    check_tool = function_tool(run_in_thread(check_piano_tuning_availability))
+    book_tool = function_tool(run_in_thread(book_piano_tuning, side_effects=True))
+    # A search is quick, but it stats the index and may reload it after a rebuild: keep that off the loop
+    knowledge_tool = function_tool(run_in_thread(search_shop_knowledge))
+
+    # AGENTS
+    triage_agent = Agent(
+        name="Triage Agent",
+        instructions=static_instructions(
+            "You are a routing agent responsible for directing questions to the appropriate specialist agent. "
+            "Your ONLY role is to delegate questions to the correct specialist agent - DO NOT attempt to answer questions yourself. "
+            "For each question, you MUST delegate to one of these specialist agents:\n"
+            "1. Monty Agent: For any questions about Montague Pianos, piano sales, services, or general inquiries\n"
+            "2. Mindy Agent: For any questions about Mindy and Monty's relationship\n\n"
+            "Important rules:\n"
+            "- ALWAYS delegate to a specialist agent - never try to answer questions yourself\n"
+            "- If a question could fit multiple categories, choose the most specific specialist\n"
+            "- If unsure, delegate to the Monty Agent for general inquiries\n"
+            "- For follow-up questions, maintain the same specialist agent unless the topic clearly changes\n"
+            "- When receiving a handoff from a specialist agent, immediately delegate to the appropriate specialist\n"
+            "- Never acknowledge handoffs with generic responses - always delegate to the appropriate specialist"
+        ),
+        model=model_tiers.agent_model("triage"),
+        tools=memoize_tools([metrics.time_tool(check_tool)], TOOL_MEMO_NORMALIZERS)
+    )
+
+    agent_monty = Agent(
+        name="Monty Agent",
+        handoff_description="Primary customer service representative for Montague Pianos",
+        instructions=static_instructions(MONTY_INSTRUCTIONS),
+        model=model_tiers.agent_model("monty"),
+        tools=memoize_tools([metrics.time_tool(check_tool), metrics.time_tool(book_tool),
+                             metrics.time_tool(knowledge_tool)], TOOL_MEMO_NORMALIZERS)  # Add the booking tool
+    )
 
-# Set up handoffs
-triage_agent.handoffs = [agent_monty, agent_mindy]
-agent_monty.handoffs = [triage_agent, agent_mindy]
-agent_mindy.handoffs = [triage_agent, agent_monty]
+    agent_mindy = Agent(
+        name="Mindy Agent",
+        handoff_description="Monty's Girlfriend",
+        instructions=static_instructions(MINDY_INSTRUCTIONS),
+        model=model_tiers.agent_model("mindy")
+    )
+
+    # Set up handoffs
+    triage_agent.handoffs = [agent_monty, agent_mindy]
+    agent_monty.handoffs = [triage_agent, agent_mindy]
+    agent_mindy.handoffs = [triage_agent, agent_monty]
+    log_prefixes([triage_agent, agent_monty, agent_mindy])
+
+    return MontyAgents(triage_agent, agent_monty, agent_mindy, web_search_tool, file_search_tool,
+                       CacheReportingProvider())
+
+# All agent runs share one long-lived event loop. The SDK's AsyncOpenAI client pools
+# connections per loop, so a fresh asyncio.run() per request fails with "Event loop is closed".
+_agent_loop = None
+
+def get_agent_loop():
+    """Return the background event loop used for agent runs, starting it on first use."""
+    global _agent_loop
+    if _agent_loop is None:
+        with _lazy_lock:
+            if _agent_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='agent-loop', daemon=True).start()
+                _agent_loop = loop
+    return _agent_loop
+
+async def _in_context(context, coro):
+    # Carry the caller's context vars (request/session IDs) into the loop thread
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+def run_on_agent_loop(coro):
+    """Run a coroutine on the shared agent loop and wait for its result.
+
+    If the turn is cancelled meanwhile, the task is cancelled too (model calls and tools included).
+    """
+    context = contextvars.copy_context()
+    future = asyncio.run_coroutine_threadsafe(_in_context(context, coro), get_agent_loop())
+    return cancellation.wait(future, 'agent_run')
+
+def run_agent(agent, agent_input, session_id=None, tier="full"):
+    """Run an agent turn with a fresh tool memo on the given model tier, timing the whole run."""
+    from agents import Runner, RunConfig
+
+    memo = RunMemo()
+    # Group traces by chat session so a conversation's runs can be found together
+    run_config = RunConfig(workflow_name="Monty chat", group_id=session_id,
+                           trace_metadata={"tier": tier}, model_provider=get_agents().model_provider,
+                           **model_tiers.run_overrides(tier))
+    turn_events.status('thinking')
+    with timed('agent_run', agent=agent.name, tier=tier):
+        result = run_on_agent_loop(Runner.run(agent, agent_input, context=memo, run_config=run_config))
+    if memo.hits:
+        metrics.inc('monty_tool_memo_hits_total', memo.hits)
+    metrics.inc('monty_agent_runs_total', agent=agent.name, final_agent=result._last_agent.name, tier=tier)
+    for response in result.raw_responses:
+        metrics.inc('monty_model_tokens_total', response.usage.input_tokens, tier=tier, kind='input')
+        metrics.inc('monty_model_tokens_total', response.usage.output_tokens, tier=tier, kind='output')
+    metrics.inc('monty_model_calls_total', len(result.raw_responses), tier=tier)
+    return result
+
+_router = None
+
+def get_router():
+    """Build the local handoff router (NumPy centroids) the first time it is needed."""
+    global _router
+    if _router is None:
+        with _lazy_lock:
+            if _router is None:
+                from handoff_router import HandoffRouter
+                _router = HandoffRouter()
+    return _router
+
+def route_turn(question, conversation, current_agent):
+    """Pick the specialist to start the run on, so it doesn't cost a model call to hand off.
+
+    Falls back to the current agent (and the model's own handoffs) when the router isn't sure.
+    """
+    agents = get_agents()
+    current = 'mindy' if current_agent is agents.mindy else 'monty' if current_agent is agents.monty else None
+    target, method, score = get_router().route(question, conversation.last_text('assistant'), current)
+    metrics.inc('monty_router_decisions_total', method=method, target=target or 'model')
+    if target is None:
+        return current_agent
+    agent = getattr(agents, target)
+    if agent is not current_agent:
+        logger.info("Router sent turn to %s (%s, score %.2f)", agent.name, method, score)
+    return agent
+
+@app.after_request
+def add_path_header(response):
+    """Tell clients (and replay.py) which /ask branch handled the turn."""
+    ask_path = getattr(g, 'ask_path', None)
+    if ask_path:
+        response.headers['X-Monty-Path'] = ask_path
+    return response
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return static_assets.send_page(render_template('index.html'))
 
 @app.route('/clear-chat', methods=['POST'])
 def clear_chat():
@@ -870,77 +1210,65 @@ def clear_chat():
     try:
         if session_id in conversation_history:
             conversation_history[session_id] = {
-                'last_agent': triage_agent,
-                'conversation': []
+                'last_agent': get_agents().triage,
+                'conversation': Transcript()
             }
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def reply_with_audio(response_text, agent_name, voice_settings):
+    """The /ask reply with its audio. Channel clients get the text first, while the audio is made."""
+    turn_events.emit('reply', response=response_text, agent=agent_name)
+    return jsonify({
+        'response': response_text,
+        'agent': agent_name,
+        'audio': speech_hex(response_text, voice_settings)
+    })
+
 @app.route('/ask', methods=['POST'])
 def ask():
     try:
-        print("\n==================================================")
-        print("Starting /ask endpoint processing")
+        logger.debug("Starting /ask endpoint processing")
         
         # Get the data from the request
         data = request.get_json()
         question = data.get('message', '')
         session_id = data.get('session_id', 'default')
         
-        print(f"Processing request for question: {question[:50]}...")
+        logger.debug("Processing request for question: %.50s", question)
         
         # Get or initialize conversation history for this session
         if session_id not in conversation_history:
             conversation_history[session_id] = {
-                'last_agent': agent_monty,  # Start directly with Monty for simplicity
-                'conversation': []
+                'last_agent': get_agents().monty,  # Start directly with Monty for simplicity
+                'conversation': Transcript()
             }
+        # For traffic_recorder, which only records turns that got this far: an answer to a
+        # request for details is never recorded as typed
+        g.previous_reply = conversation_history[session_id]['conversation'].last_text('assistant')
         
         # Check if we're in the booking flow
         if 'booking_stage' in conversation_history[session_id]:
-            print(f"Continuing booking flow at stage: {conversation_history[session_id]['booking_stage']}")
+            logger.debug("Continuing booking flow at stage: %s", conversation_history[session_id]['booking_stage'])
+            g.ask_path = 'booking_flow'
+            g.booking_stage = conversation_history[session_id]['booking_stage']
             response_text = process_message(question, conversation_history[session_id])
             
             # Update conversation history
-            conversation_history[session_id]['conversation'].extend([
-                {"role": "user", "content": question},
-                {"role": "assistant", "content": response_text}
-            ])
+            conversation_history[session_id]['conversation'].add_turn(question, response_text)
             
             # Generate audio for the response
-            try:
-                voice_settings = MONTY_VOICE_SETTINGS
-                print(f"Generating audio with OpenAI for booking response")
-                speech_response = client.audio.speech.create(
-                    model=voice_settings.model,
-                    voice=voice_settings.voice,
-                    input=response_text,
-                    instructions=voice_settings.instructions
-                )
-                audio_bytes = speech_response.content
-                audio_data = audio_bytes.hex()
-                print(f"Successfully generated audio: {len(audio_data) // 2} bytes")
-                
-                return jsonify({
-                    'response': response_text,
-                    'agent': 'Monty Agent',
-                    'audio': audio_data
-                })
-            except Exception as audio_err:
-                print(f"Error generating audio: {audio_err}")
-                return jsonify({
-                    'response': response_text,
-                    'agent': 'Monty Agent',
-                    'audio': None
-                })
+            logger.debug("Generating audio with OpenAI for booking response")
+            return reply_with_audio(response_text, 'Monty Agent', MONTY_VOICE_SETTINGS)
         
         # Check for time slot selection
         date_match = re.search(r'(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday),\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2}(?:st|nd|rd|th)?', question, re.IGNORECASE)
         time_match = re.search(r'\b(?:1[0-2]|0?[1-9]):?(?:[0-5][0-9])?\s*(?:am|pm)?\b', question, re.IGNORECASE)
         
         if date_match and time_match:
-            print(f"Detected time slot selection: {date_match.group()} at {time_match.group()}")
+            logger.info("Detected time slot selection: %s at %s", date_match.group(), time_match.group())
+            g.ask_path = 'slot_selection'
             
             # Store the selected slot in context
             conversation_history[session_id]['selected_date'] = date_match.group()
@@ -950,37 +1278,11 @@ def ask():
             response_text = "Great! To book this slot, I'll need a few details. What's your full name?"
             
             # Update conversation history
-            conversation_history[session_id]['conversation'].extend([
-                {"role": "user", "content": question},
-                {"role": "assistant", "content": response_text}
-            ])
+            conversation_history[session_id]['conversation'].add_turn(question, response_text)
             
             # Generate audio for the response
-            try:
-                voice_settings = MONTY_VOICE_SETTINGS
-                print(f"Generating audio with OpenAI for booking response")
-                speech_response = client.audio.speech.create(
-                    model=voice_settings.model,
-                    voice=voice_settings.voice,
-                    input=response_text,
-                    instructions=voice_settings.instructions
-                )
-                audio_bytes = speech_response.content
-                audio_data = audio_bytes.hex()
-                print(f"Successfully generated audio: {len(audio_data) // 2} bytes")
-                
-                return jsonify({
-                    'response': response_text,
-                    'agent': 'Monty Agent',
-                    'audio': audio_data
-                })
-            except Exception as audio_err:
-                print(f"Error generating audio: {audio_err}")
-                return jsonify({
-                    'response': response_text,
-                    'agent': 'Monty Agent',
-                    'audio': None
-                })
+            logger.debug("Generating audio with OpenAI for booking response")
+            return reply_with_audio(response_text, 'Monty Agent', MONTY_VOICE_SETTINGS)
         
         # Extract postcode if present for direct handling
         postcode_match = re.search(r'[A-Z]{1,2}[0-9][A-Z0-9]? ?[0-9][A-Z]{2}', question, re.IGNORECASE)
@@ -990,10 +1292,10 @@ def ask():
             
             # Check conversation history for tuning context
             has_tuning_context = False
-            for msg in conversation_history[session_id].get('conversation', []):
-                if msg.get('role') == 'assistant' and 'content' in msg:
+            for msg in conversation_history[session_id]['conversation']:
+                if msg.role == 'assistant':
                     # Check if content is a string before searching
-                    content = msg['content']
+                    content = msg.content
                     if isinstance(content, str):
                         if re.search(r'\b(postcode|tuning|booking|slot|appointment)\b', content, re.IGNORECASE):
                             has_tuning_context = True
@@ -1011,21 +1313,31 @@ def ask():
             if is_likely_tuning_query or has_tuning_context or is_just_postcode:
                 # This is a postcode query related to tuning
                 postcode = postcode_match.group()
-                print(f"Detected postcode query: {postcode}")
+                logger.info("Detected postcode query: %s", postcode)
+                g.ask_path = 'postcode_direct'
                 
                 # Store postcode in session context
                 conversation_history[session_id]['last_postcode'] = postcode
                 
                 # Get the response directly from our function
-                print("Calling check_piano_tuning_availability_direct...")
                 response_text = check_piano_tuning_availability_direct(postcode)
-                print(f"Got response from check_piano_tuning_availability_direct: {response_text[:100]}...")
+                logger.debug("Got response from check_piano_tuning_availability_direct: %.100s", response_text)
                 
                 # Update conversation history with this exchange
-                conversation_history[session_id]['conversation'].extend([
-                    {"role": "user", "content": question},
-                    {"role": "assistant", "content": response_text}
-                ])
+                conversation_history[session_id]['conversation'].add_turn(question, response_text)
+                
+                # Availability replies can usually be spoken from pre-rendered clips straight away
+                composed = composed_speech(response_text, MONTY_VOICE_SETTINGS)
+                if composed is not None:
+                    return jsonify({
+                        'response': response_text,
+                        'agent': 'Monty Agent',
+                        'audio': composed.hex()
+                    })
+                
+                # A channel client already has the text, so the audio can follow on the same turn
+                if turn_events.streaming():
+                    return reply_with_audio(response_text, 'Monty Agent', MONTY_VOICE_SETTINGS)
                 
                 # First return the response with the slots
                 response = jsonify({
@@ -1036,105 +1348,98 @@ def ask():
                 
                 # Then try to generate audio in a background thread
                 def generate_audio():
+                    # The reply has already been sent, so this job isn't tied to the request any more
+                    cancellation.current_turn.set(None)
                     try:
                         voice_settings = MONTY_VOICE_SETTINGS
-                        print(f"Generating audio with OpenAI for direct postcode response")
-                        speech_response = client.audio.speech.create(
-                            model=voice_settings.model,
-                            voice=voice_settings.voice,
-                            input=response_text,
-                            instructions=voice_settings.instructions
-                        )
-                        audio_bytes = speech_response.content
+                        logger.debug("Generating audio with OpenAI for direct postcode response")
+                        audio_bytes = openai_speech(response_text, voice_settings)
                         audio_data = audio_bytes.hex()
-                        print(f"Successfully generated audio: {len(audio_data) // 2} bytes")
+                        logger.debug("Successfully generated audio: %d bytes", len(audio_bytes))
                         
                         # Update the response with audio data
                         response_data = response.get_json()
                         response_data['audio'] = audio_data
                         response.set_data(json.dumps(response_data))
                     except Exception as audio_err:
-                        print(f"Error generating audio: {audio_err}")
+                        logger.error("Error generating audio: %s", audio_err)
                         # Don't update the response if audio generation fails
                 
-                # Start audio generation in background
-                import threading
-                audio_thread = threading.Thread(target=generate_audio)
-                audio_thread.daemon = True
-                audio_thread.start()
+                # Start audio generation in background (unless we're shedding load)
+                # Carry the request/session IDs over so the thread's log lines stay correlated
+                if not admission.audio_skipped():
+                    audio_thread = threading.Thread(target=contextvars.copy_context().run, args=(generate_audio,))
+                    audio_thread.daemon = True
+                    audio_thread.start()
                 
                 return response
         
         # For non-postcode or agent-based handling, continue with standard approach
         # Get the last agent and conversation history
-        last_agent = conversation_history[session_id].get('last_agent', agent_monty)
-        conversation = conversation_history[session_id].get('conversation', [])
+        last_agent = conversation_history[session_id].get('last_agent', get_agents().monty)
+        conversation = conversation_history[session_id]['conversation']
+        g.ask_path = 'agent'
+        tier, tier_reason = model_tiers.choose_tier(question, conversation)
+        metrics.inc('monty_model_tier_turns_total', tier=tier, reason=tier_reason)
+        
+        start_agent = route_turn(question, conversation, last_agent if conversation else get_agents().monty)
         
-        print(f"Processing question with agent: {last_agent.name}")
+        logger.debug("Processing question with agent: %s (model tier %s: %s)", start_agent.name, tier, tier_reason)
         
         # If this is a follow-up question, use the last agent and include conversation history
         if conversation:
-            input_list = conversation + [{"role": "user", "content": question}]
+            input_list = conversation.to_input_list() + [{"role": "user", "content": question}]
             try:
-                result = asyncio.run(Runner.run(last_agent, input_list))
+                result = run_agent(start_agent, input_list, session_id, tier)
             except Exception as e:
                 if "not found" in str(e):
-                    print("Invalid message reference – clearing history and retrying.")
+                    logger.warning("Invalid message reference - clearing history and retrying.")
+                    conversation = Transcript()
                     conversation_history[session_id] = {
-                        'last_agent': agent_monty,
-                        'conversation': []
+                        'last_agent': get_agents().monty,
+                        'conversation': conversation
                     }
-                    result = asyncio.run(Runner.run(agent_monty, question))
+                    result = run_agent(get_agents().monty, question, session_id, tier)
                 else:
                     raise e
         else:
-            # For new questions, start with Monty directly
-            result = asyncio.run(Runner.run(agent_monty, question))
+            # For new questions, start with Monty directly unless the router picked someone else
+            result = run_agent(start_agent, question, session_id, tier)
         
         # Get response and truncate if too long
         response_text = result.final_output
         if len(response_text) > 1000:
             response_text = response_text[:1000] + "..."
             
-        # Update conversation history
-        conversation_history[session_id]['conversation'] = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in result.to_input_list()
-            if "role" in msg and "content" in msg
-        ]
+        # Update conversation history: append this turn rather than rebuilding the whole list
+        conversation.append('user', question)
+        conversation.extend_items(item.to_input_item() for item in result.new_items)
         conversation_history[session_id]['last_agent'] = result._last_agent
         
         # Generate audio for the response
-        try:
-            voice_settings = AGENT_VOICE_SETTINGS.get(result._last_agent.name, MONTY_VOICE_SETTINGS)
-            print(f"Generating audio with OpenAI for agent: {result._last_agent.name}")
-            speech_response = client.audio.speech.create(
-                model=voice_settings.model,
-                voice=voice_settings.voice,
-                input=response_text,
-                instructions=voice_settings.instructions
-            )
-            audio_bytes = speech_response.content
-            audio_data = audio_bytes.hex()
-            print(f"Successfully generated audio with OpenAI: {len(audio_data) // 2} bytes")
-            
-            return jsonify({
-                'response': response_text,
-                'agent': result._last_agent.name,
-                'audio': audio_data
-            })
-        except Exception as audio_err:
-            print(f"Error generating audio: {audio_err}")
-            return jsonify({
-                'response': response_text,
-                'agent': result._last_agent.name,
-                'audio': None
-            })
+        voice_settings = AGENT_VOICE_SETTINGS.get(result._last_agent.name, MONTY_VOICE_SETTINGS)
+        logger.debug("Generating audio with OpenAI for agent: %s", result._last_agent.name)
+        return reply_with_audio(response_text, result._last_agent.name, voice_settings)
+        
+    except cancellation.TurnCancelled as e:
+        logger.info("Turn cancelled: %s", e)
+        token = cancellation.current_turn.get()
+        if token is not None and token.side_effects and session_id in conversation_history:
+            # A booking made before the cancel still happened: keep it so it isn't made twice
+            conversation = conversation_history[session_id]['conversation']
+            conversation.append('user', question)
+            for result in token.side_effects:
+                conversation.append('assistant', result)
+        # 499: the client went away or sent a newer message; nobody will read this reply
+        return jsonify({
+            'response': '',
+            'agent': 'Monty Agent',
+            'audio': None,
+            'cancelled': e.reason
+        }), 499
         
     except Exception as e:
-        print(f"Error in ask endpoint: {e}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in ask endpoint: %s", e)
         
         # Ultra-minimal fallback
         return jsonify({
@@ -1143,6 +1448,42 @@ def ask():
             'audio': None
         }), 500
 
+@app.route('/ws', websocket=True)
+def ws_endpoint():
+    """WebSocket channel for one chat session (?session_id=...); see ws_channel for the messages."""
+    return ws_channel.serve(app, request.environ, request.args.get('session_id') or 'default')
+
+@app.route('/availability/batch', methods=['POST'])
+def availability_batch_endpoint():
+    """Slots for a list of postcodes, optionally within a date window, streamed as one JSON object.
+
+    Body: {"postcodes": ["HP4 3QH", ...], "start": "2025-04-01", "end": "2025-04-30"}
+    Results arrive in completion order: {"results": [{"postcode", "area", "source", "slots"}, ...], "count": n}
+    """
+    data = request.get_json(silent=True) or {}
+    postcodes = data.get('postcodes')
+    if not isinstance(postcodes, list) or not postcodes:
+        return jsonify({'error': 'postcodes must be a non-empty list'}), 400
+    try:
+        results = get_slot_lookup().lookup_many(postcodes, data.get('start'), data.get('end'))
+    except availability_batch.BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def stream():
+        count = 0
+        yield '{"results": ['
+        for result in results:
+            yield (',' if count else '') + '\n' + json.dumps(result)
+            count += 1
+        yield f'\n], "count": {count}}}\n'
+    
+    return Response(stream(), mimetype='application/json')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose latency histograms and counters in Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/generate-audio', methods=['POST'])
 def generate_audio():
     """Generate audio for a given message."""
@@ -1155,32 +1496,117 @@ def generate_audio():
         hex_audio = None
         
         if voice_settings.provider == "openai":
-            # Use OpenAI
-            speech_response = client.audio.speech.create(
-                model=voice_settings.model,
-                voice=voice_settings.voice,
-                input=message, 
-                instructions=voice_settings.instructions
-            )
-            audio_data = speech_response.content
+            # Use OpenAI, unless the message can be joined from pre-rendered clips
+            audio_data = composed_speech(message, voice_settings) or openai_speech(message, voice_settings)
             hex_audio = audio_data.hex()
-        elif voice_settings.provider == "elevenlabs" and elevenlabs_client:
+        elif voice_settings.provider == "elevenlabs" and get_elevenlabs_client():
             # Use ElevenLabs
-            speech_response = elevenlabs_client.text_to_speech.convert(
-                voice_id=voice_settings.voice_id,
-                output_format="mp3_44100_128",
-                text=message, 
-                model_id=voice_settings.model
-            )
-            audio_data = b''.join(speech_response)
+            with timed('tts', provider='elevenlabs'):
+                speech_response = get_elevenlabs_client().text_to_speech.convert(
+                    voice_id=voice_settings.voice_id,
+                    output_format="mp3_44100_128",
+                    text=message, 
+                    model_id=voice_settings.model
+                )
+                audio_data = b''.join(speech_response)
             hex_audio = audio_data.hex()
         
         return jsonify({
             'audio': hex_audio
         })
     except Exception as e:
-        print(f"Error generating audio: {str(e)}")
+        logger.error("Error generating audio: %s", e)
         return jsonify({'error': str(e)}), 500
 
+def load_knowledge_index():
+    """Build (if missing) and load the shop documents index; searches never build it themselves."""
+    try:
+        from knowledge_index import ensure_index
+        ensure_index()
+    except Exception as e:
+        logger.error("Knowledge index unavailable, shop document search is off: %s", e)
+
+def warm_up():
+    """Build the agents and open TLS connections to OpenAI and the booking backend before the first chat."""
+    start = time.perf_counter()
+    try:
+        get_agents()
+        get_router()
+        geo_index.get_geo_index()
+        static_assets.preload(app)
+    except Exception as e:
+        logger.warning("Warm-up could not build agents: %s", e)
+    load_knowledge_index()
+    try:
+        # Cheap authenticated call that leaves a pooled connection open for TTS
+        get_openai_client().with_options(timeout=10).models.retrieve(model_tiers.FULL_MODEL)
+    except Exception as e:
+        logger.warning("Warm-up could not reach OpenAI: %s", e)
+    try:
+        # Also wakes the free-tier booking server if it has spun down
+        booking_session.get(f'{BOOKING_API_URL}/', timeout=30)
+    except Exception as e:
+        logger.warning("Warm-up could not reach the booking backend: %s", e)
+    render_audio_clips()
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+
+def render_audio_clips():
+    """Render any missing availability clips (one-off: clips on disk are reused until the voice changes)."""
+    try:
+        composer = get_audio_composer()
+        if composer is not None and composer.missing():
+            rendered = composer.render(lambda text: openai_speech(text, MONTY_VOICE_SETTINGS))
+            logger.info("Rendered %d availability audio clips (%d still missing)", rendered, len(composer.missing()))
+    except Exception as e:
+        logger.warning("Could not render availability audio: %s", e)
+
+def preload(render_audio=True):
+    """Build everything workers can share before a pre-forking server forks them.
+
+    Runs in the gunicorn master (see gunicorn.conf.py). Connections opened here are dropped
+    again, since sockets must not be shared between workers.
+    """
+    global _client
+    start = time.perf_counter()
+    get_agents()
+    get_router()
+    load_knowledge_index()
+    geo_index.get_geo_index()
+    static_assets.preload(app)
+    if render_audio:
+        render_audio_clips()
+    else:
+        get_audio_composer()
+    if _client is not None:
+        _client.close()
+        _client = None
+    logger.info("Preload finished in %.2fs", time.perf_counter() - start)
+
+def after_fork():
+    """Give a freshly forked worker its own threads, locks and connections."""
+    global _lazy_lock, _client, _elevenlabs_client, _elevenlabs_loaded, _agent_loop, booking_session
+    logging_setup.restart_after_fork()
+    _lazy_lock = threading.Lock()
+    _client = None
+    _elevenlabs_client = None
+    _elevenlabs_loaded = False
+    # The loop's thread only ran in the parent
+    _agent_loop = None
+    booking_session = new_booking_session()
+    if _agents is not None:
+        # The SDK's trace export thread only ran in the parent
+        from run_tracing import init_tracing
+        init_tracing(after_fork=True)
+
+def start_warm_up():
+    """Run warm_up() in the background unless WARMUP=0."""
+    if os.environ.get('WARMUP', '1').lower() in ('0', 'false', 'no'):
+        return None
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+start_warm_up()
+
 if __name__ == '__main__':
-    app.run(debug=False, port=5001)
\ No newline at end of file
+    app.run(debug=False, port=int(os.environ.get('PORT', 5001)))
\ No newline at end of file
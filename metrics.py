@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import replace
+
+from flask import g, has_request_context, request
+
+# How many recent samples each series keeps for quantile estimates
+WINDOW_SIZE = int(os.environ.get("METRICS_WINDOW_SIZE", "2048"))
+
+# Add a Server-Timing header to every response when enabled
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_help = {}
+
+
+class Histogram:
+    """Running count/sum plus a sliding window of samples for p50/p95/p99."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None)))
+
+
+def describe(name: str, text: str):
+    """Set the HELP text shown for a metric."""
+    _help[name] = text
+
+
+def observe(name: str, value: float, **labels):
+    """Record one sample in a histogram series."""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    """Increase a counter series."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Set a gauge series to an absolute value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def add_server_timing(name: str, seconds: float, desc: str = None):
+    """Queue an entry for this request's Server-Timing header."""
+    if not has_request_context():
+        return
+    if not hasattr(g, "server_timing"):
+        g.server_timing = []
+    g.server_timing.append((name, seconds * 1000, desc))
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    """Time a block of work as one stage of a request.
+
+    Labels are things like route, agent, tool or provider. The duration lands in the
+    monty_stage_duration_seconds histogram and in the Server-Timing header.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("monty_stage_duration_seconds", elapsed, stage=stage, status=status, **labels)
+        desc = next((str(v) for v in labels.values() if v is not None), None)
+        add_server_timing(stage, elapsed, desc)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def render_prometheus() -> str:
+    """Render every series in the Prometheus text exposition format."""
+    with _lock:
+        histograms = [(k, h.count, h.total, h.quantiles()) for k, h in _histograms.items()]
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name in seen:
+            return
+        seen.add(name)
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), count, total, quantiles in sorted(histograms):
+        header(name, "summary")
+        for q, value in quantiles.items():
+            lines.append(f"{name}{_format_labels(labels, [('quantile', q)])} {value:.6f}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(gauges):
+        header(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop every recorded series."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def init_app(app):
+    """Time every request per route and optionally emit Server-Timing headers."""
+
+    @app.before_request
+    def _start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, "request_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        if route != "/metrics":
+            observe("monty_request_duration_seconds", elapsed, route=route, method=request.method)
+            inc("monty_requests_total", route=route, method=request.method, status=response.status_code)
+        if SERVER_TIMING_ENABLED:
+            entries = getattr(g, "server_timing", [])
+            parts = []
+            for name, dur_ms, desc in entries:
+                part = name
+                if desc:
+                    part += ';desc="{}"'.format(desc.replace('"', "'"))
+                parts.append(f"{part};dur={dur_ms:.1f}")
+            parts.append(f"total;dur={elapsed * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+
+def time_tool(tool):
+    """Wrap an agent FunctionTool so each invocation is timed as a 'tool' stage."""
+    invoke = tool.on_invoke_tool
+
+    async def _on_invoke_tool(ctx, raw_args):
+        with timed("tool", tool=tool.name):
+            return await invoke(ctx, raw_args)
+
+    return replace(tool, on_invoke_tool=_on_invoke_tool)
+
+
+describe("monty_stage_duration_seconds", "Duration of each stage of a request (agent run, model call, tool, upstream call, TTS).")
+describe("monty_request_duration_seconds", "Duration of each HTTP request by route.")
+describe("monty_requests_total", "HTTP requests served by route and status.")
+describe("monty_model_tier_turns_total", "Agent turns by model tier and the reason the tier was chosen.")
+describe("monty_model_tokens_total", "Model input/output tokens by model tier.")
+describe("monty_model_calls_total", "Model calls by model tier.")
+describe("monty_router_decisions_total", "Local handoff router decisions by method and target agent (model = left to the LLM).")
+describe("monty_model_input_tokens_total", "Prompt tokens sent per model (from each Responses API call).")
+describe("monty_model_cached_tokens_total", "Prompt tokens served from the provider's prompt cache per model.")
+describe("monty_admission_in_flight", "Turns currently being processed (per process).")
+describe("monty_admission_queue_depth", "Turns waiting for a processing slot.")
+describe("monty_admission_shed_total", "Turns rejected with 429, by reason (queue_full, timeout, session_busy).")
+describe("monty_admission_audio_skipped_total", "Turns answered without audio because the queue was deep.")
+describe("monty_dedup_total", "Retried /ask turns answered from the original turn (replayed) or left to run (wait_timeout).")
+describe("monty_turns_cancelled_total", "Turns cancelled because the client disconnected or sent a newer message, by stage reached.")
+describe("monty_composed_audio_total", "Availability replies spoken from pre-rendered clips (composed) or sent to TTS for want of a clip (missing_clip).")
+describe("monty_availability_replica_total", "Availability lookups answered from the local replica (hit) or sent to the backend (miss, stale).")
+describe("monty_availability_replica_postcodes", "Postcodes kept in the local availability replica.")
+describe("monty_availability_sync_total", "Background availability refreshes, by outcome (changed, unchanged, error).")
+describe("monty_geo_area_total", "Availability lookups by service-area class of the postcode; out_of_area ones skip the booking backend.")
+describe("monty_availability_batch_lookups_total", "Postcodes looked up through the batch API, by where the answer came from (geo, replica, upstream, coalesced, error).")
+describe("monty_ws_channels_open", "WebSocket chat channels currently open (per process).")
+describe("monty_ws_messages_total", "Messages received over WebSocket channels, by type (ask, speak).")
+describe("monty_ws_rejected_total", "WebSocket channels refused because WS_MAX_CONNECTIONS were already open.")
+describe("monty_compressed_replies_total", "JSON replies sent compressed, by encoding (gzip, br).")
+describe("monty_compression_saved_bytes_total", "Bytes saved by compressing JSON replies.")
@@ -0,0 +1,112 @@
+import os
+import re
+
+# Model used for routing and short, simple turns
+FAST_MODEL = os.environ.get("MODEL_FAST", "gpt-4o-mini")
+# Model used when a turn needs tools, long context or careful answers
+FULL_MODEL = os.environ.get("MODEL_FULL", "gpt-4o")
+# Set MODEL_TIERING=0 to run every turn on each agent's own model
+TIERING_ENABLED = os.environ.get("MODEL_TIERING", "1").lower() not in ("0", "false", "no")
+
+# Turns longer than this (or with more history than this) go to the full model
+FAST_MAX_MESSAGE_CHARS = int(os.environ.get("MODEL_FAST_MAX_MESSAGE_CHARS", "160"))
+FAST_MAX_CONTEXT_CHARS = int(os.environ.get("MODEL_FAST_MAX_CONTEXT_CHARS", "4000"))
+
+# Per-agent model, either a tier name ("fast"/"full") or a model name.
+# Triage only routes, so it defaults to the fast model.
+AGENT_MODELS = {
+    "triage": os.environ.get("MODEL_TRIAGE", "fast"),
+    "monty": os.environ.get("MODEL_MONTY", "full"),
+    "mindy": os.environ.get("MODEL_MINDY", "full"),
+}
+
+# Output limits per tier; spoken replies are short, so the fast tier is capped tighter
+TIER_SETTINGS = {
+    "fast": {"temperature": 0.3, "max_tokens": 400},
+    "full": {},
+}
+
+TOOL_INTENT_RE = re.compile(
+    r"\b(tun(e|ing|er)|book(ing)?|appointment|slot|availab\w*|postcode|price|cost|quote|"
+    r"deliver\w*|valuation|part[- ]exchange|repair|search|latest|news)\b",
+    re.IGNORECASE,
+)
+POSTCODE_RE = re.compile(r"[A-Z]{1,2}[0-9][A-Z0-9]? ?[0-9][A-Z]{2}", re.IGNORECASE)
+# A reply that offers slots, talks about booking or asks for the customer's details: the
+# answer ("the second one", "yes please", a name) leads to a tool call, whatever it says
+BOOKING_REPLY_RE = re.compile(
+    r"\b(slots?|appointments?|availab\w*|book(ing|ed)?)\b"
+    r"|\byour\b[^.?!]*\b(name|address|phone|mobile|contact details)\b",
+    re.IGNORECASE,
+)
+
+
+def resolve_model(name: str) -> str:
+    """Turn a tier name into a model name; anything else is taken as a model name already."""
+    return {"fast": FAST_MODEL, "full": FULL_MODEL}.get(name, name)
+
+
+def agent_model(agent_key: str) -> str:
+    return resolve_model(AGENT_MODELS.get(agent_key, "full"))
+
+
+def model_settings(tier: str):
+    from agents import ModelSettings
+
+    return ModelSettings(**TIER_SETTINGS.get(tier, {}))
+
+
+def _context_chars(conversation) -> int:
+    if hasattr(conversation, "chars"):
+        # A Transcript keeps a running total
+        return conversation.chars
+    total = 0
+    for msg in conversation or []:
+        content = msg.get("content") if isinstance(msg, dict) else None
+        if isinstance(content, str):
+            total += len(content)
+        elif isinstance(content, list):
+            total += sum(len(str(part)) for part in content)
+    return total
+
+
+def _last_reply(conversation):
+    if hasattr(conversation, "last_text"):
+        return conversation.last_text("assistant")
+    for msg in reversed(conversation or []):
+        if isinstance(msg, dict) and msg.get("role") == "assistant" and isinstance(msg.get("content"), str):
+            return msg["content"]
+    return None
+
+
+def choose_tier(message: str, conversation=None):
+    """Pick the tier for one /ask turn, returning (tier, reason).
+
+    Cheap checks only: anything that looks like it needs a tool (booking, availability,
+    prices, web/file search), an answer to a reply about slots or booking details, a long
+    message or a long history escalates to the full model.
+    """
+    if not TIERING_ENABLED:
+        return "full", "disabled"
+    if POSTCODE_RE.search(message) or TOOL_INTENT_RE.search(message):
+        return "full", "tool_intent"
+    last_reply = _last_reply(conversation)
+    if last_reply and BOOKING_REPLY_RE.search(last_reply):
+        return "full", "booking_context"
+    if len(message) > FAST_MAX_MESSAGE_CHARS:
+        return "full", "long_message"
+    if _context_chars(conversation) > FAST_MAX_CONTEXT_CHARS:
+        return "full", "long_context"
+    return "fast", "simple"
+
+
+def run_overrides(tier: str) -> dict:
+    """RunConfig arguments for a tier.
+
+    The fast tier pins every agent in the run (including after a handoff) to the fast
+    model. The full tier leaves each agent on its own configured model.
+    """
+    overrides = {"model_settings": model_settings(tier)}
+    if tier == "fast":
+        overrides["model"] = FAST_MODEL
+    return overrides
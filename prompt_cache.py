@@ -0,0 +1,104 @@
+import datetime
+import hashlib
+import importlib.metadata
+import json
+import logging
+import time
+
+from agents.extensions.handoff_prompt import prompt_with_handoff_instructions
+from agents.models.openai_provider import DEFAULT_MODEL, OpenAIProvider
+from agents.models.openai_responses import OpenAIResponsesModel
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# CacheReportingModel overrides SDK internals (_fetch_response, _get_client) because the public
+# Usage has no cached-token count in this version; other versions get the plain model
+REPORTING_SDK_VERSION = "0.0.6"
+
+
+def static_instructions(text: str) -> str:
+    """Build an agent's system prompt once, with nothing per-session or per-turn in it.
+
+    The provider caches the longest identical prompt prefix (tools, then instructions, then
+    history), so anything that changes between runs has to go in the input instead. Raises
+    ValueError if the text has today's date in it, the usual way a prompt stops being static.
+    """
+    today = datetime.date.today()
+    for stamp in (today.isoformat(), today.strftime("%d/%m/%Y"), f"{today.day} {today:%B %Y}"):
+        if stamp in text:
+            raise ValueError(f"Agent instructions contain today's date ({stamp}); put it in the input instead")
+    return prompt_with_handoff_instructions(text)
+
+
+def prefix_fingerprint(agent) -> str:
+    """Short hash of the static part of an agent's prompt: instructions, tool schemas, handoffs."""
+    tools = [{"name": t.name, "description": getattr(t, "description", None),
+              "params": getattr(t, "params_json_schema", None)} for t in agent.tools]
+    handoffs = [getattr(h, "name", None) or getattr(h, "tool_name", None) for h in agent.handoffs]
+    payload = json.dumps({"instructions": agent.instructions, "tools": tools, "handoffs": handoffs},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:12]
+
+
+def log_prefixes(agents):
+    """Log each agent's prefix size and hash; a changed hash after a deploy means a cold cache."""
+    for agent in agents:
+        logger.info("Prompt prefix for %s: %d chars, fingerprint %s",
+                    agent.name, len(agent.instructions or ""), prefix_fingerprint(agent))
+
+
+def record_usage(model: str, usage, seconds: float):
+    """Count input/cached tokens for one model call and time it by cache outcome."""
+    if usage is None:
+        return
+    details = getattr(usage, "input_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+    metrics.inc("monty_model_input_tokens_total", usage.input_tokens or 0, model=model)
+    metrics.inc("monty_model_cached_tokens_total", cached, model=model)
+    metrics.observe("monty_stage_duration_seconds", seconds, stage="model_call", status="ok",
+                    model=model, cache="hit" if cached else "miss")
+
+
+def _sdk_version():
+    try:
+        return importlib.metadata.version("openai-agents")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+class CacheReportingModel(OpenAIResponsesModel):
+    """Responses API model that records cached_tokens from every response.
+
+    Overrides the private _fetch_response of openai-agents 0.0.6, the only place the raw
+    response (with usage.input_tokens_details) is visible; check it on every SDK upgrade.
+    """
+
+    async def _fetch_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, stream=False):
+        start = time.perf_counter()
+        response = await super()._fetch_response(system_instructions, input, model_settings, tools,
+                                                 output_schema, handoffs, stream=stream)
+        if not stream:
+            try:
+                record_usage(self.model, response.usage, time.perf_counter() - start)
+            except Exception as e:
+                logger.warning("Error recording model usage: %s", e)
+        return response
+
+
+class CacheReportingProvider(OpenAIProvider):
+    """OpenAI provider whose Responses models report prompt cache usage (openai-agents 0.0.6 only)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.reporting = _sdk_version() == REPORTING_SDK_VERSION
+        if not self.reporting:
+            logger.warning("openai-agents %s isn't %s: prompt cache metrics are off",
+                           _sdk_version(), REPORTING_SDK_VERSION)
+
+    def get_model(self, model_name):
+        if not self._use_responses or not self.reporting:
+            return super().get_model(model_name)
+        return CacheReportingModel(model=model_name or DEFAULT_MODEL, openai_client=self._get_client())
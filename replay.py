@@ -0,0 +1,189 @@
+"""Replay recorded /ask traffic (see traffic_recorder.py) against a running instance.
+
+Sessions run concurrently. Turns within a session stay in order and never overlap: each
+one waits for the previous response and for its own (scaled) original send time.
+
+    python replay.py recordings/ask_traffic.jsonl --url http://127.0.0.1:5001
+    python replay.py recordings/ask_traffic.jsonl --speed 10           # 10x faster than real time
+    python replay.py recordings/ask_traffic.jsonl --speed 0 --json     # as fast as possible
+
+Reports latency percentiles (overall and per /ask path), and where the replayed
+agent or path differs from the recording (routing diffs).
+"""
+import argparse
+import glob
+import json
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+def load_recording(paths):
+    turns = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        turns.append(json.loads(line))
+                    except ValueError:
+                        continue
+    turns.sort(key=lambda t: t.get("ts", 0))
+    return turns
+
+
+def group_sessions(turns):
+    sessions = defaultdict(list)
+    for turn in turns:
+        sessions[turn.get("session_id", "default")].append(turn)
+    return sessions
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def replay_session(base_url, turns, origin, replay_start, speed, timeout):
+    """Send one session's turns in order, returning one result dict per turn."""
+    # A fresh session ID per replay so repeated replays don't share server-side history
+    session_id = f"replay-{uuid.uuid4().hex[:12]}"
+    results = []
+    with requests.Session() as http:
+        for index, turn in enumerate(turns):
+            if speed > 0:
+                due = replay_start + (turn.get("ts", origin) - origin) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.perf_counter()
+            agent = path = None
+            try:
+                response = http.post(f"{base_url}/ask", json={"message": turn.get("message", ""),
+                                                             "session_id": session_id}, timeout=timeout)
+                status = response.status_code
+                try:
+                    agent = response.json().get("agent")
+                except ValueError:
+                    pass
+                path = response.headers.get("X-Monty-Path")
+            except requests.RequestException:
+                status = None
+            results.append({
+                "session_id": turn.get("session_id"),
+                "turn": index,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "recorded_latency_ms": turn.get("latency_ms"),
+                "status": status,
+                "agent": agent,
+                "recorded_agent": turn.get("agent"),
+                "path": path,
+                "recorded_path": turn.get("path"),
+            })
+    return results
+
+
+def summarize(results, examples):
+    latencies = [r["latency_ms"] for r in results]
+    recorded = [r["recorded_latency_ms"] for r in results if r["recorded_latency_ms"] is not None]
+    by_path = defaultdict(list)
+    for r in results:
+        by_path[r["path"] or "unknown"].append(r["latency_ms"])
+
+    buckets = Counter()
+    for value in latencies:
+        bucket = next((b for b in LATENCY_BUCKETS_MS if value <= b), None)
+        buckets[f"<={bucket}ms" if bucket else f">{LATENCY_BUCKETS_MS[-1]}ms"] += 1
+
+    diffs = [r for r in results
+             if (r["recorded_agent"] and r["agent"] != r["recorded_agent"])
+             or (r["recorded_path"] and r["path"] != r["recorded_path"])]
+    transitions = Counter(
+        (f"{r['recorded_path']}/{r['recorded_agent']}", f"{r['path']}/{r['agent']}") for r in diffs
+    )
+
+    def stats(values):
+        return {"n": len(values), "p50_ms": round(percentile(values, 0.5), 1),
+                "p95_ms": round(percentile(values, 0.95), 1), "p99_ms": round(percentile(values, 0.99), 1)}
+
+    return {
+        "turns": len(results),
+        "errors": sum(1 for r in results if r["status"] != 200),
+        "replayed": stats(latencies),
+        "recorded": stats(recorded),
+        "by_path": {path: stats(values) for path, values in sorted(by_path.items())},
+        "histogram": {label: buckets[label] for label in
+                      [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"] if buckets[label]},
+        "routing_diffs": len(diffs),
+        "routing_transitions": [{"recorded": a, "replayed": b, "count": n} for (a, b), n in transitions.most_common()],
+        "diff_examples": diffs[:examples],
+    }
+
+
+def print_summary(summary, elapsed):
+    print(f"Replayed {summary['turns']} turns in {elapsed:.1f}s ({summary['errors']} errors)")
+    for label in ("replayed", "recorded"):
+        s = summary[label]
+        print(f"  {label:<9} n={s['n']:<6} p50={s['p50_ms']:>8.0f}ms p95={s['p95_ms']:>8.0f}ms p99={s['p99_ms']:>8.0f}ms")
+    print("\nBy path:")
+    for path, s in summary["by_path"].items():
+        print(f"  {path:<16} n={s['n']:<6} p50={s['p50_ms']:>8.0f}ms p95={s['p95_ms']:>8.0f}ms p99={s['p99_ms']:>8.0f}ms")
+    print("\nLatency histogram:")
+    for label, count in summary["histogram"].items():
+        print(f"  {label:>9} {count}")
+    print(f"\nRouting diffs: {summary['routing_diffs']}")
+    for t in summary["routing_transitions"]:
+        print(f"  {t['count']:>5}x  {t['recorded']}  ->  {t['replayed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded /ask traffic against a local instance.")
+    parser.add_argument("files", nargs="*", help="Recording files (default: recordings/ask_traffic.jsonl*)")
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Time scale: 1 = original pacing, 10 = ten times faster, 0 = no waiting")
+    parser.add_argument("--max-sessions", type=int, default=64, help="Sessions replayed at the same time")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--examples", type=int, default=10, help="Routing diff examples to keep in --json output")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    paths = args.files or sorted(glob.glob("recordings/ask_traffic.jsonl*"))
+    turns = load_recording(paths)
+    if not turns:
+        print("No recorded turns found.")
+        return
+    sessions = group_sessions(turns)
+    origin = turns[0].get("ts", 0)
+    base_url = args.url.rstrip("/")
+
+    results = []
+    lock = threading.Lock()
+    replay_start = time.perf_counter()
+
+    def run(session_turns):
+        session_results = replay_session(base_url, session_turns, origin, replay_start, args.speed, args.timeout)
+        with lock:
+            results.extend(session_results)
+
+    with ThreadPoolExecutor(max_workers=args.max_sessions) as pool:
+        list(pool.map(run, sessions.values()))
+    elapsed = time.perf_counter() - replay_start
+
+    summary = summarize(results, args.examples)
+    if args.json:
+        summary["elapsed_s"] = round(elapsed, 2)
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary, elapsed)
+
+
+if __name__ == "__main__":
+    main()
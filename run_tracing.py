@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from agents.tracing import TracingProcessor, default_exporter, default_processor, set_trace_processors
+from agents.tracing.processors import BatchTraceProcessor
+
+# Where run traces are written. Set AGENT_TRACE_FILE to an empty string to turn tracing off.
+TRACE_FILE = os.environ.get("AGENT_TRACE_FILE", "traces/agent_runs.jsonl")
+TRACE_MAX_BYTES = int(os.environ.get("AGENT_TRACE_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.environ.get("AGENT_TRACE_BACKUPS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def _duration_ms(started_at, ended_at):
+    if not started_at or not ended_at:
+        return None
+    start = datetime.fromisoformat(started_at)
+    end = datetime.fromisoformat(ended_at)
+    return round((end - start).total_seconds() * 1000, 2)
+
+
+def _usage_from_span(data):
+    """Pull input/output/cached token counts out of a model call span, if present."""
+    usage = None
+    model = None
+    if data.type == "response" and data.response is not None:
+        usage = getattr(data.response, "usage", None)
+        model = getattr(data.response, "model", None)
+        if usage is not None:
+            details = getattr(usage, "input_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) if details is not None else None
+            return model, usage.input_tokens, usage.output_tokens, cached
+    elif data.type == "generation":
+        usage = data.usage or {}
+        return data.model, usage.get("input_tokens"), usage.get("output_tokens"), None
+    return model, None, None, None
+
+
+def span_record(span):
+    """Flatten a finished SDK span into the fields we keep on disk.
+
+    Tool inputs/outputs and model messages are left out so customer details never
+    reach the trace files.
+    """
+    data = span.span_data
+    record = {
+        "id": span.span_id,
+        "parent_id": span.parent_id,
+        "type": data.type,
+        "started_at": span.started_at,
+        "ended_at": span.ended_at,
+        "duration_ms": _duration_ms(span.started_at, span.ended_at),
+    }
+    if data.type in ("agent", "function", "custom", "guardrail"):
+        record["name"] = data.name
+    elif data.type == "handoff":
+        record["name"] = f"{data.from_agent} > {data.to_agent}"
+        record["from_agent"] = data.from_agent
+        record["to_agent"] = data.to_agent
+    elif data.type in ("response", "generation"):
+        model, input_tokens, output_tokens, cached_tokens = _usage_from_span(data)
+        record["name"] = model or data.type
+        record["model"] = model
+        record["input_tokens"] = input_tokens
+        record["output_tokens"] = output_tokens
+        record["cached_tokens"] = cached_tokens
+    if span.error:
+        record["error"] = span.error.get("message") if isinstance(span.error, dict) else str(span.error)
+    return record
+
+
+class LocalTraceProcessor(TracingProcessor):
+    """Collects the spans of each agent run and writes one JSON line per finished run."""
+
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES, backup_count: int = TRACE_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._traces = {}
+        # The file is opened by the first run written, so a preloading server's master never holds it
+        self._handler = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backup_count,
+                                      encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        return handler
+
+    def on_trace_start(self, trace):
+        with self._lock:
+            self._traces[trace.trace_id] = {
+                "trace_id": trace.trace_id,
+                "workflow": trace.name,
+                "group_id": getattr(trace, "group_id", None),
+                "metadata": getattr(trace, "metadata", None),
+                "started_at": datetime.now().astimezone().isoformat(),
+                "_start": time.perf_counter(),
+                "spans": [],
+            }
+
+    def on_span_start(self, span):
+        pass
+
+    def on_span_end(self, span):
+        try:
+            record = span_record(span)
+        except Exception as e:
+            logger.warning("Error recording trace span: %s", e)
+            return
+        with self._lock:
+            trace = self._traces.get(span.trace_id)
+            if trace is not None:
+                trace["spans"].append(record)
+
+    def on_trace_end(self, trace):
+        with self._lock:
+            record = self._traces.pop(trace.trace_id, None)
+        if record is None:
+            return
+        record["duration_ms"] = round((time.perf_counter() - record.pop("_start")) * 1000, 2)
+        spans = record["spans"]
+        record["model_calls"] = sum(1 for s in spans if s["type"] in ("response", "generation"))
+        record["agent_chain"] = [s["name"] for s in sorted(
+            (s for s in spans if s["type"] == "agent"), key=lambda s: s["started_at"] or ""
+        )]
+        record["input_tokens"] = sum(s.get("input_tokens") or 0 for s in spans)
+        record["output_tokens"] = sum(s.get("output_tokens") or 0 for s in spans)
+        record["cached_tokens"] = sum(s.get("cached_tokens") or 0 for s in spans)
+        try:
+            line = json.dumps(record, default=str)
+            with self._lock:
+                if self._handler is None:
+                    self._handler = self._open()
+            self._handler.handle(logging.makeLogRecord({"msg": line}))
+        except Exception as e:
+            logger.warning("Error writing run trace: %s", e)
+
+    def shutdown(self):
+        if self._handler is not None:
+            self._handler.close()
+
+    def force_flush(self):
+        if self._handler is not None:
+            self._handler.flush()
+
+
+def init_tracing(path: str = TRACE_FILE, after_fork: bool = False):
+    """Register the SDK's exporter and, unless path is empty, the local JSONL one.
+
+    Replaces whatever processors were registered. In a forked worker pass after_fork: the
+    SDK's processor exports from a thread that only ran in the parent, so the worker gets
+    a new one of its own.
+    """
+    exporter = BatchTraceProcessor(default_exporter()) if after_fork else default_processor()
+    local = LocalTraceProcessor(path) if path else None
+    set_trace_processors([exporter, local] if local is not None else [exporter])
+    return local
@@ -4,6 +4,17 @@ document.addEventListener('DOMContentLoaded', function() {
     const chatContainer = document.getElementById('chatContainer');
     const typingIndicator = document.getElementById('typingIndicator');
     const errorMessage = document.getElementById('errorMessage');
+    const typingStatus = document.getElementById('typingStatus');
+
+    function newId() {
+        return (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    // One chat session per tab, used by both the WebSocket channel and POST /ask
+    const sessionId = sessionStorage.getItem('montySessionId') || newId();
+    sessionStorage.setItem('montySessionId', sessionId);
 
     // Array of thinking sounds from Montague Pianos server
     const thinkingSounds = [
@@ -85,6 +96,67 @@ document.addEventListener('DOMContentLoaded', function() {
         thinkingSound.currentTime = 0;
     }
 
+    // Audio comes as hex from /ask and as raw bytes over the WebSocket channel
+    function audioBytes(audioData) {
+        if (typeof audioData === 'string') {
+            return new Uint8Array(audioData.match(/.{1,2}/g).map(byte => parseInt(byte, 16)));
+        }
+        return new Uint8Array(audioData);
+    }
+
+    function attachAudio(messageDiv, audioData) {
+        console.log('Processing audio data, length:', audioData.length || audioData.byteLength);
+        
+        // Stop any currently playing audio (both response and thinking sounds)
+        stopCurrentAudio();
+        
+        const audioDiv = document.createElement('div');
+        audioDiv.className = 'message-audio';
+        const audio = document.createElement('audio');
+        audio.style.display = 'none';
+        
+        try {
+            const audioArray = audioBytes(audioData);
+            console.log('Audio array created, length:', audioArray.length);
+            
+            const audioBlob = new Blob([audioArray], { type: 'audio/mp3' });
+            console.log('Audio blob created, size:', audioBlob.size);
+            
+            const audioUrl = URL.createObjectURL(audioBlob);
+            console.log('Audio URL created:', audioUrl);
+            
+            audio.src = audioUrl;
+            
+            // Set as current audio before playing
+            currentResponseAudio = audio;
+            
+            console.log('Attempting to play audio...');
+            audio.play().then(() => {
+                console.log('Audio playback started successfully');
+            }).catch(error => {
+                console.error('Error playing audio:', error);
+                showError('Error playing audio response');
+                currentResponseAudio = null;
+            });
+            
+            audio.addEventListener('ended', () => {
+                console.log('Audio playback ended');
+                URL.revokeObjectURL(audioUrl);
+                if (currentResponseAudio === audio) {
+                    currentResponseAudio = null;
+                }
+                audio.remove();
+            });
+            
+            audioDiv.appendChild(audio);
+            messageDiv.appendChild(audioDiv);
+        } catch (error) {
+            console.error('Error processing audio data:', error);
+            showError('Error processing audio response');
+            currentResponseAudio = null;
+        }
+    }
+
     function addMessage(content, isUser = false, audioData = null, isIntermediate = false) {
         console.log('Adding message:', { content, isUser, hasAudio: !!audioData, isIntermediate });
         
@@ -111,61 +183,196 @@ document.addEventListener('DOMContentLoaded', function() {
         messageDiv.appendChild(textDiv);
 
         if (!isUser && audioData) {
-            console.log('Processing audio data, length:', audioData.length);
-            
-            // Stop any currently playing audio (both response and thinking sounds)
-            stopCurrentAudio();
-            
-            const audioDiv = document.createElement('div');
-            audioDiv.className = 'message-audio';
-            const audio = document.createElement('audio');
-            audio.style.display = 'none';
-            
-            try {
-                console.log('Converting hex to audio array...');
-                const audioArray = new Uint8Array(audioData.match(/.{1,2}/g).map(byte => parseInt(byte, 16)));
-                console.log('Audio array created, length:', audioArray.length);
-                
-                const audioBlob = new Blob([audioArray], { type: 'audio/mp3' });
-                console.log('Audio blob created, size:', audioBlob.size);
-                
-                const audioUrl = URL.createObjectURL(audioBlob);
-                console.log('Audio URL created:', audioUrl);
+            attachAudio(messageDiv, audioData);
+        }
+
+        chatContainer.appendChild(messageDiv);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+        return messageDiv;
+    }
+
+    let askController = null;
+
+    // Optional WebSocket channel: replies, status updates and audio come back over one
+    // connection instead of a POST per turn. Whenever it isn't open, POST /ask is used instead.
+    const channel = {
+        socket: null,
+        failures: 0,
+        turns: new Map(),    // turn_id -> { onEvent, resolve, audio }
+        audioHeader: null,   // describes the binary frame that comes next
+
+        isOpen() {
+            return this.socket !== null && this.socket.readyState === WebSocket.OPEN;
+        },
+
+        connect() {
+            // Stop trying after a few connections that never opened (e.g. a proxy without WebSockets)
+            if (this.socket || this.failures >= 3 || !('WebSocket' in window)) {
+                return;
+            }
+            const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+            const socket = new WebSocket(`${scheme}://${location.host}/ws?session_id=${encodeURIComponent(sessionId)}`);
+            socket.binaryType = 'arraybuffer';
+            let opened = false;
+            socket.onopen = () => {
+                opened = true;
+                this.failures = 0;
+            };
+            socket.onmessage = (event) => this.receive(event.data);
+            socket.onclose = () => {
+                if (!opened) {
+                    this.failures += 1;
+                }
+                this.socket = null;
+                this.audioHeader = null;
+                // Turns still in progress won't be answered on this connection
+                for (const turn of this.turns.values()) {
+                    turn.resolve(null);
+                }
+                this.turns.clear();
+            };
+            this.socket = socket;
+        },
+
+        close() {
+            if (this.socket) {
+                this.socket.close();
+            }
+        },
+
+        // Resolves with the turn's final result, or null if the channel closed first
+        request(type, message, turnId, onEvent = () => {}) {
+            return new Promise(resolve => {
+                this.turns.set(turnId, { onEvent, resolve, audio: null });
+                this.socket.send(JSON.stringify({ type: type, message: message, turn_id: turnId }));
+            });
+        },
+
+        receive(data) {
+            if (data instanceof ArrayBuffer) {
+                const header = this.audioHeader;
+                this.audioHeader = null;
+                const turn = header && this.turns.get(header.turn_id);
+                if (turn) {
+                    turn.audio = data;
+                    turn.onEvent({ type: 'audio', audio: data });
+                }
+                return;
+            }
+            const event = JSON.parse(data);
+            if (event.type === 'audio') {
+                this.audioHeader = event;
+                return;
+            }
+            if (event.type === 'error') {
+                console.error('Channel error:', event.message);
+                return;
+            }
+            const turn = this.turns.get(event.turn_id);
+            if (!turn) {
+                return;
+            }
+            if (event.type === 'done') {
+                this.turns.delete(event.turn_id);
+                turn.resolve(Object.assign({}, event, { audio: turn.audio }));
+            } else {
+                turn.onEvent(event);
+            }
+        }
+    };
+    channel.connect();
+
+    // Audio for a piece of text: hex from /generate-audio, or bytes over the channel
+    async function requestAudio(text) {
+        if (channel.isOpen()) {
+            const result = await channel.request('speak', text, newId());
+            if (result) {
+                return result.audio;
+            }
+        }
+        const audioResponse = await fetch('/generate-audio', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ message: text })
+        });
+        if (!audioResponse.ok) {
+            return null;
+        }
+        const audioData = await audioResponse.json();
+        return audioData.audio;
+    }
+
+    function showReply(data, messageDiv = null) {
+        if (!data.response) {
+            return;
+        }
+        // Over the channel the text may already be on screen, with its audio attached
+        if (!messageDiv) {
+            addMessage(data.response, false, data.audio, false);
+        }
+        
+        // Check if this is a booking confirmation message
+        const isBookingConfirmation = data.response.includes("appointment is all set") || 
+                                      data.response.includes("piano tuning appointment is all set") ||
+                                      data.response.includes("Booking confirmed") ||
+                                      data.response.includes("Your piano tuning appointment");
+        
+        // If this is a booking confirmation, add payment message
+        if (isBookingConfirmation) {
+            setTimeout(() => {
+                // Add payment message with link
+                const paymentMessageText = "To confirm and pay for your tuning please visit https://buy.stripe.com/aEUdTUaLId6EgBW9AA";
                 
-                audio.src = audioUrl;
+                // Create payment message element
+                const messageDiv = document.createElement('div');
+                messageDiv.className = 'message monty payment-message';
                 
-                // Set as current audio before playing
-                currentResponseAudio = audio;
+                const textDiv = document.createElement('div');
+                textDiv.className = 'message-text';
                 
-                console.log('Attempting to play audio...');
-                audio.play().then(() => {
-                    console.log('Audio playback started successfully');
-                }).catch(error => {
-                    console.error('Error playing audio:', error);
-                    showError('Error playing audio response');
-                    currentResponseAudio = null;
+                // Convert the URL to a clickable link
+                const urlRegex = /(https?:\/\/[^\s]+)/g;
+                const htmlContent = paymentMessageText.replace(urlRegex, function(url) {
+                    return `<a href="${url}" target="_blank" rel="noopener noreferrer">${url}</a>`;
                 });
                 
-                audio.addEventListener('ended', () => {
-                    console.log('Audio playback ended');
-                    URL.revokeObjectURL(audioUrl);
-                    if (currentResponseAudio === audio) {
-                        currentResponseAudio = null;
-                    }
-                    audio.remove();
-                });
+                textDiv.innerHTML = htmlContent;
+                messageDiv.appendChild(textDiv);
+                chatContainer.appendChild(messageDiv);
+                chatContainer.scrollTop = chatContainer.scrollHeight;
                 
-                audioDiv.appendChild(audio);
-                messageDiv.appendChild(audioDiv);
-            } catch (error) {
-                console.error('Error processing audio data:', error);
-                showError('Error processing audio response');
-                currentResponseAudio = null;
-            }
+            }, 2000); // Add payment message after 2 seconds
         }
+    }
 
-        chatContainer.appendChild(messageDiv);
-        chatContainer.scrollTop = chatContainer.scrollHeight;
+    // Returns false if the channel closed before the turn was answered
+    async function askOverChannel(message, turnId) {
+        let replyDiv = null;
+        const result = await channel.request('ask', message, turnId, (event) => {
+            if (event.type === 'status') {
+                typingStatus.textContent = event.message;
+            } else if (event.type === 'reply') {
+                // Show the text straight away; its audio follows when it's ready
+                typingIndicator.style.display = 'none';
+                replyDiv = addMessage(event.response, false, null, false);
+            } else if (event.type === 'audio' && replyDiv) {
+                attachAudio(replyDiv, event.audio);
+            }
+        });
+        if (!result) {
+            return false;
+        }
+        if (result.status === 200) {
+            showReply(result, replyDiv);
+        } else if (result.status === 429 && result.response) {
+            // Server is busy: show its short "try again" message
+            addMessage(result.response, false, null, false);
+        } else if (result.status !== 499) {
+            addMessage("I'm sorry, we're having technical difficulties connecting to our booking system. Please try again later or call Lee directly on 01442 876131 for assistance.", false, null, false);
+        }
+        return true;
     }
 
     async function sendMessage() {
@@ -180,6 +387,7 @@ document.addEventListener('DOMContentLoaded', function() {
             // Notify parent window that we're sending a message
             window.parent.postMessage({ type: 'monty-send' }, '*');
             
+            typingStatus.textContent = '';
             typingIndicator.style.display = 'block';
             playRandomThinkingSound();
             
@@ -261,58 +469,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     intermediateElement = messageDiv;
                     
                     // Request audio for the intermediate message (audio will be for the full message)
-                    const audioResponse = await fetch('/generate-audio', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({ message: intermediateMessageText }) // Use plain text for audio
-                    });
+                    const intermediateAudio = await requestAudio(intermediateMessageText); // Use plain text for audio
                     
-                    if (audioResponse.ok) {
-                        const audioData = await audioResponse.json();
-                        if (audioData.audio) {
-                            // Add audio to the existing intermediate message
-                            const audioDiv = document.createElement('div');
-                            audioDiv.className = 'message-audio';
-                            const audio = document.createElement('audio');
-                            audio.style.display = 'none';
-                            
-                            try {
-                                console.log('Converting hex to audio array...');
-                                const audioArray = new Uint8Array(audioData.audio.match(/.{1,2}/g).map(byte => parseInt(byte, 16)));
-                                
-                                const audioBlob = new Blob([audioArray], { type: 'audio/mp3' });
-                                const audioUrl = URL.createObjectURL(audioBlob);
-                                
-                                audio.src = audioUrl;
-                                
-                                // Set as current audio before playing
-                                currentResponseAudio = audio;
-                                
-                                audio.play().then(() => {
-                                    console.log('Intermediate audio playback started successfully');
-                                }).catch(error => {
-                                    console.error('Error playing intermediate audio:', error);
-                                    currentResponseAudio = null;
-                                });
-                                
-                                audio.addEventListener('ended', () => {
-                                    console.log('Intermediate audio playback ended');
-                                    URL.revokeObjectURL(audioUrl);
-                                    if (currentResponseAudio === audio) {
-                                        currentResponseAudio = null;
-                                    }
-                                    audio.remove();
-                                });
-                                
-                                audioDiv.appendChild(audio);
-                                messageDiv.appendChild(audioDiv);
-                            } catch (error) {
-                                console.error('Error processing intermediate audio:', error);
-                                currentResponseAudio = null;
-                            }
-                        }
+                    if (intermediateAudio) {
+                        // Add audio to the existing intermediate message
+                        attachAudio(messageDiv, intermediateAudio);
                     }
                 } catch (error) {
                     console.error('Error handling intermediate message:', error);
@@ -323,13 +484,28 @@ document.addEventListener('DOMContentLoaded', function() {
             
             console.log('Sending message to server...');
             try {
+                // One ID per turn, so a resubmitted request is answered once by the server
+                const turnId = newId();
+                
+                // Reconnects the channel if it dropped (idle, network change) for the next turn
+                channel.connect();
+                if (channel.isOpen()) {
+                    console.log('Sending message over the WebSocket channel...');
+                    if (await askOverChannel(message, turnId)) {
+                        return;
+                    }
+                    console.log('Channel closed before the reply; retrying over /ask');
+                }
+                
                 console.log('Making API request to /ask endpoint...');
+                askController = new AbortController();
                 const response = await fetch('/ask', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
                     },
-                    body: JSON.stringify({ message: message })
+                    body: JSON.stringify({ message: message, session_id: sessionId, turn_id: turnId }),
+                    signal: askController.signal
                 });
 
                 console.log('Response status:', response.status, response.statusText);
@@ -363,6 +539,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     if (responseData && responseData.error) {
                         throw new Error(`Failed to get response: ${responseData.error}`);
                     } else {
+                        // Server is busy: show its short "try again" message
+                        if (response.status === 429 && responseData && responseData.response) {
+                            addMessage(responseData.response, false, null, false);
+                            return;
+                        }
                         // Handle 500 error from Flask backend
                         if (response.status === 500) {
                             // Show error message instead of mock data
@@ -380,47 +561,16 @@ document.addEventListener('DOMContentLoaded', function() {
                 const data = responseData || (responseText ? JSON.parse(responseText) : {});
                 
                 console.log('Response processed successfully:', data ? 'has data' : 'empty data');
-                if (data.response) {
-                    // Add the text message to the chat (not an intermediate message)
-                    addMessage(data.response, false, data.audio, false);
-                    
-                    // Check if this is a booking confirmation message
-                    const isBookingConfirmation = data.response.includes("appointment is all set") || 
-                                                  data.response.includes("piano tuning appointment is all set") ||
-                                                  data.response.includes("Booking confirmed") ||
-                                                  data.response.includes("Your piano tuning appointment");
-                    
-                    // If this is a booking confirmation, add payment message
-                    if (isBookingConfirmation) {
-                        setTimeout(() => {
-                            // Add payment message with link
-                            const paymentMessageText = "To confirm and pay for your tuning please visit https://buy.stripe.com/aEUdTUaLId6EgBW9AA";
-                            
-                            // Create payment message element
-                            const messageDiv = document.createElement('div');
-                            messageDiv.className = 'message monty payment-message';
-                            
-                            const textDiv = document.createElement('div');
-                            textDiv.className = 'message-text';
-                            
-                            // Convert the URL to a clickable link
-                            const urlRegex = /(https?:\/\/[^\s]+)/g;
-                            const htmlContent = paymentMessageText.replace(urlRegex, function(url) {
-                                return `<a href="${url}" target="_blank" rel="noopener noreferrer">${url}</a>`;
-                            });
-                            
-                            textDiv.innerHTML = htmlContent;
-                            messageDiv.appendChild(textDiv);
-                            chatContainer.appendChild(messageDiv);
-                            chatContainer.scrollTop = chatContainer.scrollHeight;
-                            
-                        }, 2000); // Add payment message after 2 seconds
-                    }
-                }
+                showReply(data);
             } catch (error) {
+                if (error.name === 'AbortError') {
+                    // We cancelled this request ourselves; the server stops working on it
+                    return;
+                }
                 console.error('Error:', error);
                 addMessage('Sorry, I encountered an error. Please try again.', 'system');
             } finally {
+                askController = null;
                 typingIndicator.style.display = 'none';
                 thinkingSound.pause();
                 thinkingSound.currentTime = 0;
@@ -431,6 +581,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Leaving the page hangs up on an unfinished reply so the server can stop generating it
+    window.addEventListener('pagehide', () => {
+        if (askController) {
+            askController.abort();
+        }
+        channel.close();
+    });
+
     sendButton.addEventListener('click', sendMessage);
     userInput.addEventListener('keypress', function(e) {
         if (e.key === 'Enter' && !e.shiftKey) {
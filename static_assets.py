@@ -0,0 +1,250 @@
+"""Static files with content-hashed URLs, compressed once, and compressed JSON replies.
+
+url_for('static', filename='js/script.js') gives /static/js/script.<hash>.js. Those URLs are
+served from memory with a year-long immutable Cache-Control, an ETag and a brotli or gzip
+body, chosen from Accept-Encoding. A changed file gets a new hash, so browsers only fetch
+what changed. The page itself is served compressed with an ETag, so a repeat visit is a 304. Large JSON replies (/ask with its hex audio) are compressed
+on the way out. Files are hashed and compressed by preload() (warm-up, or the gunicorn master),
+or else on the first request that needs them, never at import.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+
+from flask import Response, request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # In requirements.txt; without it, gzip only (logged when the files load)
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("STATIC_ASSETS", "1").lower() not in ("0", "false", "no")
+# Smaller bodies gain less from compression than it costs
+MIN_COMPRESS_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Replies are compressed per request, so they get the fastest settings; hex audio shrinks
+# about as much at level 1 as at level 6
+REPLY_GZIP_LEVEL = 1
+REPLY_BROTLI_QUALITY = 1
+HASH_LENGTH = 10
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def compressible(mimetype) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, best: bool = True) -> dict:
+    """{encoding: body} for each encoding that makes data smaller, identity included."""
+    bodies = {"identity": data}
+    if len(data) < MIN_COMPRESS_BYTES:
+        return bodies
+    candidates = {"gzip": gzip.compress(data, 9 if best else REPLY_GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(data, quality=11 if best else REPLY_BROTLI_QUALITY)
+    for encoding, body in candidates.items():
+        if len(body) < len(data):
+            bodies[encoding] = body
+    return bodies
+
+
+def choose_encoding(available) -> str:
+    """The smallest encoding we have that the client accepts."""
+    accepted = request.accept_encodings
+    best = "identity"
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted[encoding] > 0:
+            if best == "identity" or len(available[encoding]) < len(available[best]):
+                best = encoding
+    return best
+
+
+class Asset:
+    """One static file: its hashed name and its body in each encoding."""
+
+    __slots__ = ("filename", "url_name", "mimetype", "digest", "bodies", "stamp")
+
+    def __init__(self, filename, data, mimetype, stamp):
+        self.filename = filename
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        root, ext = os.path.splitext(filename)
+        self.url_name = f"{root}.{self.digest}{ext}"
+        self.bodies = compress(data) if compressible(mimetype) else {"identity": data}
+        # (mtime, size) when read, to notice edits
+        self.stamp = stamp
+
+
+class AssetManifest:
+    """Every file under the static folder, loaded on first use and reloaded when it changes on disk."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._by_filename = {}
+        # Hashed names stay servable after an edit, so pages already loaded keep working
+        self._by_url_name = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def __len__(self):
+        self.load()
+        return len(self._by_filename)
+
+    def load(self):
+        """Hash and compress every file, once."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            for root, dirs, files in os.walk(self.directory):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                for name in files:
+                    if not name.startswith("."):
+                        filename = os.path.relpath(os.path.join(root, name), self.directory).replace(os.sep, "/")
+                        self._load(filename)
+            self._loaded = True
+        logger.info("Static assets: %d files hashed (brotli %s)", len(self._by_filename),
+                    "on" if brotli is not None else "not installed")
+
+    def _stamp(self, filename):
+        try:
+            st = os.stat(os.path.join(self.directory, filename))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, filename):
+        stamp = self._stamp(filename)
+        if stamp is None:
+            return None
+        with open(os.path.join(self.directory, filename), "rb") as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        asset = Asset(filename, data, mimetype, stamp)
+        with self._lock:
+            self._by_filename[filename] = asset
+            self._by_url_name[asset.url_name] = asset
+        return asset
+
+    def get(self, filename):
+        """The current asset for a plain filename, re-read if the file has changed."""
+        self.load()
+        asset = self._by_filename.get(filename)
+        if asset is None:
+            return None
+        if self._stamp(filename) != asset.stamp:
+            logger.info("Static file changed, rehashing: %s", filename)
+            asset = self._load(filename) or asset
+        return asset
+
+    def url_name(self, filename) -> str:
+        asset = self.get(filename)
+        return asset.url_name if asset is not None else filename
+
+    def lookup(self, name):
+        """(asset, immutable) for a requested name: hashed names are immutable, plain ones aren't."""
+        self.load()
+        asset = self._by_url_name.get(name)
+        if asset is not None:
+            return asset, True
+        return self.get(name), False
+
+
+def send_bodies(bodies, mimetype, etag, cache_control):
+    """Serve the best encoding of a body, answering 304 when the client's copy is current."""
+    encoding = choose_encoding(bodies)
+    response = Response(bodies[encoding], mimetype=mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    # Each encoding is a different representation, so it gets its own ETag
+    response.set_etag(etag if encoding == "identity" else f"{etag}-{encoding}")
+    response.headers["Cache-Control"] = cache_control
+    return response.make_conditional(request)
+
+
+_pages = {}
+_pages_lock = threading.Lock()
+
+
+def send_page(html: str, mimetype="text/html"):
+    """A rendered page, compressed once per distinct content, revalidated by ETag on each visit."""
+    if not ENABLED:
+        return html
+    data = html.encode("utf-8")
+    etag = hashlib.sha256(data).hexdigest()[:16]
+    bodies = _pages.get(etag)
+    if bodies is None:
+        bodies = compress(data)
+        with _pages_lock:
+            # A page changes only when an asset hash does; drop the old renderings then
+            if len(_pages) >= 8:
+                _pages.clear()
+            _pages[etag] = bodies
+    return send_bodies(bodies, mimetype, etag, REVALIDATE)
+
+
+def compress_reply(response):
+    """Compress a large JSON reply for clients that accept it."""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or "Content-Encoding" in response.headers or response.mimetype != "application/json"):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    bodies = compress(data, best=False)
+    encoding = choose_encoding(bodies)
+    if encoding == "identity":
+        return response
+    response.set_data(bodies[encoding])
+    response.headers["Content-Encoding"] = encoding
+    metrics.inc("monty_compressed_replies_total", encoding=encoding)
+    metrics.inc("monty_compression_saved_bytes_total", len(data) - len(bodies[encoding]))
+    return response
+
+
+def init_app(app):
+    """Serve static files from the manifest and compress JSON replies.
+
+    Register before the other hooks: after_request functions run in reverse order, so
+    replies are compressed last, after de-duplication and recording have seen them as-is.
+    """
+    if not ENABLED:
+        return None
+    manifest = AssetManifest(app.static_folder)
+    app.extensions["static_assets"] = manifest
+    fallback = app.view_functions["static"]
+
+    @app.url_defaults
+    def _hashed_static_url(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = manifest.url_name(values["filename"])
+
+    def static(filename):
+        asset, immutable = manifest.lookup(filename)
+        if asset is None:
+            return fallback(filename=filename)
+        return send_bodies(asset.bodies, asset.mimetype, asset.digest, IMMUTABLE if immutable else REVALIDATE)
+
+    app.view_functions["static"] = static
+    app.after_request(compress_reply)
+    return manifest
+
+
+def preload(app):
+    """Hash and compress the static files now, rather than on the first request."""
+    manifest = app.extensions.get("static_assets")
+    if manifest is not None:
+        manifest.load()
@@ -0,0 +1,105 @@
+import json
+import logging
+from dataclasses import replace
+
+# Names of tools that must never be memoized (they change something upstream)
+NO_MEMO_TOOLS = set()
+
+logger = logging.getLogger(__name__)
+
+
+class RunMemo:
+    """Tool results remembered for the lifetime of a single Runner.run call."""
+
+    def __init__(self):
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def put(self, key, value):
+        self.results[key] = value
+
+
+def no_memo(tool):
+    """Mark a tool (or the function it will be built from) as side-effecting so it always runs."""
+    NO_MEMO_TOOLS.add(getattr(tool, "name", None) or tool.__name__)
+    return tool
+
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        # Collapse whitespace and ignore case so "hp4 3qh" and " HP4  3QH" match
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {k: _normalize_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_value(v) for v in value]
+    return value
+
+
+def memo_key(tool_name: str, raw_args: str, normalize=None) -> tuple:
+    """Build a cache key from the tool name and its normalized JSON arguments."""
+    try:
+        args = json.loads(raw_args) if raw_args else {}
+    except ValueError:
+        # Not valid JSON, fall back to the raw string
+        return (tool_name, raw_args)
+    args = _normalize_value(args)
+    if normalize is not None:
+        args = normalize(args)
+    return (tool_name, json.dumps(args, sort_keys=True, separators=(",", ":")))
+
+
+def _find_memo(ctx):
+    context = ctx.context
+    if isinstance(context, RunMemo):
+        return context
+    memo = getattr(context, "tool_memo", None)
+    return memo if isinstance(memo, RunMemo) else None
+
+
+def memoize_tool(tool, normalize=None):
+    """Wrap a function_tool so repeated calls within one run reuse the first result.
+
+    `normalize` can further canonicalise the parsed argument dict (e.g. strip spaces
+    out of a postcode). Runs without a RunMemo in their context call straight through.
+    """
+    if tool.name in NO_MEMO_TOOLS:
+        return tool
+
+    invoke = tool.on_invoke_tool
+
+    async def _on_invoke_tool(ctx, raw_args: str):
+        memo = _find_memo(ctx)
+        if memo is None:
+            return await invoke(ctx, raw_args)
+
+        key = memo_key(tool.name, raw_args, normalize)
+        cached = memo.get(key)
+        if cached is not None:
+            memo.hits += 1
+            logger.debug("Tool memo hit for %s", tool.name)
+            return cached
+
+        memo.misses += 1
+        result = await invoke(ctx, raw_args)
+        memo.put(key, result)
+        return result
+
+    return replace(tool, on_invoke_tool=_on_invoke_tool)
+
+
+def memoize_tools(tools, normalizers=None):
+    """Memoize every function_tool in a list, leaving hosted and no_memo tools alone."""
+    from agents.tool import FunctionTool
+
+    normalizers = normalizers or {}
+    wrapped = []
+    for tool in tools:
+        if isinstance(tool, FunctionTool):
+            tool = memoize_tool(tool, normalizers.get(tool.name))
+        wrapped.append(tool)
+    return wrapped
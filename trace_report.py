@@ -0,0 +1,148 @@
+"""Summarise the agent run traces written by run_tracing.py.
+
+    python trace_report.py                      # summary of traces/agent_runs.jsonl*
+    python trace_report.py --folded > runs.folded   # flame graph input (flamegraph.pl, speedscope)
+"""
+import argparse
+import glob
+import json
+from collections import Counter, defaultdict
+
+from run_tracing import TRACE_FILE
+
+
+def load_traces(paths):
+    traces = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    continue
+    return traces
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def frame_name(span):
+    if span["type"] == "agent":
+        return span.get("name") or "agent"
+    if span["type"] == "function":
+        return f"tool:{span.get('name')}"
+    if span["type"] in ("response", "generation"):
+        return f"model:{span.get('name')}"
+    if span["type"] == "handoff":
+        return f"handoff:{span.get('name')}"
+    return f"{span['type']}:{span.get('name', '')}"
+
+
+def folded_stacks(traces):
+    """Aggregate self time (ms) per call stack across all traces."""
+    totals = Counter()
+    for trace in traces:
+        spans = {s["id"]: s for s in trace.get("spans", [])}
+        children = defaultdict(list)
+        for span in spans.values():
+            children[span.get("parent_id")].append(span)
+
+        def stack_of(span):
+            names = []
+            while span is not None:
+                names.append(frame_name(span))
+                span = spans.get(span.get("parent_id"))
+            return [trace.get("workflow") or "run"] + names[::-1]
+
+        for span in spans.values():
+            duration = span.get("duration_ms") or 0
+            child_time = sum(c.get("duration_ms") or 0 for c in children[span["id"]])
+            self_time = max(0.0, duration - child_time)
+            if self_time:
+                totals[";".join(stack_of(span))] += self_time
+    return totals
+
+
+def print_summary(traces, top):
+    durations = [t.get("duration_ms") or 0 for t in traces]
+    print(f"Runs: {len(traces)}")
+    print(f"Run duration ms: p50={percentile(durations, 0.5):.0f} "
+          f"p95={percentile(durations, 0.95):.0f} p99={percentile(durations, 0.99):.0f}")
+
+    hops = Counter(t.get("model_calls", 0) for t in traces)
+    print("\nModel calls per run:")
+    for count in sorted(hops):
+        print(f"  {count:>2} calls: {hops[count]} runs")
+
+    chains = defaultdict(list)
+    for t in traces:
+        chains[" > ".join(t.get("agent_chain") or [])].append(t.get("duration_ms") or 0)
+    print("\nAgent chains (slowest mean first):")
+    ranked = sorted(chains.items(), key=lambda item: -sum(item[1]) / len(item[1]))
+    for chain, values in ranked[:top]:
+        print(f"  {len(values):>5} runs  mean={sum(values) / len(values):>8.0f}ms  {chain or '(none)'}")
+
+    tiers = defaultdict(list)
+    for t in traces:
+        tier = (t.get("metadata") or {}).get("tier")
+        if tier:
+            tiers[tier].append(t)
+    if tiers:
+        print("\nModel tiers:")
+        for tier, runs in sorted(tiers.items()):
+            values = [r.get("duration_ms") or 0 for r in runs]
+            tokens_in = sum(r.get("input_tokens") or 0 for r in runs) / len(runs)
+            tokens_out = sum(r.get("output_tokens") or 0 for r in runs) / len(runs)
+            print(f"  {tier:<6} {len(runs):>5} runs  p50={percentile(values, 0.5):>7.0f}ms "
+                  f"p95={percentile(values, 0.95):>7.0f}ms  tokens in/out per run={tokens_in:.0f}/{tokens_out:.0f}")
+
+    per_frame = defaultdict(list)
+    tokens = defaultdict(lambda: [0, 0, 0])
+    for t in traces:
+        for span in t.get("spans", []):
+            if span["type"] in ("function", "response", "generation", "handoff"):
+                per_frame[frame_name(span)].append(span.get("duration_ms") or 0)
+            if span["type"] in ("response", "generation"):
+                tokens[frame_name(span)][0] += span.get("input_tokens") or 0
+                tokens[frame_name(span)][1] += span.get("output_tokens") or 0
+                tokens[frame_name(span)][2] += span.get("cached_tokens") or 0
+    print("\nTools and model calls:")
+    ranked = sorted(per_frame.items(), key=lambda item: -sum(item[1]))
+    for name, values in ranked[:top]:
+        line = (f"  {name:<45} n={len(values):<5} total={sum(values):>9.0f}ms "
+                f"p50={percentile(values, 0.5):>7.0f} p95={percentile(values, 0.95):>7.0f}")
+        if name in tokens:
+            line += f"  tokens in/out={tokens[name][0]}/{tokens[name][1]} cached={tokens[name][2]}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise local agent run traces.")
+    parser.add_argument("files", nargs="*", help="Trace files (default: the rotating trace file and its backups)")
+    parser.add_argument("--folded", action="store_true", help="Print folded stacks for flame graph tools")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show per section")
+    args = parser.parse_args()
+
+    paths = args.files or sorted(glob.glob(TRACE_FILE + "*"))
+    traces = load_traces(paths)
+    if not traces:
+        print("No traces found.")
+        return
+
+    if args.folded:
+        for stack, ms in sorted(folded_stacks(traces).items()):
+            if round(ms):
+                print(f"{stack} {int(round(ms))}")
+    else:
+        print_summary(traces, args.top)
+
+
+if __name__ == "__main__":
+    main()
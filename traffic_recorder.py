@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request
+
+from logging_setup import EMAIL_RE, PHONE_RE, POSTCODE_RE, request_id_var
+
+# Set RECORD_TRAFFIC to a file path (e.g. recordings/ask_traffic.jsonl) to record /ask turns for replay.py
+RECORD_TRAFFIC = os.environ.get("RECORD_TRAFFIC", "")
+RECORD_MAX_BYTES = int(os.environ.get("RECORD_MAX_BYTES", str(20 * 1024 * 1024)))
+RECORD_BACKUP_COUNT = int(os.environ.get("RECORD_BACKUPS", "5"))
+# Salt for pseudonymising session IDs, so recordings can't be joined back to browser sessions
+RECORD_SALT = os.environ.get("RECORD_SALT", "monty")
+
+logger = logging.getLogger(__name__)
+
+# Booking-flow answers are free text (names, addresses) that no regex can scrub reliably,
+# so they are swapped for fixed stand-ins that drive the same code path on replay.
+STAGE_PLACEHOLDERS = {
+    "collecting_name": "Jane Example",
+    "collecting_address": "53 High Street, Northchurch HP4 3QH",
+    "collecting_phone": "07000 000000",
+}
+# The same goes for an answer to the agent asking for details itself (its booking flow)
+DETAILS_PLACEHOLDER = ", ".join(STAGE_PLACEHOLDERS.values())
+DETAILS_REQUEST_RE = re.compile(
+    r"\byour\b[^.?!]*\b(name|address|phone|mobile|contact details)\b", re.IGNORECASE)
+
+
+def asks_for_details(reply: str) -> bool:
+    """True if a reply asks the customer for their name, address or phone number."""
+    return bool(reply) and DETAILS_REQUEST_RE.search(reply) is not None
+
+
+def scrub_message(message: str, booking_stage: str = None, previous_reply: str = None) -> str:
+    """Remove customer details while keeping the message routable (postcode area, intent)."""
+    if booking_stage in STAGE_PLACEHOLDERS:
+        return STAGE_PLACEHOLDERS[booking_stage]
+    if asks_for_details(previous_reply):
+        return DETAILS_PLACEHOLDER
+    message = EMAIL_RE.sub("customer@example.com", message)
+    message = PHONE_RE.sub("07000 000000", message)
+    # Keep the outward code (it decides the service area) but drop the inward part
+    return POSTCODE_RE.sub(lambda m: m.group(1).upper() + " 1AA", message)
+
+
+def pseudonymise(session_id: str) -> str:
+    return hashlib.sha256(f"{RECORD_SALT}:{session_id}".encode()).hexdigest()[:16]
+
+
+class TrafficRecorder:
+    """Appends one JSON line per /ask turn to a rotating file."""
+
+    def __init__(self, path: str, max_bytes: int = RECORD_MAX_BYTES, backup_count: int = RECORD_BACKUP_COUNT):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._logger = logging.getLogger("monty.traffic")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(handler)
+
+    def record(self, entry: dict):
+        self._logger.info(json.dumps(entry))
+
+
+def init_app(app, path: str = RECORD_TRAFFIC):
+    """Record every /ask turn the app answered (scrubbed) when RECORD_TRAFFIC is set."""
+    if not path:
+        return None
+    recorder = TrafficRecorder(path)
+
+    @app.before_request
+    def _note_start():
+        g.record_start = time.perf_counter()
+        g.record_ts = time.time()
+
+    @app.after_request
+    def _record_turn(response):
+        if request.path != "/ask" or not hasattr(g, "record_start"):
+            return response
+        # The scrub context (booking stage, previous reply) is set by ask(). Replayed retries and
+        # turns turned away by admission control never get there, so they aren't recorded at all
+        if "previous_reply" not in g or response.headers.get("X-Monty-Replayed"):
+            return response
+        try:
+            data = request.get_json(silent=True) or {}
+            body = response.get_json(silent=True) or {}
+            recorder.record({
+                "request_id": request_id_var.get(),
+                "ts": round(g.record_ts, 3),
+                "session_id": pseudonymise(str(data.get("session_id", "default"))),
+                "message": scrub_message(str(data.get("message", "")), getattr(g, "booking_stage", None),
+                                         getattr(g, "previous_reply", None)),
+                "latency_ms": round((time.perf_counter() - g.record_start) * 1000, 1),
+                "status": response.status_code,
+                "agent": body.get("agent"),
+                "path": getattr(g, "ask_path", None),
+            })
+        except Exception as e:
+            logger.warning("Error recording /ask traffic: %s", e)
+        return response
+
+    return recorder
@@ -0,0 +1,78 @@
+import sys
+
+# Content part types whose text can be stored as a plain string
+TEXT_PART_TYPES = ("output_text", "input_text")
+
+
+class Message:
+    """One chat message: an interned role and its content (a string, or the SDK's parts list)."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content):
+        self.role = sys.intern(role)
+        self.content = content
+
+    def text_length(self) -> int:
+        if isinstance(self.content, str):
+            return len(self.content)
+        return sum(len(str(part)) for part in self.content)
+
+    def to_input_item(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+def compact_content(content):
+    """A single text part becomes its text; anything richer is kept as the SDK gave it."""
+    if isinstance(content, list) and len(content) == 1:
+        part = content[0]
+        if isinstance(part, dict) and part.get("type") in TEXT_PART_TYPES and not part.get("annotations"):
+            return part.get("text", "")
+    return content
+
+
+class Transcript:
+    """A session's chat history, appended to turn by turn.
+
+    Stored as slot-based Message records; the SDK's input-list dicts are only built when
+    a run needs them.
+    """
+
+    __slots__ = ("messages", "chars")
+
+    def __init__(self):
+        self.messages = []
+        # Running total of content length, so tier selection doesn't rescan the history
+        self.chars = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def append(self, role: str, content):
+        message = Message(role, compact_content(content))
+        self.messages.append(message)
+        self.chars += message.text_length()
+
+    def add_turn(self, question: str, answer: str):
+        self.append("user", question)
+        self.append("assistant", answer)
+
+    def extend_items(self, items):
+        """Append SDK input items (e.g. a run's new items), skipping tool calls and other non-messages."""
+        for item in items:
+            if "role" in item and "content" in item:
+                self.append(item["role"], item["content"])
+
+    def last_text(self, role: str):
+        """Content of the most recent plain-text message from role, or None."""
+        for message in reversed(self.messages):
+            if message.role == role and isinstance(message.content, str):
+                return message.content
+        return None
+
+    def to_input_list(self) -> list:
+        """The history in the SDK's input format, for Runner.run."""
+        return [message.to_input_item() for message in self.messages]
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, g, request
+
+import metrics
+from admission import session_key
+
+# How long a finished turn can be replayed to a retry carrying the same turn_id
+TURN_ID_TTL = float(os.environ.get("DEDUP_TURN_ID_TTL", "300"))
+# Without a turn_id, an identical message from the same session joins the turn while it is still
+# running. Only with DEDUP_CONTENT_TTL > 0 is a finished reply replayed too (for that many seconds):
+# a repeated "yes" or "2" is usually a new answer, not a retry
+CONTENT_TTL = float(os.environ.get("DEDUP_CONTENT_TTL", "0"))
+# Longest a retry waits for the original turn to finish before running on its own
+WAIT_TIMEOUT = float(os.environ.get("DEDUP_WAIT_TIMEOUT", "90"))
+MAX_ENTRIES = int(os.environ.get("DEDUP_MAX_ENTRIES", "256"))
+
+
+class Turn:
+    """One /ask turn: in flight until done is set, then holds the response to replay."""
+
+    def __init__(self, ttl):
+        self.done = threading.Event()
+        self.response = None
+        self.expires = time.monotonic() + ttl
+
+
+class TurnCache:
+    """Recent turns keyed by (session, turn id) or (session, message hash)."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._turns = OrderedDict()
+
+    def claim(self, key, ttl):
+        """Return (turn, is_owner). The owner runs the turn; everyone else waits on it."""
+        now = time.monotonic()
+        with self._lock:
+            turn = self._turns.get(key)
+            if turn is not None and (turn.expires > now or not turn.done.is_set()):
+                return turn, False
+            turn = self._turns[key] = Turn(ttl)
+            self._turns.move_to_end(key)
+            while len(self._turns) > self.max_entries:
+                self._turns.popitem(last=False)
+            return turn, True
+
+    def finish(self, key, turn, response=None):
+        """Store the owner's response (None = not replayable) and wake any waiters.
+
+        Waiters already hold the turn; it stays for later retries only if its TTL hasn't run out.
+        """
+        with self._lock:
+            turn.response = response
+            expired = response is None or turn.expires <= time.monotonic()
+            if expired and self._turns.get(key) is turn:
+                del self._turns[key]
+        turn.done.set()
+
+
+def turn_key(data):
+    session = session_key()
+    turn_id = data.get("turn_id")
+    if turn_id:
+        return (session, "id", str(turn_id)[:64]), TURN_ID_TTL
+    message = " ".join(str(data.get("message", "")).split()).casefold()
+    return (session, "hash", hashlib.sha256(message.encode("utf-8")).hexdigest()), CONTENT_TTL
+
+
+def _replay(stored):
+    body, status, mimetype, headers = stored
+    response = Response(body, status=status, mimetype=mimetype)
+    response.headers.update(headers)
+    response.headers["X-Monty-Replayed"] = "1"
+    return response
+
+
+def init_app(app, paths=("/ask",)):
+    """Answer retried turns from the original turn instead of running the pipeline twice.
+
+    Register before admission control, so a retry waiting here doesn't hold a slot.
+    """
+    cache = TurnCache()
+
+    @app.before_request
+    def _dedup():
+        if request.path not in paths:
+            return None
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return None
+        key, ttl = turn_key(data)
+        # Two rounds: if the original turn failed, the retry runs it itself
+        for _ in range(2):
+            turn, owner = cache.claim(key, ttl)
+            if owner:
+                g.dedup_turn = (key, turn)
+                return None
+            if not turn.done.wait(WAIT_TIMEOUT):
+                metrics.inc("monty_dedup_total", outcome="wait_timeout")
+                break
+            if turn.response is not None:
+                metrics.inc("monty_dedup_total", outcome="replayed")
+                return _replay(turn.response)
+        return None
+
+    @app.after_request
+    def _store(response):
+        claimed = g.pop("dedup_turn", None)
+        if claimed is not None:
+            key, turn = claimed
+            replayable = response.status_code == 200 and not response.direct_passthrough
+            stored = None
+            if replayable:
+                headers = {k: v for k, v in response.headers.items() if k.startswith("X-Monty-")}
+                stored = (response.get_data(), response.status_code, response.mimetype, headers)
+            cache.finish(key, turn, stored)
+        return response
+
+    @app.teardown_request
+    def _release(exc):
+        # The request died before after_request ran: let waiters run the turn themselves
+        claimed = g.pop("dedup_turn", None)
+        if claimed is not None:
+            cache.finish(*claimed)
+
+    return cache
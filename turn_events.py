@@ -0,0 +1,36 @@
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Where the current turn's progress events go: set by the WebSocket channel, unset for plain /ask
+current_sink = contextvars.ContextVar("turn_event_sink", default=None)
+
+# What the page shows while a stage runs
+STATUS_MESSAGES = {
+    "thinking": "Monty is thinking...",
+    "checking_availability": "Checking availability...",
+    "booking": "Submitting your booking...",
+    "booking_submitted": "Booking submitted",
+    "generating_audio": "Recording Monty's reply...",
+}
+
+
+def streaming() -> bool:
+    """True when the turn's events are pushed to a client as they happen."""
+    return current_sink.get() is not None
+
+
+def emit(kind: str, **data):
+    """Push an event for the current turn, if anyone is listening. Never fails the turn."""
+    sink = current_sink.get()
+    if sink is None:
+        return
+    try:
+        sink(kind, data)
+    except Exception as e:
+        logger.debug("Could not push %s event: %s", kind, e)
+
+
+def status(stage: str):
+    emit("status", stage=stage, message=STATUS_MESSAGES.get(stage, ""))
@@ -0,0 +1,323 @@
+"""A WebSocket channel per chat session: messages in; replies, status events and audio out.
+
+The channel runs over the request's own socket (Werkzeug's dev server or gunicorn), using
+the `websockets` protocol implementation, so it needs no extra server or port. Each message
+goes through the app's normal /ask handling, so de-duplication, cancellation, admission
+control and metrics all apply. turn_events are pushed to the client as they happen.
+
+Client -> server (text frames):
+    {"type": "ask", "message": "...", "turn_id": "..."}
+    {"type": "speak", "message": "...", "turn_id": "..."}     text to speech only
+Server -> client:
+    {"type": "ready", "session_id": "..."}
+    {"type": "status", "turn_id", "stage", "message"}
+    {"type": "reply", "turn_id", "response", "agent"}          as soon as the text is ready
+    {"type": "audio", "turn_id", "format": "mp3", "bytes": n}  then one binary frame of MP3
+    {"type": "done", "turn_id", "status", ...}                 status and body as /ask returns them
+    {"type": "error", "message": "..."}                        for a message we couldn't read
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from flask import Response
+from websockets.datastructures import Headers
+from websockets.exceptions import InvalidState
+from websockets.frames import Opcode
+from websockets.http11 import Request
+from websockets.protocol import State
+from websockets.server import ServerProtocol
+from werkzeug.test import EnvironBuilder
+
+import metrics
+import turn_events
+
+logger = logging.getLogger(__name__)
+
+# Each open channel holds a server thread (or greenlet) for as long as the page is open
+MAX_CONNECTIONS = int(os.environ.get("WS_MAX_CONNECTIONS", "8"))
+IDLE_TIMEOUT = float(os.environ.get("WS_IDLE_TIMEOUT", "300"))
+# Keeps proxies from dropping quiet connections, and is how often idleness is checked
+PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "20"))
+MAX_MESSAGE_BYTES = 64 * 1024
+# How long a turn waits for the one before it to start, so the newer one supersedes the older
+ORDER_TIMEOUT = 1.0
+
+# Message type -> route that answers it
+ROUTES = {"ask": "/ask", "speak": "/generate-audio"}
+# Handshake headers carried over to each turn, so admission control sees the same client
+FORWARDED_HEADERS = ("User-Agent", "X-Forwarded-For", "X-Real-IP")
+
+_open = 0
+_open_lock = threading.Lock()
+
+
+def _handshake_request(environ) -> Request:
+    headers = Headers()
+    for key, value in environ.items():
+        if key.startswith("HTTP_"):
+            headers[key[5:].replace("_", "-")] = value
+    path = environ.get("PATH_INFO", "/")
+    if environ.get("QUERY_STRING"):
+        path += "?" + environ["QUERY_STRING"]
+    return Request(path, headers)
+
+
+class Channel:
+    """An open WebSocket connection. Sends are safe from any thread; one thread reads."""
+
+    def __init__(self, sock, protocol):
+        self.sock = sock
+        self.protocol = protocol
+        # Set once the client has gone; cancellation treats it like a dropped connection
+        self.closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def _flush(self):
+        # Caller holds the lock
+        for data in self.protocol.data_to_send():
+            if data:
+                self.sock.sendall(data)
+            else:
+                # The protocol asks for a half-close once the closing handshake is done
+                self.sock.shutdown(socket.SHUT_WR)
+
+    def _send(self, text=None, binary=None):
+        with self._lock:
+            if self.closed.is_set():
+                return
+            try:
+                if text is not None:
+                    self.protocol.send_text(text.encode("utf-8"))
+                if binary is not None:
+                    self.protocol.send_binary(binary)
+                self._flush()
+            except (OSError, InvalidState) as e:
+                logger.debug("Channel send failed: %s", e)
+                self.closed.set()
+
+    def send_event(self, kind: str, **data):
+        self._send(text=json.dumps({"type": kind, **data}))
+
+    def send_audio(self, turn_id, audio: bytes):
+        # Header and audio go out under one lock, so nothing can land between them
+        header = json.dumps({"type": "audio", "turn_id": turn_id, "format": "mp3", "bytes": len(audio)})
+        self._send(text=header, binary=audio)
+
+    def close(self, code: int = 1000, reason: str = ""):
+        with self._lock:
+            try:
+                self.protocol.send_close(code, reason)
+                self._flush()
+            except (OSError, InvalidState):
+                pass
+            self.closed.set()
+
+    def _receive(self, data: bytes):
+        with self._lock:
+            if data:
+                self.protocol.receive_data(data)
+            else:
+                self.protocol.receive_eof()
+            events = self.protocol.events_received()
+            try:
+                # Pongs and the reply to a close frame
+                self._flush()
+            except OSError:
+                self.closed.set()
+        return events
+
+    def messages(self, busy):
+        """Yield each text message until the client leaves, pinging while it's quiet.
+
+        Closes the channel after IDLE_TIMEOUT without messages, unless busy() says a turn
+        is still running.
+        """
+        self.sock.settimeout(PING_INTERVAL)
+        fragments = []
+        last_message = time.monotonic()
+        while not self.closed.is_set():
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                if not busy() and time.monotonic() - last_message > IDLE_TIMEOUT:
+                    self.close(1001, "idle")
+                    break
+                with self._lock:
+                    try:
+                        self.protocol.send_ping(b"")
+                        self._flush()
+                    except (OSError, InvalidState):
+                        self.closed.set()
+                continue
+            except OSError:
+                break
+            for frame in self._receive(data):
+                if frame.opcode in (Opcode.TEXT, Opcode.BINARY, Opcode.CONT):
+                    fragments.append(frame)
+                    if frame.fin:
+                        last_message = time.monotonic()
+                        first, payload = fragments[0], b"".join(f.data for f in fragments)
+                        fragments = []
+                        if first.opcode is Opcode.TEXT:
+                            yield payload.decode("utf-8")
+                        else:
+                            self.send_event("error", message="Binary messages aren't accepted")
+            if not data or self.protocol.state in (State.CLOSING, State.CLOSED):
+                break
+        self.closed.set()
+
+
+def accept(environ, sock):
+    """Complete the handshake on the request's socket; None if the client's request was bad."""
+    protocol = ServerProtocol(max_size=MAX_MESSAGE_BYTES)
+    # The server has already read the request; replay it so the protocol moves on to frames
+    protocol.receive_data(_handshake_request(environ).serialize())
+    request = protocol.events_received()[0]
+    response = protocol.accept(request)
+    protocol.send_response(response)
+    sock.sendall(b"".join(protocol.data_to_send()))
+    if response.status_code != 101:
+        logger.info("Rejected WebSocket handshake: %s", protocol.handshake_exc)
+        return None
+    return Channel(sock, protocol)
+
+
+class HandOffResponse(Response):
+    """Returned once a channel is over: the socket is ours now, so the server mustn't reply."""
+
+    def __call__(self, environ, start_response):
+        if "gunicorn.socket" in environ:
+            # gunicorn closes the connection quietly on StopIteration
+            raise StopIteration()
+        # Werkzeug treats ConnectionError as the client having gone
+        raise ConnectionError("WebSocket channel closed")
+
+
+class Session:
+    """Answers one channel's messages, each on its own thread, through the app's routes."""
+
+    def __init__(self, app, channel, environ, session_id):
+        self.app = app
+        self.channel = channel
+        self.session_id = session_id
+        self.environ_base = {"REMOTE_ADDR": environ.get("REMOTE_ADDR", "")}
+        self.headers = {}
+        for name in FORWARDED_HEADERS:
+            value = environ.get("HTTP_" + name.upper().replace("-", "_"))
+            if value:
+                self.headers[name] = value
+        self._turns = 0
+        self._turns_lock = threading.Lock()
+        self._last_started = None
+
+    def busy(self) -> bool:
+        return self._turns > 0
+
+    def run(self):
+        self.channel.send_event("ready", session_id=self.session_id)
+        for text in self.channel.messages(self.busy):
+            try:
+                message = json.loads(text)
+                kind = message.get("type")
+                if kind not in ROUTES:
+                    raise ValueError(f"unknown message type {kind!r}")
+            except (ValueError, AttributeError) as e:
+                self.channel.send_event("error", message=f"Couldn't read message: {e}")
+                continue
+            metrics.inc("monty_ws_messages_total", type=kind)
+            with self._turns_lock:
+                self._turns += 1
+            started = threading.Event()
+            # A thread of its own (and a fresh context), so the channel keeps reading meanwhile:
+            # a newer message supersedes this turn and a hang-up cancels it
+            threading.Thread(target=self._turn, args=(kind, message, self._last_started, started),
+                             daemon=True).start()
+            self._last_started = started
+
+    def _turn(self, kind, message, previous_started, started):
+        if previous_started is not None:
+            previous_started.wait(ORDER_TIMEOUT)
+        turn_id = str(message.get("turn_id") or "")[:64] or None
+        turn_events.current_sink.set(
+            lambda event, data: self.channel.send_event(event, turn_id=turn_id, **data))
+        try:
+            payload = {"message": str(message.get("message", "")), "session_id": self.session_id}
+            if turn_id:
+                payload["turn_id"] = turn_id
+            status, body = self._dispatch(ROUTES[kind], payload, started)
+            audio = body.pop("audio", None)
+            if audio:
+                self.channel.send_audio(turn_id, bytes.fromhex(audio))
+            self.channel.send_event("done", turn_id=turn_id, status=status, **body)
+        except Exception as e:
+            logger.exception("Error answering channel message: %s", e)
+            self.channel.send_event("done", turn_id=turn_id, status=500)
+        finally:
+            started.set()
+            with self._turns_lock:
+                self._turns -= 1
+
+    def _dispatch(self, path, payload, started):
+        """POST payload to one of the app's routes in-process; returns (status, JSON body)."""
+        environ = EnvironBuilder(path=path, method="POST", json=payload, headers=self.headers,
+                                 environ_base=self.environ_base).get_environ()
+        # Read by cancellation: a closed channel counts as a disconnect, and started is set
+        # once the turn has been registered (so it can be superseded)
+        environ["monty.channel_closed"] = self.channel.closed
+        environ["monty.turn_started"] = started
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(None, 1)[0])
+
+        body_iter = self.app(environ, start_response)
+        try:
+            body = b"".join(body_iter)
+        finally:
+            if hasattr(body_iter, "close"):
+                body_iter.close()
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            data = {}
+        return started.get("status", 500), data if isinstance(data, dict) else {}
+
+
+def _count_open(delta) -> bool:
+    """Adjust the open-channel count; False (and no change) if opening one would go over the limit."""
+    global _open
+    with _open_lock:
+        if delta > 0 and _open >= MAX_CONNECTIONS:
+            return False
+        _open += delta
+        metrics.set_gauge("monty_ws_channels_open", _open)
+    return True
+
+
+def serve(app, environ, session_id):
+    """Run a channel on this /ws request until the client leaves; returns the response to give back.
+
+    The route must be registered with websocket=True, so only upgrade requests get here.
+    """
+    sock = environ.get("gunicorn.socket") or environ.get("werkzeug.socket")
+    if sock is None:
+        return Response("This server can't hand over its connections\n", status=501)
+    if not _count_open(1):
+        # The page falls back to POST /ask
+        metrics.inc("monty_ws_rejected_total")
+        return Response("Too many open channels\n", status=503)
+    try:
+        channel = accept(environ, sock)
+        if channel is not None:
+            logger.info("Channel opened")
+            Session(app, channel, environ, session_id).run()
+            logger.info("Channel closed")
+    except OSError as e:
+        logger.debug("Channel dropped: %s", e)
+    finally:
+        _count_open(-1)
+    return HandOffResponse()